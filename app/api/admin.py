@@ -1,9 +1,22 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Form, Query
+from fastapi.responses import StreamingResponse
+from datetime import datetime
 from typing import Optional, List
 from uuid import UUID
 from pydantic import BaseModel
-from app.api.deps import get_supabase_service, get_current_user_id
-from app.services.supabase_service import SupabaseService
+from app.config import settings
+from app.api.deps import (
+    get_supabase_service, get_openai_service, get_current_user_id, get_admin_user_id, get_question_bank
+)
+from app.services.supabase_service import SupabaseService, invalidate_catalog_cache
+from app.services.openai_service import OpenAIService
+from app.services.export_service import EXPORT_DATASETS, EXPORT_FORMATS, MEDIA_TYPES, ExportService
+from app.services.question_import import (
+    QuestionImportService, SUPPORTED_FORMATS, detect_format, iter_question_rows, open_text_stream
+)
+
+# Справочники, строки которых кэшируются по name (см. SupabaseService._find_or_create_by_name)
+CATALOG_TABLES = ("directions", "technologies", "competencies")
 
 router = APIRouter(prefix="/api/admin", tags=["admin"])
 
@@ -44,6 +57,10 @@ class BatchTechnologyLink(BaseModel):
     technology_ids: List[UUID]
 
 
+class BatchCompetencyLink(BaseModel):
+    competency_ids: List[UUID]
+
+
 # === DIRECTIONS ===
 
 @router.post(
@@ -92,6 +109,166 @@ async def create_technology(
         raise HTTPException(status_code=500, detail=f"Error creating technology: {str(e)}")
 
 
+# === BATCH OPERATIONS ===
+# Объявлены до одиночных связей: иначе ".../technologies/batch" совпадет с ".../technologies/{technology_id}"
+
+async def _batch_link(
+    supabase_service: SupabaseService,
+    table: str,
+    parent_column: str,
+    parent_id: str,
+    child_table: str,
+    child_column: str,
+    child_ids: List[UUID]
+) -> dict:
+    """
+    Связать родителя со списком детей: проверка существования детей одним запросом,
+    запись всех связей одним upsert. order_index - позиция в списке (с 1).
+
+    Returns:
+        Отчет по каждому ID: created, updated (связь уже была), not_found, duplicate
+    """
+    ids = [str(child_id) for child_id in child_ids]
+    existing_ids = await supabase_service.get_existing_ids(child_table, list(set(ids)))
+
+    results = []
+    to_link = []
+    order_indexes = {}
+    for idx, child_id in enumerate(ids, start=1):
+        if child_id in order_indexes:
+            results.append({"id": child_id, "status": "duplicate"})
+        elif child_id not in existing_ids:
+            results.append({"id": child_id, "status": "not_found"})
+        else:
+            order_indexes[child_id] = idx
+            to_link.append(child_id)
+            results.append({"id": child_id, "status": None})
+
+    statuses = await supabase_service.bulk_upsert_links(
+        table=table,
+        parent_column=parent_column,
+        parent_id=parent_id,
+        child_column=child_column,
+        child_ids=to_link,
+        order_indexes=order_indexes
+    )
+    for result in results:
+        if result["status"] is None:
+            result["status"] = statuses[result["id"]]
+
+    summary = {status: 0 for status in ("created", "updated", "not_found", "duplicate")}
+    for result in results:
+        summary[result["status"]] += 1
+
+    links = [
+        {parent_column: parent_id, child_column: child_id, "order_index": order_indexes[child_id]}
+        for child_id in to_link
+    ]
+    return {"links": links, "results": results, "summary": summary, "linked": len(to_link)}
+
+
+@router.post(
+    "/directions/{direction_id}/technologies/batch",
+    summary="Массовое добавление технологий к направлению",
+    description="Добавляет несколько технологий к направлению одним запросом к БД"
+)
+async def batch_link_technologies_to_direction(
+    direction_id: UUID,
+    batch_data: BatchTechnologyLink,
+    supabase_service: SupabaseService = Depends(get_supabase_service),
+    user_id: str = Depends(get_current_user_id)
+):
+    """Массовое добавление технологий к направлению"""
+    try:
+        direction = await supabase_service.get_direction(str(direction_id))
+        if not direction:
+            raise HTTPException(status_code=404, detail="Direction not found")
+        
+        report = await _batch_link(
+            supabase_service,
+            table='direction_technologies',
+            parent_column='direction_id',
+            parent_id=str(direction_id),
+            child_table='technologies',
+            child_column='technology_id',
+            child_ids=batch_data.technology_ids
+        )
+        report["message"] = f"Linked {report['linked']} technologies to direction '{direction['name']}'"
+        return report
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error batch linking technologies: {str(e)}")
+
+
+@router.post(
+    "/technologies/{technology_id}/competencies/batch",
+    summary="Массовое добавление компетенций к технологии",
+    description="Добавляет несколько компетенций к технологии одним запросом к БД"
+)
+async def batch_link_competencies_to_technology(
+    technology_id: UUID,
+    batch_data: BatchCompetencyLink,
+    supabase_service: SupabaseService = Depends(get_supabase_service),
+    user_id: str = Depends(get_current_user_id)
+):
+    """Массовое добавление компетенций к технологии"""
+    try:
+        technology = await supabase_service.get_technology(str(technology_id))
+        if not technology:
+            raise HTTPException(status_code=404, detail="Technology not found")
+        
+        report = await _batch_link(
+            supabase_service,
+            table='technology_competencies',
+            parent_column='technology_id',
+            parent_id=str(technology_id),
+            child_table='competencies',
+            child_column='competency_id',
+            child_ids=batch_data.competency_ids
+        )
+        report["message"] = f"Linked {report['linked']} competencies to technology '{technology['name']}'"
+        return report
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error batch linking competencies to technology: {str(e)}")
+
+
+@router.post(
+    "/directions/{direction_id}/competencies/batch",
+    summary="Массовое добавление компетенций к направлению",
+    description="Добавляет несколько общих компетенций к направлению одним запросом к БД"
+)
+async def batch_link_competencies_to_direction(
+    direction_id: UUID,
+    batch_data: BatchCompetencyLink,
+    supabase_service: SupabaseService = Depends(get_supabase_service),
+    user_id: str = Depends(get_current_user_id)
+):
+    """Массовое добавление компетенций к направлению"""
+    try:
+        direction = await supabase_service.get_direction(str(direction_id))
+        if not direction:
+            raise HTTPException(status_code=404, detail="Direction not found")
+        
+        report = await _batch_link(
+            supabase_service,
+            table='direction_competencies',
+            parent_column='direction_id',
+            parent_id=str(direction_id),
+            child_table='competencies',
+            child_column='competency_id',
+            child_ids=batch_data.competency_ids
+        )
+        report["message"] = f"Linked {report['linked']} competencies to direction '{direction['name']}'"
+        return report
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error batch linking competencies to direction: {str(e)}")
+
+
 @router.post(
     "/directions/{direction_id}/technologies/{technology_id}",
     summary="Связать технологию с направлением",
@@ -208,47 +385,244 @@ async def link_competency_to_direction(
         raise HTTPException(status_code=500, detail=f"Error linking competency to direction: {str(e)}")
 
 
-# === BATCH OPERATIONS ===
+# === QUESTIONS IMPORT ===
 
-class BatchTechnologyLink(BaseModel):
-    technology_ids: List[UUID]
+@router.post(
+    "/questions/import",
+    summary="Массовый импорт вопросов",
+    description="Импортирует вопросы из JSONL, JSON (массив) или CSV файла пачками с upsert семантикой"
+)
+async def import_questions(
+    file: UploadFile = File(..., description="Файл с вопросами (.jsonl, .json или .csv)"),
+    format: Optional[str] = Form(None, description="Формат файла: jsonl, json или csv (по умолчанию по расширению)"),
+    chunk_size: int = Form(1000, ge=1, le=5000, description="Сколько вопросов записывать одним запросом"),
+    dry_run: bool = Form(False, description="Только проверить файл, не записывая в БД"),
+    supabase_service: SupabaseService = Depends(get_supabase_service),
+    user_id: str = Depends(get_current_user_id)
+):
+    """
+    Массовый импорт вопросов.
+    
+    Каждая строка файла - вопрос с полями:
+    - **competency_id** или **competency** (название компетенции: общая компетенция без роли,
+      иначе единственная с таким названием; если название есть у нескольких ролей - строка
+      отклоняется, нужен competency_id)
+    - **question_text**, **difficulty** (1-5) - обязательные
+    - **question_number** (1-5), **expected_key_points**, **estimated_answer_time** - опциональные
+    
+    Повторный импорт того же вопроса (компетенция + текст) обновляет его, а не создает дубликат.
+    Возвращает отчет: сколько строк импортировано, пропущено как дубликаты и отклонено валидацией.
+    """
+    try:
+        file_format = (format or detect_format(file.filename)).lower()
+        if file_format not in SUPPORTED_FORMATS:
+            raise ValueError(f"Неподдерживаемый формат '{file_format}'. Поддерживаются: {', '.join(SUPPORTED_FORMATS)}")
 
+        rows = iter_question_rows(open_text_stream(file.file), file_format)
+        report = await QuestionImportService(supabase_service).import_rows(
+            rows,
+            chunk_size=chunk_size,
+            dry_run=dry_run
+        )
+        return report
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error importing questions: {str(e)}")
 
-@router.post(
-    "/directions/{direction_id}/technologies/batch",
-    summary="Массовое добавление технологий к направлению",
-    description="Добавляет несколько технологий к направлению за раз"
+
+# === ANALYTICS ===
+
+@router.get(
+    "/analytics/knowledge-gaps",
+    summary="Топ пробелов в знаниях",
+    description="Агрегирует knowledge_gaps из ответов пользователей по компетенциям и направлениям"
 )
-async def batch_link_technologies_to_direction(
-    direction_id: UUID,
-    batch_data: BatchTechnologyLink,
+async def get_knowledge_gap_analytics(
+    direction_id: Optional[UUID] = Query(None, description="Фильтр по направлению"),
+    technology_id: Optional[UUID] = Query(None, description="Фильтр по технологии"),
+    competency_id: Optional[UUID] = Query(None, description="Фильтр по компетенции"),
+    since: Optional[datetime] = Query(None, description="Ответы, заданные начиная с этого момента"),
+    until: Optional[datetime] = Query(None, description="Ответы, заданные до этого момента"),
+    gap: Optional[str] = Query(None, description="Только указанный пробел (без учета регистра)"),
+    limit: int = Query(50, ge=1, le=500, description="Сколько строк вернуть"),
     supabase_service: SupabaseService = Depends(get_supabase_service),
     user_id: str = Depends(get_current_user_id)
 ):
-    """Массовое добавление технологий к направлению"""
+    """
+    Топ пробелов в знаниях.
+    
+    Одна строка - пробел в рамках (компетенция, направление): сколько раз он встретился
+    в ответах (`occurrences`), у скольких пользователей и в скольких тестированиях,
+    и средний балл ответов, где он был выявлен.
+    
+    Пробелы нормализуются (нижний регистр, схлопнутые пробелы), поэтому "Virtual DOM"
+    и "virtual dom" считаются вместе. Агрегация выполняется в БД одним запросом
+    (требуется миграция add_knowledge_gap_analytics.sql).
+    
+    Пример - топ пробелов по технологии за октябрь:
+    `?technology_id=...&since=2026-10-01T00:00:00&until=2026-11-01T00:00:00&limit=20`
+    """
+    if since and until and since >= until:
+        raise HTTPException(status_code=400, detail="'since' must be earlier than 'until'")
     try:
-        direction = await supabase_service.get_direction(str(direction_id))
-        if not direction:
-            raise HTTPException(status_code=404, detail="Direction not found")
-        
-        links = []
-        for idx, tech_id in enumerate(batch_data.technology_ids, start=1):
-            try:
-                link = await supabase_service.create_direction_technology(
-                    direction_id=str(direction_id),
-                    technology_id=str(tech_id),
-                    order_index=idx
-                )
-                links.append(link)
-            except Exception as e:
-                # Пропускаем если связь уже существует
-                continue
-        
-        return {
-            "links": links,
-            "message": f"Linked {len(links)} technologies to direction '{direction['name']}'"
-        }
-    except HTTPException:
-        raise
+        gaps = await supabase_service.get_knowledge_gap_stats(
+            direction_id=str(direction_id) if direction_id else None,
+            technology_id=str(technology_id) if technology_id else None,
+            competency_id=str(competency_id) if competency_id else None,
+            since=since,
+            until=until,
+            gap=gap,
+            limit=limit
+        )
+        return {"gaps": gaps, "count": len(gaps)}
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Error batch linking technologies: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Error fetching knowledge gap analytics: {str(e)}")
+
+
+# === EXPORT ===
+
+@router.get(
+    "/export/{dataset}",
+    summary="Потоковая выгрузка результатов",
+    description=(
+        "Выгружает assessments, competency_scores или question_history в NDJSON или CSV. "
+        "Ответ передается потоком по мере чтения из БД"
+    )
+)
+async def export_dataset(
+    dataset: str,
+    format: str = Query("ndjson", description="Формат: ndjson или csv"),
+    since: Optional[datetime] = Query(None, description="Строки начиная с этого момента"),
+    until: Optional[datetime] = Query(None, description="Строки до этого момента"),
+    supabase_service: SupabaseService = Depends(get_supabase_service),
+    user_id: str = Depends(get_admin_user_id)
+):
+    """
+    Потоковая выгрузка результатов тестирований.
+    
+    Доступна только администраторам (ADMIN_USER_IDS или роль ADMIN_ROLE в токене):
+    выгрузка содержит результаты всех пользователей.
+    
+    Наборы данных:
+    - **assessments** - тестирования (период по started_at)
+    - **competency_scores** - оценки компетенций с user_id, направлением и названием компетенции
+      (период по completed_at)
+    - **question_history** - ответы на вопросы: балл, глубина понимания, пробелы (период по asked_at)
+    
+    Таблица читается страницами по первичному ключу (EXPORT_PAGE_SIZE строк), каждая
+    страница сразу отправляется клиенту - память сервера не зависит от объема выгрузки.
+    
+    Ошибка посреди выгрузки обрывает соединение; в NDJSON перед этим дописывается строка
+    `{"_error": ..., "exported_rows": N}`.
+    
+    Пример: `curl -o scores.csv "http://localhost:8000/api/admin/export/competency_scores?format=csv"`
+    """
+    if format not in EXPORT_FORMATS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Неподдерживаемый формат '{format}'. Поддерживаются: {', '.join(EXPORT_FORMATS)}"
+        )
+    if dataset not in EXPORT_DATASETS:
+        raise HTTPException(
+            status_code=404,
+            detail=f"Неизвестный набор данных '{dataset}'. Доступны: {', '.join(EXPORT_DATASETS)}"
+        )
+    if since and until and since >= until:
+        raise HTTPException(status_code=400, detail="'since' must be earlier than 'until'")
+
+    extension = "csv" if format == "csv" else "ndjson"
+    return StreamingResponse(
+        ExportService(supabase_service).stream(
+            dataset,
+            format,
+            since=since,
+            until=until,
+            page_size=settings.export_page_size
+        ),
+        media_type=MEDIA_TYPES[format],
+        headers={"Content-Disposition": f'attachment; filename="{dataset}.{extension}"'}
+    )
+
+
+# === MONITORING ===
+
+@router.get(
+    "/openai/stats",
+    summary="Статистика OpenAI клиента",
+    description="Возвращает загрузку пула HTTP соединений к OpenAI API, маршрутизацию моделей и расход токенов"
+)
+async def get_openai_stats(
+    openai_service: OpenAIService = Depends(get_openai_service),
+    user_id: str = Depends(get_current_user_id)
+):
+    """
+    Статистика OpenAI клиента.
+    
+    - **pool**: настройки пула, открытые/простаивающие соединения, запросы в полете,
+      пиковая загрузка и количество исчерпаний пула (pool timeout)
+    - **routing**: модель для каждой операции, средняя латентность и количество
+      переключений на fallback модель
+    - **usage**: расход токенов по операциям, включая закэшированные провайдером
+      prompt токены (cache_hit_ratio)
+    - **evaluation_cache**: попадания в кэш оценок и количество тривиальных ответов,
+      оцененных без GPT
+    """
+    return {
+        "pool": openai_service.get_pool_stats(),
+        "routing": openai_service.get_routing_stats(),
+        "usage": openai_service.get_usage_stats(),
+        "evaluation_cache": openai_service.get_evaluation_cache_stats()
+    }
+
+
+@router.get(
+    "/question-bank/stats",
+    summary="Статистика индекса банка вопросов",
+    description="Возвращает состояние in-memory индекса таблицы questions"
+)
+async def get_question_bank_stats(
+    user_id: str = Depends(get_current_user_id)
+):
+    """Количество вопросов в индексе и метка времени последнего обновления"""
+    question_bank = get_question_bank()
+    if question_bank is None:
+        return {"enabled": False}
+    return {"enabled": True, **question_bank.stats()}
+
+
+@router.post(
+    "/question-bank/reload",
+    summary="Перезагрузить индекс банка вопросов",
+    description="Полностью перечитывает таблицу questions (например, после удаления вопросов через SQL)"
+)
+async def reload_question_bank(
+    user_id: str = Depends(get_current_user_id)
+):
+    """Полная перезагрузка in-memory индекса вопросов"""
+    question_bank = get_question_bank()
+    if question_bank is None:
+        raise HTTPException(status_code=400, detail="Question bank index is disabled")
+    try:
+        await question_bank.load()
+        return {"enabled": True, **question_bank.stats()}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.post(
+    "/catalog-cache/reset",
+    summary="Сбросить кэш справочников",
+    description="Сбрасывает закэшированные направления, технологии и компетенции (после правки или удаления через SQL)"
+)
+async def reset_catalog_cache(
+    table: Optional[str] = Query(None, description="directions, technologies или competencies (по умолчанию - все)"),
+    name: Optional[str] = Query(None, description="Название строки (только вместе с table)"),
+    user_id: str = Depends(get_current_user_id)
+):
+    """Сбросить кэш справочников текущего процесса"""
+    if table is not None and table not in CATALOG_TABLES:
+        raise HTTPException(status_code=400, detail=f"Unknown catalog table '{table}'. Available: {', '.join(CATALOG_TABLES)}")
+    if name is not None and table is None:
+        raise HTTPException(status_code=400, detail="Parameter 'name' requires 'table'")
+    return {"removed": invalidate_catalog_cache(table, name)}
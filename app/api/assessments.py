@@ -2,19 +2,23 @@ from fastapi import APIRouter, Depends, HTTPException, Query
 from typing import List, Optional
 from uuid import UUID
 import logging
-from app.api.deps import get_supabase_service, get_openai_service, get_current_user_id
-from app.services.supabase_service import SupabaseService
+from app.api.deps import get_supabase_service, get_openai_service, get_current_user_id, get_answer_job_queue
+from app.services.supabase_service import ASSESSMENT_KEYSET_COLUMNS, SupabaseService
 from app.services.openai_service import OpenAIService
 from app.services.assessment_service import AssessmentService
+from app.services.answer_jobs import AnswerJobQueue
 from app.schemas.assessment import (
     AssessmentCreate,
     AssessmentStartResponse,
     AssessmentResponse,
     CompetencyInfo,
     CompetencyAssessmentResponse,
+    UserProgressSummary,
 )
-from app.schemas.question import QuestionGenerateResponse, AnswerResponse, AnswerEvaluation
+from app.schemas.question import QuestionGenerateResponse, AnswerResponse, AnswerEvaluation, AnswerJobResponse
 from app.utils.audio import validate_audio_file, save_temp_audio_file, cleanup_temp_file
+from app.utils.pagination import decode_cursor, encode_cursor
+from app.utils.responses import model_json_response
 from app.config import settings
 from fastapi import UploadFile, File, Form
 
@@ -22,6 +26,9 @@ logger = logging.getLogger(__name__)
 
 router = APIRouter(prefix="/api/assessments", tags=["assessments"])
 
+# Заголовок с курсором следующей страницы списка тестирований
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
 
 def get_assessment_service(
     supabase_service: SupabaseService = Depends(get_supabase_service),
@@ -331,47 +338,60 @@ async def create_assessment(
     "",
     response_model=List[AssessmentResponse],
     summary="Получить список тестирований пользователя",
-    description="Возвращает список всех тестирований пользователя, отсортированных по номеру попытки и дате"
+    description=(
+        "Возвращает страницу тестирований пользователя, отсортированных по номеру попытки и дате. "
+        "Курсор следующей страницы - в заголовке X-Next-Cursor"
+    )
 )
 async def get_user_assessments(
     supabase_service: SupabaseService = Depends(get_supabase_service),
     user_id: str = Depends(get_current_user_id),
     status: Optional[str] = Query(None, description="Фильтр по статусу (in_progress, completed, abandoned)"),
     direction_id: Optional[UUID] = Query(None, description="Фильтр по направлению"),
-    technology_id: Optional[UUID] = Query(None, description="Фильтр по технологии")
+    technology_id: Optional[UUID] = Query(None, description="Фильтр по технологии"),
+    limit: int = Query(
+        settings.assessments_page_size,
+        ge=1,
+        le=settings.assessments_max_page_size,
+        description="Размер страницы"
+    ),
+    cursor: Optional[str] = Query(None, description="Курсор из заголовка X-Next-Cursor предыдущей страницы")
 ):
     """
-    Получить список всех тестирований пользователя.
+    Получить список тестирований пользователя.
     
-    Возвращает все попытки прохождения тестирования для пользователя,
+    Возвращает попытки прохождения тестирования для пользователя,
     отсортированные по номеру попытки (от новых к старым) и дате начала.
     
     Можно отфильтровать по направлению, технологии и/или статусу.
     
+    📄 ПАГИНАЦИЯ: Возвращается не больше `limit` записей. Если есть следующая страница,
+    ее курсор передается в заголовке `X-Next-Cursor` - его нужно передать в параметре
+    `cursor` следующего запроса (с теми же фильтрами). Нет заголовка - страница последняя.
+    
     ⚡ ОПТИМИЗИРОВАНО: Не загружает связанные данные (roles, directions, technologies)
     для списка. Используйте GET /api/assessments/{id} для детальной информации.
     """
+    after = None
+    if cursor:
+        try:
+            after = decode_cursor(cursor, ASSESSMENT_KEYSET_COLUMNS)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+
     try:
-        # Простой запрос без joins
-        query = supabase_service.client.table('assessments') \
-            .select('id, user_id, role_id, direction_id, technology_id, status, overall_score, attempt_number, started_at, completed_at') \
-            .eq('user_id', user_id)
-        
-        if status:
-            query = query.eq('status', status)
-        
-        if direction_id:
-            query = query.eq('direction_id', str(direction_id))
-        
-        if technology_id:
-            query = query.eq('technology_id', str(technology_id))
-        
-        response = query \
-            .order('attempt_number', desc=True) \
-            .order('started_at', desc=True) \
-            .execute()
+        assessments, last_key = await supabase_service.list_user_assessments(
+            user_id=user_id,
+            limit=limit,
+            after=after,
+            status=status,
+            direction_id=str(direction_id) if direction_id else None,
+            technology_id=str(technology_id) if technology_id else None
+        )
         
-        assessments = response.data if response.data else []
+        headers = {}
+        if last_key:
+            headers[NEXT_CURSOR_HEADER] = encode_cursor(last_key, ASSESSMENT_KEYSET_COLUMNS)
         
         # Простой маппинг без дополнительных запросов
         result = []
@@ -393,12 +413,40 @@ async def get_user_assessments(
                 )
             )
         
-        return result
+        return model_json_response(result, List[AssessmentResponse], headers=headers)
     except Exception as e:
         logger.error(f"Error fetching assessments: {e}", exc_info=True)
         raise HTTPException(status_code=500, detail=f"Error fetching assessments: {str(e)}")
 
 
+@router.get(
+    "/summary",
+    response_model=List[UserProgressSummary],
+    summary="Сводка прогресса пользователя",
+    description="Лучший, последний и средний балл по каждому направлению и технологии, которые проходил пользователь"
+)
+async def get_progress_summary(
+    supabase_service: SupabaseService = Depends(get_supabase_service),
+    user_id: str = Depends(get_current_user_id)
+):
+    """
+    Получить сводку прогресса пользователя для дашборда.
+    
+    Одна строка на (направление, технология) с завершенными тестированиями:
+    количество попыток, лучший/последний/предыдущий/средний балл и последние
+    10 попыток для графика динамики.
+    
+    ⚡ Строки предвычислены (таблица user_progress_summary) и обновляются при
+    завершении тестирования, поэтому запрос не обходит assessments.
+    """
+    try:
+        rows = await supabase_service.get_user_progress_summary(user_id)
+        return [UserProgressSummary(**row) for row in rows]
+    except Exception as e:
+        logger.error(f"Error fetching progress summary: {e}", exc_info=True)
+        raise HTTPException(status_code=500, detail=f"Error fetching progress summary: {str(e)}")
+
+
 @router.get(
     "/{assessment_id}",
     response_model=AssessmentResponse,
@@ -448,7 +496,7 @@ async def get_assessment(
 
         # Handle None values from Supabase joins
         role = assessment.get('roles') or {}
-        return AssessmentResponse(
+        result = AssessmentResponse(
             id=assessment['id'],
             user_id=assessment['user_id'],
             role_id=assessment.get('role_id'),
@@ -462,6 +510,7 @@ async def get_assessment(
             completed_at=assessment.get('completed_at'),
             competency_assessments=competency_assessments
         )
+        return model_json_response(result)
     except HTTPException:
         raise
     except Exception as e:
@@ -624,9 +673,9 @@ async def submit_answer(
     difficulty: int = Form(3, description="Сложность вопроса (1-5)", ge=1, le=5),
     question_id: Optional[UUID] = Form(None, description="ID вопроса из БД"),
     audio: UploadFile = File(..., description="Аудио файл с ответом"),
+    async_mode: bool = Form(False, description="Обработать ответ в фоне: сразу вернуть ID задачи (202)"),
     assessment_service: AssessmentService = Depends(get_assessment_service),
-    supabase_service: SupabaseService = Depends(get_supabase_service),
-    openai_service: OpenAIService = Depends(get_openai_service),
+    answer_job_queue: AnswerJobQueue = Depends(get_answer_job_queue),
     user_id: str = Depends(get_current_user_id)
 ):
     """
@@ -643,8 +692,37 @@ async def submit_answer(
     5. Обновление competency_assessment
     6. Опционально: авто-завершение assessment
     """
-    # Импортируем функцию из questions.py
-    from app.api.questions import submit_answer as old_submit_answer
+    # Импортируем функции из questions.py
+    from app.api.questions import submit_answer as old_submit_answer, enqueue_answer_job
+    
+    if async_mode:
+        # Проверяем доступ и формат до постановки в очередь
+        assessment = await assessment_service.get_assessment_with_progress(str(assessment_id))
+        if not assessment:
+            raise HTTPException(status_code=404, detail="Assessment not found")
+        if assessment.get('user_id') != user_id:
+            raise HTTPException(status_code=403, detail="Access denied")
+        
+        is_valid, error_msg = validate_audio_file(
+            audio,
+            max_size_mb=settings.max_audio_file_size_mb,
+            allowed_formats=settings.allowed_audio_formats
+        )
+        if not is_valid:
+            raise HTTPException(status_code=400, detail=error_msg)
+        
+        # Авто-complete выполнит воркер после обработки ответа
+        return await enqueue_answer_job(
+            answer_job_queue,
+            audio=audio,
+            assessment_id=str(assessment_id),
+            competency_id=str(competency_id),
+            question_text=question_text,
+            difficulty=difficulty,
+            question_id=str(question_id) if question_id else None,
+            user_id=user_id,
+            auto_complete=True
+        )
     
     # Переиспользуем существующую логику
     response = await old_submit_answer(
@@ -654,36 +732,21 @@ async def submit_answer(
         difficulty=difficulty,
         question_id=question_id,
         audio=audio,
+        async_mode=False,
         assessment_service=assessment_service,
-        supabase_service=supabase_service,
-        openai_service=openai_service,
+        answer_job_queue=answer_job_queue,
         user_id=user_id
     )
     
     # Проверяем, все ли компетенции протестированы (авто-complete)
     try:
-        assessment = await assessment_service.get_assessment_with_progress(str(assessment_id))
-        all_competencies = assessment.get('competency_assessments', [])
-        
-        if all_competencies:
-            # Проверяем, что все компетенции имеют оценки
-            all_completed = all(
-                ca.get('ai_assessed_score') is not None 
-                for ca in all_competencies
-            )
-            
-            if all_completed and assessment.get('status') == 'in_progress':
-                # Автоматически завершаем assessment
-                completed_assessment = await assessment_service.complete_assessment(str(assessment_id))
-                
-                # Добавляем информацию об авто-завершении
-                response_dict = response.dict() if hasattr(response, 'dict') else response
-                response_dict['assessment_auto_completed'] = True
-                response_dict['overall_score'] = completed_assessment.get('overall_score')
-                
-                logger.info(f"Assessment {assessment_id} auto-completed with score {completed_assessment.get('overall_score')}")
-                
-                return response_dict
+        completed_assessment = await assessment_service.auto_complete_if_finished(str(assessment_id))
+        if completed_assessment:
+            # Добавляем информацию об авто-завершении
+            response_dict = response.dict() if hasattr(response, 'dict') else response
+            response_dict['assessment_auto_completed'] = True
+            response_dict['overall_score'] = completed_assessment.get('overall_score')
+            return response_dict
     except Exception as e:
         # Не критично, если авто-complete не сработал
         logger.warning(f"Auto-complete check failed for assessment {assessment_id}: {e}")
@@ -691,3 +754,32 @@ async def submit_answer(
     return response
 
 
+@router.get(
+    "/{assessment_id}/answers/jobs/{job_id}",
+    response_model=AnswerJobResponse,
+    summary="Статус фоновой обработки ответа",
+    description="Возвращает статус ответа, отправленного с async_mode=true (RESTful endpoint). "
+                "С параметром wait запрос ждет завершения задачи (long-poll)."
+)
+async def get_answer_job(
+    assessment_id: UUID,
+    job_id: UUID,
+    wait: float = Query(0, ge=0, description="Сколько секунд ждать завершения задачи"),
+    answer_job_queue: AnswerJobQueue = Depends(get_answer_job_queue),
+    user_id: str = Depends(get_current_user_id)
+):
+    """
+    Получить результат фоновой обработки ответа.
+    
+    При status=completed поле result содержит AnswerResponse, а поля
+    assessment_auto_completed/overall_score - итог авто-завершения assessment.
+    """
+    from app.api.questions import get_answer_job_status
+    
+    return await get_answer_job_status(
+        answer_job_queue,
+        str(job_id),
+        user_id,
+        wait=wait,
+        assessment_id=str(assessment_id)
+    )
@@ -4,6 +4,7 @@ from uuid import UUID
 import logging
 from app.api.deps import get_supabase_service
 from app.services.supabase_service import SupabaseService
+from app.utils.responses import json_response
 
 logger = logging.getLogger(__name__)
 
@@ -62,7 +63,7 @@ async def get_directions_catalog(
                     logger.warning(f"Could not fetch technologies for direction {direction['id']}: {e}")
                     direction['technologies'] = []
         
-        return {"directions": directions}
+        return json_response({"directions": directions})
     except Exception as e:
         logger.error(f"Error fetching directions catalog: {e}")
         raise HTTPException(status_code=500, detail=f"Error fetching directions catalog: {str(e)}")
@@ -83,7 +84,7 @@ async def get_technology(
         if not technology:
             raise HTTPException(status_code=404, detail="Technology not found")
         
-        return {"technology": technology}
+        return json_response({"technology": technology})
     except HTTPException:
         raise
     except Exception as e:
@@ -106,10 +107,10 @@ async def get_roles_catalog(
     """
     try:
         roles = await supabase_service.get_all_roles()
-        return {
+        return json_response({
             "roles": roles,
             "deprecated": True,
             "message": "This endpoint is deprecated. Please use /api/catalog/directions instead."
-        }
+        })
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error fetching roles: {str(e)}")
@@ -1,14 +1,22 @@
 from fastapi import Depends, HTTPException, Header
-from typing import Optional
+from typing import Dict, Optional
 from app.database import get_supabase_client
 from app.config import settings
 from app.services.supabase_service import SupabaseService
 from app.services.openai_service import OpenAIService
+from app.services.assessment_service import AssessmentService
+from app.services.answer_jobs import AnswerJobQueue
+from app.services.question_bank import QuestionBankIndex
+from app.utils.jwt_auth import JWTDecoder
+from jose.exceptions import ExpiredSignatureError, JWTError
 from supabase import Client
 
 # Global instances
 _openai_service: Optional[OpenAIService] = None
 _supabase_service: Optional[SupabaseService] = None
+_answer_job_queue: Optional[AnswerJobQueue] = None
+_question_bank: Optional[QuestionBankIndex] = None
+_jwt_decoder: Optional[JWTDecoder] = None
 
 
 def get_supabase() -> Client:
@@ -16,11 +24,31 @@ def get_supabase() -> Client:
     return get_supabase_client()
 
 
+def get_question_bank() -> Optional[QuestionBankIndex]:
+    """In-memory индекс банка вопросов (None, если отключен настройкой)"""
+    global _question_bank
+    if _question_bank is None and settings.question_bank_index_enabled:
+        _question_bank = QuestionBankIndex(
+            get_supabase_client(),
+            refresh_interval_seconds=settings.question_bank_refresh_seconds,
+            full_reload_interval_seconds=settings.question_bank_full_reload_seconds
+        )
+    return _question_bank
+
+
+async def stop_question_bank():
+    """Остановить фоновое обновление индекса вопросов"""
+    global _question_bank
+    if _question_bank is not None:
+        await _question_bank.stop()
+        _question_bank = None
+
+
 def get_supabase_service(db: Client = Depends(get_supabase)) -> SupabaseService:
     """Dependency для получения SupabaseService"""
     global _supabase_service
     if _supabase_service is None:
-        _supabase_service = SupabaseService(db)
+        _supabase_service = SupabaseService(db, question_bank=get_question_bank())
     return _supabase_service
 
 
@@ -30,44 +58,91 @@ def get_openai_service() -> OpenAIService:
     if _openai_service is None:
         _openai_service = OpenAIService(
             api_key=settings.openai_api_key,
-            timeout=settings.openai_timeout
+            timeout=settings.openai_timeout,
+            max_connections=settings.openai_max_connections,
+            max_keepalive_connections=settings.openai_max_keepalive_connections,
+            keepalive_expiry=settings.openai_keepalive_expiry,
+            pool_timeout=settings.openai_pool_timeout,
+            http2=settings.openai_http2,
+            model_routes=settings.openai_model_routes,
+            fallback_model=settings.openai_fallback_model,
+            fallback_max_in_flight=settings.openai_fallback_max_in_flight,
+            fallback_latency_seconds=settings.openai_fallback_latency_seconds,
+            fallback_cooldown_seconds=settings.openai_fallback_cooldown_seconds,
+            evaluation_cache_size=settings.evaluation_cache_size,
+            evaluation_cache_ttl_seconds=settings.evaluation_cache_ttl_seconds,
+            trivial_answer_phrases=settings.evaluation_trivial_phrases
         )
     return _openai_service
 
 
-async def get_current_user_id(
+async def close_openai_service():
+    """Закрыть HTTP клиент OpenAIService (вызывается при остановке приложения)"""
+    global _openai_service
+    if _openai_service is not None:
+        await _openai_service.close()
+        _openai_service = None
+
+
+def get_answer_job_queue() -> AnswerJobQueue:
+    """Dependency для получения очереди фоновой обработки ответов"""
+    global _answer_job_queue
+    if _answer_job_queue is None:
+        _answer_job_queue = AnswerJobQueue(
+            service_factory=lambda: AssessmentService(
+                get_supabase_service(get_supabase_client()),
+                get_openai_service()
+            ),
+            supabase_factory=lambda: get_supabase_service(get_supabase_client()),
+            jobs_dir=settings.answer_jobs_dir,
+            workers=settings.answer_jobs_workers,
+            result_ttl_seconds=settings.answer_jobs_result_ttl_seconds,
+            compact_every=settings.answer_jobs_compact_every
+        )
+    return _answer_job_queue
+
+
+async def stop_answer_job_queue():
+    """Остановить воркеры очереди ответов (вызывается при остановке приложения)"""
+    global _answer_job_queue
+    if _answer_job_queue is not None:
+        await _answer_job_queue.stop()
+        _answer_job_queue = None
+
+
+def get_jwt_decoder() -> JWTDecoder:
+    """Декодер JWT с кэшем claims (общий на процесс)"""
+    global _jwt_decoder
+    if _jwt_decoder is None:
+        _jwt_decoder = JWTDecoder(
+            verify_signature=settings.jwt_verify_signature,
+            jwks_url=settings.jwt_jwks_url,
+            secret=settings.jwt_secret,
+            algorithms=settings.jwt_algorithms,
+            audience=settings.jwt_audience,
+            issuer=settings.jwt_issuer,
+            cache_size=settings.jwt_claims_cache_size,
+            cache_ttl_seconds=settings.jwt_claims_cache_ttl_seconds,
+            jwks_cache_ttl_seconds=settings.jwt_jwks_cache_ttl_seconds
+        )
+    return _jwt_decoder
+
+
+async def get_current_user_claims(
     authorization: Optional[str] = Header(
         None, 
         alias="Authorization", 
         description="JWT токен передается с фронтенда в заголовке Authorization. Формат: 'Bearer {jwt_token}'. "
                     "User ID извлекается из поля 'sub' в JWT токене."
     )
-) -> str:
+) -> Dict:
     """
-    Получить user_id из JWT токена в заголовке Authorization.
-    
-    Поддерживаемые форматы:
-    - "Bearer {jwt_token}" (JWT токен от Keycloak или другого провайдера)
-    - "{jwt_token}" (JWT токен без префикса Bearer)
-    
-    User ID извлекается из поля 'sub' в декодированном JWT токене.
-    
-    Args:
-        authorization: Заголовок Authorization с JWT токеном
-        
-    Returns:
-        user_id: UUID строка пользователя из поля 'sub' JWT токена
-        
-    Note:
-        Пользователь будет автоматически создан в БД при первом обращении, если его нет.
-        
+    Декодированные claims JWT токена из заголовка Authorization (с проверенным полем 'sub').
+
     Raises:
-        HTTPException 401: Если заголовок не передан
+        HTTPException 401: Если заголовок не передан или токен истек
         HTTPException 400: Если токен невалидный или не содержит user_id
     """
-    from fastapi import HTTPException
-    from jose import jwt
-    
     if not authorization:
         raise HTTPException(
             status_code=401,
@@ -87,21 +162,9 @@ async def get_current_user_id(
         )
     
     try:
-        # Декодируем JWT токен без проверки подписи и других валидаций
-        # В production рекомендуется проверять подпись токена
-        # Передаем пустую строку как key, так как мы не проверяем подпись
-        decoded_token = jwt.decode(
-            token,
-            key="",  # Пустой ключ, так как не проверяем подпись
-            options={
-                "verify_signature": False,  # Пропускаем проверку подписи
-                "verify_aud": False,  # Пропускаем проверку аудитории
-                "verify_exp": False,  # Пропускаем проверку срока действия
-                "verify_iat": False,  # Пропускаем проверку времени выдачи
-                "verify_nbf": False,  # Пропускаем проверку "not before"
-                "verify_iss": False,  # Пропускаем проверку издателя
-            }
-        )
+        # Декодированные claims кэшируются по токену. Подпись, exp, aud и iss проверяются
+        # только при JWT_VERIFY_SIGNATURE=true, иначе токен декодируется без проверок
+        decoded_token = await get_jwt_decoder().decode(token)
         
         # Извлекаем user_id из поля 'sub' (subject) JWT токена
         user_id = decoded_token.get('sub')
@@ -112,9 +175,16 @@ async def get_current_user_id(
                 detail="JWT token does not contain 'sub' field (user_id)"
             )
         
-        return str(user_id)
-        
-    except jwt.JWTError as e:
+        return decoded_token
+    
+    except HTTPException:
+        raise
+    except ExpiredSignatureError:
+        raise HTTPException(
+            status_code=401,
+            detail="JWT token has expired"
+        )
+    except JWTError as e:
         raise HTTPException(
             status_code=400,
             detail=f"Invalid JWT token: {str(e)}"
@@ -124,3 +194,54 @@ async def get_current_user_id(
             status_code=400,
             detail=f"Error decoding JWT token: {str(e)}"
         )
+
+
+async def get_current_user_id(claims: Dict = Depends(get_current_user_claims)) -> str:
+    """
+    Получить user_id из JWT токена в заголовке Authorization.
+    
+    Поддерживаемые форматы:
+    - "Bearer {jwt_token}" (JWT токен от Keycloak или другого провайдера)
+    - "{jwt_token}" (JWT токен без префикса Bearer)
+    
+    User ID извлекается из поля 'sub' в декодированном JWT токене.
+    
+    Returns:
+        user_id: UUID строка пользователя из поля 'sub' JWT токена
+        
+    Note:
+        Пользователь будет автоматически создан в БД при первом обращении, если его нет.
+        
+    Raises:
+        HTTPException 401: Если заголовок не передан
+        HTTPException 400: Если токен невалидный или не содержит user_id
+    """
+    return str(claims['sub'])
+
+
+def _token_roles(claims: Dict) -> set:
+    """Роли из claims: поле roles и realm_access.roles (Keycloak)"""
+    roles = set()
+    for source in (claims, claims.get('realm_access')):
+        if isinstance(source, dict) and isinstance(source.get('roles'), list):
+            roles.update(source['roles'])
+    return roles
+
+
+async def get_admin_user_id(claims: Dict = Depends(get_current_user_claims)) -> str:
+    """
+    user_id администратора: sub из ADMIN_USER_IDS или роль ADMIN_ROLE в токене.
+
+    Без проверки подписи claims можно подделать, поэтому административный доступ
+    требует JWT_VERIFY_SIGNATURE=true. Для локальной разработки проверку можно
+    отключить явным ADMIN_ALLOW_UNVERIFIED_TOKENS=true (ENVIRONMENT на это не влияет).
+
+    Raises:
+        HTTPException 403: Пользователь не администратор
+    """
+    user_id = str(claims['sub'])
+    if not settings.jwt_verify_signature and not settings.admin_allow_unverified_tokens:
+        raise HTTPException(status_code=403, detail="Admin access requires JWT_VERIFY_SIGNATURE=true")
+    if user_id in settings.admin_user_ids or (settings.admin_role and settings.admin_role in _token_roles(claims)):
+        return user_id
+    raise HTTPException(status_code=403, detail="Admin privileges required")
@@ -1,17 +1,25 @@
-from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Form
+from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Form, Query
+from fastapi.responses import Response
+from datetime import datetime
+import asyncio
 from typing import Optional, Dict
 from uuid import UUID
 import logging
-from app.api.deps import get_supabase_service, get_openai_service, get_current_user_id
+from app.api.deps import get_supabase_service, get_openai_service, get_current_user_id, get_answer_job_queue
 from app.services.supabase_service import SupabaseService
 from app.services.openai_service import OpenAIService
 from app.services.assessment_service import AssessmentService
+from app.services.answer_jobs import AnswerJobQueue
+from app.utils.responses import model_json_response
 from app.utils.audio import validate_audio_file, save_temp_audio_file, cleanup_temp_file
 from app.config import settings
-from app.schemas.question import QuestionGenerateResponse, AnswerResponse, AnswerEvaluation
+from app.schemas.question import QuestionGenerateResponse, AnswerResponse, AnswerEvaluation, AnswerJobResponse
 
 logger = logging.getLogger(__name__)
 
+# Ссылки на фоновые задачи, чтобы их не собрал сборщик мусора до завершения
+_background_tasks: set = set()
+
 router = APIRouter(prefix="/api/questions", tags=["questions"])
 # Новые RESTful эндпоинты будут в /api/assessments/{id}/questions и /api/assessments/{id}/answers
 
@@ -23,6 +31,120 @@ def get_assessment_service(
     return AssessmentService(supabase_service, openai_service)
 
 
+def run_in_background(coro) -> None:
+    """Запустить корутину, не дожидаясь ее (ошибки только логируются)"""
+    async def runner():
+        try:
+            await coro
+        except Exception as e:
+            logger.warning(f"Background task failed: {e}")
+
+    task = asyncio.create_task(runner())
+    _background_tasks.add(task)
+    task.add_done_callback(_background_tasks.discard)
+
+
+def build_question_response(stored_question: Dict, difficulty: int) -> QuestionGenerateResponse:
+    """Преобразовать строку таблицы questions в ответ API"""
+    # Обрабатываем expected_key_points - может быть списком или None
+    expected_key_points_raw = stored_question.get('expected_key_points')
+    if isinstance(expected_key_points_raw, list):
+        expected_key_points = expected_key_points_raw
+    else:
+        # None, строка или другой тип
+        expected_key_points = []
+
+    return QuestionGenerateResponse(
+        questionId=UUID(str(stored_question['id'])),
+        questionText=stored_question['question_text'],
+        difficulty=difficulty,
+        estimatedAnswerTime=stored_question.get('estimated_answer_time', '1-2 минуты'),
+        expectedKeyPoints=expected_key_points,
+        noMoreQuestions=False
+    )
+
+
+def build_answer_job_response(job: Dict) -> AnswerJobResponse:
+    """Преобразовать запись задачи AnswerJobQueue в ответ API"""
+    return AnswerJobResponse(
+        job_id=job['job_id'],
+        status=job['status'],
+        result=AnswerResponse(**job['result']) if job.get('result') else None,
+        error=job.get('error'),
+        assessment_auto_completed=job.get('assessment_auto_completed', False),
+        overall_score=job.get('overall_score'),
+        created_at=datetime.fromtimestamp(job['created_at']),
+        updated_at=datetime.fromtimestamp(job['updated_at'])
+    )
+
+
+async def enqueue_answer_job(
+    answer_job_queue: AnswerJobQueue,
+    audio: UploadFile,
+    assessment_id: str,
+    competency_id: str,
+    question_text: str,
+    difficulty: int,
+    question_id: Optional[str],
+    user_id: str,
+    auto_complete: bool = False
+) -> Response:
+    """
+    Сохранить аудио и поставить ответ в очередь фоновой обработки.
+
+    Returns:
+        202 Accepted с AnswerJobResponse (status=queued)
+    """
+    audio_file_path = await save_temp_audio_file(audio, directory=str(answer_job_queue.audio_dir))
+    try:
+        job = await answer_job_queue.enqueue(
+            user_id=user_id,
+            assessment_id=assessment_id,
+            competency_id=competency_id,
+            question_text=question_text,
+            difficulty=difficulty,
+            question_id=question_id,
+            audio_file_path=audio_file_path,
+            auto_complete=auto_complete
+        )
+    except Exception:
+        cleanup_temp_file(audio_file_path)
+        raise
+
+    return model_json_response(build_answer_job_response(job), status_code=202)
+
+
+async def get_answer_job_status(
+    answer_job_queue: AnswerJobQueue,
+    job_id: str,
+    user_id: str,
+    wait: float = 0,
+    assessment_id: Optional[str] = None
+) -> AnswerJobResponse:
+    """
+    Получить статус задачи, при wait > 0 - дождаться ее завершения (long-poll).
+
+    Raises:
+        HTTPException 404: Задача не найдена, устарела или принадлежит другому пользователю
+    """
+    job = await answer_job_queue.get_job(job_id)
+    if (
+        not job
+        or job['user_id'] != user_id
+        or (assessment_id is not None and job['assessment_id'] != assessment_id)
+    ):
+        raise HTTPException(status_code=404, detail="Answer job not found")
+
+    job = await answer_job_queue.wait_for_job(
+        job_id,
+        timeout=min(wait, settings.answer_jobs_max_wait_seconds)
+    )
+    if not job:
+        raise HTTPException(status_code=404, detail="Answer job not found")
+
+    return build_answer_job_response(job)
+
+
 @router.post(
     "/generate",
     response_model=QuestionGenerateResponse,
@@ -51,6 +173,25 @@ async def generate_question(
     Если вопрос не найден, возвращает ошибку 404.
     """
     try:
+        # Вопрос, подобранный заранее при обработке предыдущего ответа
+        # (владелец assessment проверен при постановке в кэш)
+        prefetched = assessment_service.pop_prefetched_question(
+            str(assessment_id),
+            str(competency_id),
+            user_id=user_id,
+            question_number=question_number,
+            difficulty=difficulty
+        )
+        if prefetched:
+            stored_question = prefetched['question']
+            if not stored_question:
+                return QuestionGenerateResponse(noMoreQuestions=True)
+
+            logger.info(f"Using prefetched question: {stored_question['id']}")
+            # Счетчик использования обновляем в фоне, не задерживая ответ
+            run_in_background(supabase_service.increment_question_usage(str(stored_question['id'])))
+            return build_question_response(stored_question, prefetched['difficulty'])
+
         # Проверяем доступ к assessment
         assessment = await assessment_service.get_assessment_with_progress(str(assessment_id))
         if not assessment:
@@ -58,7 +199,7 @@ async def generate_question(
         if assessment.get('user_id') != user_id:
             raise HTTPException(status_code=403, detail="Access denied")
 
-        # Получаем контекст
+        # Получаем контекст (история, использованные вопросы, текущая сложность) одним запросом
         context = await assessment_service.get_competency_assessment_context(
             str(assessment_id),
             str(competency_id)
@@ -88,25 +229,12 @@ async def generate_question(
         if not competency:
             raise HTTPException(status_code=404, detail="Competency not found")
 
-        # Получаем competency_assessment для получения уже использованных вопросов
-        ca = await supabase_service.get_competency_assessment_by_ids(
-            str(assessment_id),
-            str(competency_id)
-        )
-        
-        # Получаем список уже использованных вопросов для этого competency_assessment
-        exclude_question_ids = []
-        if ca and ca.get('id'):
-            question_history = await supabase_service.get_question_history(str(ca['id']))
-            # Собираем все question_id из истории, которые не None
-            exclude_question_ids = [
-                str(qh['question_id']) 
-                for qh in question_history 
-                if qh.get('question_id') is not None
-            ]
+        # Уже использованные вопросы берем из того же контекста (без повторных запросов)
+        exclude_question_ids = context.get('used_question_ids', [])
+        if exclude_question_ids:
             logger.info(
                 f"Found {len(exclude_question_ids)} already used questions for "
-                f"competency_assessment_id={ca['id']}"
+                f"competency_assessment_id={context.get('competency_assessment_id')}"
             )
 
         # Ищем вопрос в БД, исключая уже использованные
@@ -157,28 +285,7 @@ async def generate_question(
         # Увеличиваем счетчик использования
         await supabase_service.increment_question_usage(str(stored_question['id']))
         
-        question_text = stored_question['question_text']
-        # Обрабатываем expected_key_points - может быть списком или None
-        expected_key_points_raw = stored_question.get('expected_key_points')
-        if expected_key_points_raw is None:
-            expected_key_points = []
-        elif isinstance(expected_key_points_raw, list):
-            expected_key_points = expected_key_points_raw
-        else:
-            # Если это строка или другой тип, пытаемся преобразовать
-            expected_key_points = []
-        
-        estimated_answer_time = stored_question.get('estimated_answer_time', '1-2 минуты')
-        question_id = stored_question['id']
-
-        return QuestionGenerateResponse(
-            questionId=UUID(question_id),
-            questionText=question_text,
-            difficulty=difficulty,
-            estimatedAnswerTime=estimated_answer_time,
-            expectedKeyPoints=expected_key_points,
-            noMoreQuestions=False
-        )
+        return build_question_response(stored_question, difficulty)
 
     except HTTPException:
         raise
@@ -201,9 +308,9 @@ async def submit_answer(
     difficulty: int = Form(3, description="Сложность вопроса (1-5)", ge=1, le=5),
     question_id: Optional[UUID] = Form(None, description="ID вопроса из БД (если был использован сохраненный вопрос)"),
     audio: UploadFile = File(..., description="Аудио файл с ответом (webm, mp3, wav, m4a, ogg). Максимум 25MB"),
+    async_mode: bool = Form(False, description="Обработать ответ в фоне: сразу вернуть ID задачи (202) вместо результата"),
     assessment_service: AssessmentService = Depends(get_assessment_service),
-    supabase_service: SupabaseService = Depends(get_supabase_service),
-    openai_service: OpenAIService = Depends(get_openai_service),
+    answer_job_queue: AnswerJobQueue = Depends(get_answer_job_queue),
     user_id: str = Depends(get_current_user_id)
 ):
     """
@@ -216,6 +323,9 @@ async def submit_answer(
     4. Сохранение вопроса и ответа в базу данных (впервые)
     5. Обновление оценки компетенции
     
+    При async_mode=true шаги 2-5 выполняются фоновым воркером: эндпоинт возвращает
+    202 с job_id, результат забирается через GET /api/questions/answer-jobs/{job_id}.
+    
     Поддерживаемые форматы: webm, mp3, wav, m4a, ogg
     Максимальный размер файла: 25 MB
     """
@@ -238,162 +348,31 @@ async def submit_answer(
         if not is_valid:
             raise HTTPException(status_code=400, detail=error_msg)
 
-        # Получаем или создаем competency_assessment
-        ca = await supabase_service.get_competency_assessment_by_ids(
-            str(assessment_id),
-            str(competency_id)
-        )
-        if not ca:
-            ca = await supabase_service.create_competency_assessment(
-                str(assessment_id),
-                str(competency_id)
-            )
-        
-        if not ca or 'id' not in ca:
-            raise HTTPException(
-                status_code=500,
-                detail="Failed to get or create competency assessment"
+        # Асинхронный режим: ставим ответ в очередь и сразу возвращаем ID задачи
+        if async_mode:
+            return await enqueue_answer_job(
+                answer_job_queue,
+                audio=audio,
+                assessment_id=str(assessment_id),
+                competency_id=str(competency_id),
+                question_text=question_text,
+                difficulty=difficulty,
+                question_id=str(question_id) if question_id else None,
+                user_id=user_id
             )
-        
-        competency_assessment_id = ca['id']
-
-        # Получаем информацию о компетенции
-        competency_assessments = assessment.get('competency_assessments', [])
-        comp_assessment = next(
-            (ca_item for ca_item in competency_assessments if str(ca_item.get('competency_id')) == str(competency_id)),
-            None
-        )
-        competency = comp_assessment.get('competencies', {}) if comp_assessment else {}
-
-        # Проверяем доступ
-        if assessment.get('user_id') != user_id:
-            raise HTTPException(status_code=403, detail="Access denied")
 
         # Сохраняем временный файл
         temp_file_path = await save_temp_audio_file(audio)
 
-        # Транскрибируем аудио
-        transcription = await openai_service.transcribe_audio(temp_file_path)
-
-        # Оцениваем ответ
-        evaluation = await openai_service.evaluate_answer(
-            question_text=question_text,
-            transcript=transcription['text'],
-            competency_name=competency.get('name', 'Unknown') if competency else 'Unknown',
-            difficulty=difficulty
-        )
-
-        # Используем переданный question_id или пытаемся найти вопрос по тексту
-        stored_question_id = None
-        if question_id:
-            stored_question_id = str(question_id)
-            logger.info(f"Using provided question_id: {stored_question_id}")
-        else:
-            # Пытаемся найти сохраненный вопрос по тексту и компетенции
-            try:
-                stored_question = await supabase_service.find_question(
-                    competency_id=str(competency_id),
-                    difficulty=difficulty
-                )
-                # Проверяем, что текст совпадает (примерно)
-                if stored_question and stored_question.get('question_text') == question_text:
-                    stored_question_id = str(stored_question['id'])
-                    logger.info(f"Found stored question by text: {stored_question_id}")
-            except Exception as e:
-                logger.warning(f"Could not find stored question: {e}")
-
-        # Сохраняем вопрос и ответ в БД (впервые, только после ответа)
-        question_history = await supabase_service.create_question_history(
-            competency_assessment_id=str(competency_assessment_id),
+        result = await assessment_service.process_answer(
+            assessment=assessment,
+            competency_id=str(competency_id),
             question_text=question_text,
-            difficulty_level=difficulty,
-            question_type=None,
-            question_id=stored_question_id
-        )
-
-        if not question_history or 'id' not in question_history:
-            raise HTTPException(
-                status_code=500,
-                detail="Failed to create question history record"
-            )
-
-        # Обновляем вопрос с ответом и оценкой (сохраняем только оценки, не транскрипты)
-        await supabase_service.update_question_history(
-            question_id=str(question_history['id']),
-            score=evaluation.get('score'),
-            is_correct=evaluation.get('isCorrect'),
-            understanding_depth=evaluation.get('understandingDepth'),
-            feedback=evaluation.get('feedback'),
-            knowledge_gaps=evaluation.get('knowledgeGaps', []),
-            time_spent_seconds=None  # Можно добавить из фронтенда
-            # Транскрипт НЕ сохраняется для экономии места
-        )
-
-        # Обновляем competency_assessment с учетом новой оценки
-        # Собираем все оценки для этой компетенции
-        all_questions = await supabase_service.get_question_history(
-            str(competency_assessment_id)
-        )
-
-        # Используем новые структурированные поля
-        answered_questions = [q for q in all_questions if q.get('score') is not None]
-        if answered_questions:
-            # Вычисляем средний балл
-            scores = [q.get('score', 0) for q in answered_questions]
-            avg_score = sum(scores) / len(scores) if scores else 0
-
-            # Собираем все пробелы
-            all_gaps = []
-            for q in answered_questions:
-                gaps = q.get('knowledge_gaps', [])
-                if gaps:
-                    all_gaps.extend(gaps)
-
-            unique_gaps = list(set(all_gaps))
-
-            # Определяем confidence_level на основе количества ответов
-            if len(answered_questions) >= 5:
-                confidence = 'high'
-            elif len(answered_questions) >= 3:
-                confidence = 'medium'
-            else:
-                confidence = 'low'
-
-            # Округляем оценку (минимум 1, максимум 5)
-            final_score = max(1, min(5, int(round(avg_score))))
-            
-            logger.info(
-                f"Updating competency assessment {competency_assessment_id}: "
-                f"scores={scores}, avg_score={avg_score}, final_score={final_score}, "
-                f"confidence={confidence}, answered={len(answered_questions)}/{len(all_questions)}"
-            )
-            
-            await supabase_service.update_competency_assessment(
-                competency_assessment_id=str(competency_assessment_id),
-                ai_assessed_score=final_score,
-                confidence_level=confidence,
-                gap_analysis={'knowledgeGaps': unique_gaps},
-                test_session_data={
-                    'questionsCount': len(all_questions),
-                    'answeredCount': len(answered_questions),
-                    'averageScore': avg_score
-                }
-            )
-
-        return AnswerResponse(
-            transcript=transcription['text'],
-            evaluation=AnswerEvaluation(
-                score=evaluation['score'],
-                understandingDepth=evaluation['understandingDepth'],
-                isCorrect=evaluation['isCorrect'],
-                feedback=evaluation['feedback'],
-                knowledgeGaps=evaluation['knowledgeGaps'],
-                nextDifficulty=evaluation['nextDifficulty'],
-                reasoning=evaluation.get('reasoning'),
-                correctAnswer=evaluation.get('correctAnswer', ''),
-                expectedKeyPoints=evaluation.get('expectedKeyPoints', [])
-            )
+            difficulty=difficulty,
+            question_id=str(question_id) if question_id else None,
+            audio_file_path=temp_file_path
         )
+        return AnswerResponse(**result)
 
     except HTTPException:
         raise
@@ -404,3 +383,26 @@ async def submit_answer(
         # Очищаем временный файл
         if temp_file_path:
             cleanup_temp_file(temp_file_path)
+
+
+@router.get(
+    "/answer-jobs/{job_id}",
+    response_model=AnswerJobResponse,
+    summary="Статус фоновой обработки ответа",
+    description="Возвращает статус задачи, созданной POST /api/questions/answer с async_mode=true. "
+                "С параметром wait запрос ждет завершения задачи (long-poll)."
+)
+async def get_answer_job(
+    job_id: UUID,
+    wait: float = Query(0, ge=0, description="Сколько секунд ждать завершения задачи (ограничено настройкой сервера)"),
+    answer_job_queue: AnswerJobQueue = Depends(get_answer_job_queue),
+    user_id: str = Depends(get_current_user_id)
+):
+    """
+    Получить результат фоновой обработки ответа.
+    
+    Пока status равен queued или processing, result пустой. При status=completed
+    result содержит тот же AnswerResponse, что и синхронный эндпоинт,
+    при status=failed - описание ошибки в error.
+    """
+    return await get_answer_job_status(answer_job_queue, str(job_id), user_id, wait=wait)
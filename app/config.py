@@ -11,7 +11,105 @@ class Settings(BaseSettings):
     # OpenAI
     openai_api_key: str
     openai_timeout: int = 180  # Таймаут для OpenAI API запросов в секундах (по умолчанию 180)
-    
+
+    # HTTP пул соединений для OpenAI (общий httpx.AsyncClient на весь процесс)
+    openai_max_connections: int = 100  # Максимум одновременных соединений
+    openai_max_keepalive_connections: int = 20  # Сколько простаивающих соединений держать открытыми
+    openai_keepalive_expiry: float = 30.0  # Через сколько секунд закрывать простаивающее соединение
+    openai_pool_timeout: float = 30.0  # Сколько ждать свободного соединения из пула, секунды
+    openai_http2: bool = False  # HTTP/2 (требует пакет h2)
+
+    # Маршрутизация моделей по операциям OpenAIService
+    # (в .env задается JSON: OPENAI_MODEL_ROUTES='{"evaluate_answer": "gpt-4o"}')
+    openai_model_routes: dict[str, str] = {
+        "generate_question": "gpt-4-turbo-preview",
+        "evaluate_answer": "gpt-4-turbo-preview",
+        "determine_competencies": "gpt-4-turbo-preview",
+        "reference_answer": "gpt-4-turbo-preview",
+    }
+    # Быстрая/дешевая модель для работы под нагрузкой (не задана - fallback отключен)
+    openai_fallback_model: Optional[str] = None
+    openai_fallback_max_in_flight: int = 0  # Переключаться, когда запросов в полете >= N (0 - не учитывать)
+    openai_fallback_latency_seconds: float = 0.0  # Переключаться, когда средняя латентность операции выше (0 - не учитывать)
+    openai_fallback_cooldown_seconds: float = 60.0  # Сколько держать fallback после превышения латентности
+
+    # Кэш оценок ответов и локальная оценка тривиальных ответов
+    evaluation_cache_size: int = 2048
+    evaluation_cache_ttl_seconds: float = 86400.0  # Сутки
+    evaluation_trivial_phrases: list[str] = [
+        "не знаю", "я не знаю", "не помню", "без понятия", "затрудняюсь ответить",
+        "нет ответа", "пропустить", "пропускаю", "дальше", "следующий вопрос",
+        "i don't know", "i do not know", "no idea", "skip", "pass", "next question",
+    ]
+
+    # Кэш компетенций по тексту направления (in-memory поверх таблицы direction_competency_cache)
+    direction_competencies_cache_size: int = 256
+    # Направление без компетенций при старте тестирования: определить их через GPT и
+    # привязать к направлению. По умолчанию выключено - ошибка 400, компетенции добавляет
+    # администратор (иначе любое введенное направление пополняет общий справочник)
+    direction_competencies_autodetect: bool = False
+
+    # In-memory индекс банка вопросов (поиск вопросов без запросов к БД)
+    question_bank_index_enabled: bool = True
+    question_bank_refresh_seconds: float = 60.0  # Интервал догрузки измененных вопросов (по updated_at)
+    question_bank_full_reload_seconds: float = 3600.0  # Интервал полной перезагрузки (видит удаления)
+
+    # Кэш справочников (направления, технологии, компетенции по имени)
+    catalog_cache_size: int = 2048
+    catalog_cache_ttl_seconds: float = 600.0
+
+    # Учет пользователей при старте тестирования
+    known_users_cache_size: int = 10000
+    user_last_login_update_interval_seconds: float = 900.0  # Как часто обновлять users.last_login
+
+    # Список тестирований пользователя (GET /api/assessments)
+    assessments_page_size: int = 50  # Размер страницы, если limit не передан
+    assessments_max_page_size: int = 200
+
+    # Сжатие ответов (gzip, brotli - если установлен пакет brotli)
+    compression_enabled: bool = True
+    compression_minimum_size: int = 1024  # Ответы меньше (в байтах) не сжимаются
+    compression_gzip_level: int = 6
+    compression_brotli_quality: int = 4  # 4-5 - баланс скорости и степени сжатия для динамических ответов
+    compression_excluded_paths: list[str] = [  # Регулярные выражения путей (загрузка аудио)
+        r"^/api/questions/answer$",
+        r"^/api/assessments/[^/]+/answers$",
+    ]
+
+    # Заранее собранная OpenAPI схема (scripts/export_openapi.py), путь от корня проекта.
+    # Пусто - схема всегда генерируется при первом запросе /openapi.json
+    openapi_artifact_path: Optional[str] = "openapi.json"
+
+    # Потоковая выгрузка результатов (GET /api/admin/export/{dataset})
+    export_page_size: int = 1000  # Строк за один запрос к БД (не больше max-rows PostgREST)
+
+    # Предвыборка следующего вопроса после оценки ответа
+    next_question_prefetch_cache_size: int = 4096
+    next_question_prefetch_ttl_seconds: float = 900.0  # Дольше клиент обычно не думает над ответом
+
+    # Фоновая обработка ответов (async_mode в эндпоинтах отправки ответа)
+    answer_jobs_workers: int = 4  # Сколько ответов обрабатывается одновременно
+    answer_jobs_dir: str = "var/answer_jobs"  # Журнал задач и аудио, ожидающее обработки
+    answer_jobs_result_ttl_seconds: float = 3600.0  # Сколько хранить результат завершенной задачи
+    answer_jobs_max_wait_seconds: float = 30.0  # Максимальное время long-poll ожидания результата
+    answer_jobs_compact_every: int = 200  # Сжимать журнал задач после стольких завершенных задач
+
+    # Аутентификация (JWT в заголовке Authorization)
+    jwt_verify_signature: bool = False  # Проверять подпись, exp, aud, iss
+    jwt_jwks_url: Optional[str] = None  # JWKS провайдера (Keycloak: .../protocol/openid-connect/certs)
+    jwt_secret: Optional[str] = None  # Секрет для HS256 токенов (если JWKS не используется)
+    jwt_algorithms: Optional[list[str]] = None  # По умолчанию RS256 с JWKS, HS256 только с JWT_SECRET
+    jwt_audience: Optional[str] = None
+    jwt_issuer: Optional[str] = None
+    jwt_claims_cache_size: int = 4096  # Сколько декодированных токенов держать в памяти
+    jwt_claims_cache_ttl_seconds: float = 300.0  # Не дольше exp токена при проверке подписи
+    jwt_jwks_cache_ttl_seconds: float = 3600.0
+
+    # Администраторы (выгрузка персональных данных: GET /api/admin/export/{dataset})
+    admin_user_ids: list[str] = []  # sub пользователей-администраторов
+    admin_role: Optional[str] = None  # Роль в токене (roles или realm_access.roles), например "talim-admin"
+    admin_allow_unverified_tokens: bool = False  # Только для локальной разработки: админ по токену без проверки подписи
+
     # Application
     environment: str = "development"
     log_level: str = "INFO"
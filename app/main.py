@@ -1,11 +1,18 @@
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.openapi.utils import get_openapi
+from fastapi.openapi.docs import get_redoc_html, get_swagger_ui_html
+from fastapi.responses import Response
 import logging
-import json
 from app.config import settings
+from app.utils.openapi import OpenAPISchemaProvider, resolve_artifact_path
+from app.utils.responses import DefaultJSONResponse
+from app.middleware.compression import CompressionMiddleware
 from app.database import init_db
 from app.api import roles, assessments, questions, admin, catalog
+from app.api.deps import (
+    close_openai_service, get_answer_job_queue, stop_answer_job_queue,
+    get_question_bank, stop_question_bank
+)
 
 # Настройка логирования
 logging.basicConfig(
@@ -43,6 +50,11 @@ app = FastAPI(
     contact={
         "name": "Talim AI",
     },
+    default_response_class=DefaultJSONResponse,  # orjson вместо stdlib json
+    # Встроенные /openapi.json, /docs и /redoc заменены ниже: схема отдается из артефакта
+    openapi_url=None,
+    docs_url=None,
+    redoc_url=None,
 )
 
 # CORS middleware
@@ -52,8 +64,19 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=[assessments.NEXT_CURSOR_HEADER],  # Курсор пагинации списка тестирований
 )
 
+# Сжатие ответов gzip/brotli
+if settings.compression_enabled:
+    app.add_middleware(
+        CompressionMiddleware,
+        minimum_size=settings.compression_minimum_size,
+        gzip_level=settings.compression_gzip_level,
+        brotli_quality=settings.compression_brotli_quality,
+        excluded_paths=settings.compression_excluded_paths,
+    )
+
 # Подключаем роутеры
 app.include_router(catalog.router)      # Новый: каталог направлений и технологий
 app.include_router(assessments.router)  # Основные endpoints для assessments
@@ -68,12 +91,29 @@ async def startup_event():
     logger.info("Starting Talim AI Backend...")
     try:
         init_db()
+        question_bank = get_question_bank()
+        if question_bank is not None:
+            try:
+                await question_bank.start()
+            except Exception as e:
+                # Без индекса поиск вопросов работает через БД
+                logger.error(f"Question bank index is not loaded, falling back to DB queries: {e}")
+        await get_answer_job_queue().start()
         logger.info("Application started successfully")
     except Exception as e:
         logger.error(f"Error during startup: {e}")
         raise
 
 
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Освобождение ресурсов при остановке приложения"""
+    await stop_answer_job_queue()
+    await stop_question_bank()
+    await close_openai_service()
+    logger.info("Application stopped")
+
+
 @app.get("/")
 async def root():
     """Корневой endpoint"""
@@ -90,23 +130,33 @@ async def health_check():
     return {"status": "healthy"}
 
 
+# OpenAPI схема: заранее собранный артефакт, при его отсутствии - генерация при первом запросе
+openapi_provider = OpenAPISchemaProvider(
+    app,
+    resolve_artifact_path(settings.openapi_artifact_path) if settings.openapi_artifact_path else None
+)
+app.openapi = openapi_provider.schema
+
+
 @app.get("/openapi.json", include_in_schema=False)
 async def get_openapi_endpoint():
     """
     Получить OpenAPI схему в JSON формате.
     Используется фронтендом для генерации типов и API клиентов.
     """
-    if app.openapi_schema:
-        return app.openapi_schema
-    
-    openapi_schema = get_openapi(
-        title=app.title,
-        version=app.version,
-        description=app.description,
-        routes=app.routes,
-    )
-    app.openapi_schema = openapi_schema
-    return openapi_schema
+    return Response(content=openapi_provider.body(), media_type="application/json")
+
+
+@app.get("/docs", include_in_schema=False)
+async def swagger_ui():
+    """Swagger UI"""
+    return get_swagger_ui_html(openapi_url="/openapi.json", title=f"{app.title} - Swagger UI")
+
+
+@app.get("/redoc", include_in_schema=False)
+async def redoc():
+    """ReDoc"""
+    return get_redoc_html(openapi_url="/openapi.json", title=f"{app.title} - ReDoc")
 
 
 if __name__ == "__main__":
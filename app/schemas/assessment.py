@@ -47,3 +47,25 @@ class AssessmentResponse(BaseModel):
     started_at: datetime
     completed_at: Optional[datetime] = None
     competency_assessments: List[CompetencyAssessmentResponse] = []
+
+
+class ProgressAttempt(BaseModel):
+    assessment_id: UUID
+    attempt_number: Optional[int] = None
+    overall_score: Optional[float] = None
+    completed_at: Optional[datetime] = None
+
+
+class UserProgressSummary(BaseModel):
+    direction_id: Optional[UUID] = None
+    direction_name: Optional[str] = None
+    technology_id: Optional[UUID] = None
+    technology_name: Optional[str] = None
+    completed_count: int = 0
+    best_score: Optional[float] = None
+    last_score: Optional[float] = None
+    previous_score: Optional[float] = None
+    average_score: Optional[float] = None
+    recent_attempts: List[ProgressAttempt] = []  # От последней попытки к старым (не больше 10)
+    first_completed_at: Optional[datetime] = None
+    last_completed_at: Optional[datetime] = None
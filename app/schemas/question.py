@@ -1,6 +1,7 @@
 from pydantic import BaseModel
 from typing import List, Optional
 from uuid import UUID
+from datetime import datetime
 
 
 class QuestionGenerateResponse(BaseModel):
@@ -32,6 +33,18 @@ class AnswerResponse(BaseModel):
     evaluation: AnswerEvaluation
 
 
+class AnswerJobResponse(BaseModel):
+    """Статус фоновой обработки голосового ответа"""
+    job_id: str
+    status: str  # queued, processing, completed, failed
+    result: Optional[AnswerResponse] = None  # Заполняется при status=completed
+    error: Optional[str] = None  # Заполняется при status=failed
+    assessment_auto_completed: bool = False
+    overall_score: Optional[float] = None
+    created_at: datetime
+    updated_at: datetime
+
+
 class QuestionListItem(BaseModel):
     """Элемент списка вопросов"""
     id: UUID
@@ -0,0 +1,601 @@
+import asyncio
+import json
+import logging
+import os
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, TextIO, Tuple
+
+from app.services.assessment_service import AssessmentService
+from app.services.supabase_service import SupabaseService
+from app.utils.audio import cleanup_temp_file
+
+try:
+    import fcntl
+except ImportError:  # Windows: один процесс - один общий журнал
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+JOB_QUEUED = "queued"
+JOB_PROCESSING = "processing"
+JOB_COMPLETED = "completed"
+JOB_FAILED = "failed"
+
+FINISHED_STATUSES = (JOB_COMPLETED, JOB_FAILED)
+
+# Допустимое расхождение часов приложения и БД при поиске уже записанного ответа
+CLOCK_SKEW = timedelta(seconds=60)
+
+# Как часто long-poll перечитывает из БД задачу, которую обрабатывает другой процесс
+REMOTE_POLL_INTERVAL_SECONDS = 1.0
+
+
+class AnswerJobQueue:
+    """
+    Фоновая обработка голосовых ответов.
+
+    Эндпоинт сохраняет аудио и ставит задачу в очередь, а пул воркеров выполняет
+    транскрипцию, оценку и запись результата в БД. Так число одновременных HTTP
+    запросов не зависит от латентности Whisper/GPT.
+
+    Задачу обрабатывает процесс, который ее принял. Ее состояние дублируется в
+    локальный журнал (JSONL, одна запись на изменение статуса): после перезапуска
+    незавершенные задачи ставятся в очередь заново, а готовые результаты остаются
+    доступны до истечения result_ttl_seconds.
+
+    У каждого процесса (воркера uvicorn) свой журнал journal-{N}.jsonl: номер N
+    процесс занимает блокировкой journal-{N}.lock. При старте процесс забирает и
+    журналы завершившихся процессов, номера которых никто не занял. Журнал сжимается
+    до текущего состояния при старте и каждые compact_every завершенных задач.
+
+    Статус задачи запрашивается у любого воркера, поэтому каждое изменение статуса
+    публикуется в таблицу answer_jobs (supabase_factory): задачи других процессов
+    get_job и wait_for_job читают оттуда.
+    """
+
+    def __init__(
+        self,
+        service_factory: Callable[[], AssessmentService],
+        supabase_factory: Optional[Callable[[], SupabaseService]] = None,
+        jobs_dir: str = "var/answer_jobs",
+        workers: int = 4,
+        result_ttl_seconds: float = 3600.0,
+        compact_every: int = 200
+    ):
+        self.service_factory = service_factory
+        self.supabase_factory = supabase_factory  # None - статус задач виден только этому процессу
+        self.jobs_dir = Path(jobs_dir)
+        self.audio_dir = self.jobs_dir / "audio"
+        self.journal_path: Optional[Path] = None  # Выбирается при старте (_claim_journal)
+        self.workers = max(1, workers)
+        self.result_ttl_seconds = result_ttl_seconds
+        self.compact_every = max(1, compact_every)
+
+        self._jobs: Dict[str, Dict] = {}
+        self._events: Dict[str, asyncio.Event] = {}
+        self._queue: Optional[asyncio.Queue] = None
+        self._worker_tasks: list[asyncio.Task] = []
+        self._journal_lock = asyncio.Lock()
+        self._journal_lock_file: Optional[TextIO] = None
+        self._finished_since_compaction = 0
+
+    # === Жизненный цикл ===
+
+    async def start(self):
+        """Восстановить задачи из журнала и запустить воркеры"""
+        if self._worker_tasks:
+            return
+
+        self.audio_dir.mkdir(parents=True, exist_ok=True)
+        self._queue = asyncio.Queue()
+
+        started_at = time.time()
+        self.journal_path = self._claim_journal()
+        orphans = self._adopt_orphan_journals()
+        pending, interrupted = self._replay_journal([self.journal_path] + [path for path, _ in orphans])
+        pending.extend(await self._resolve_interrupted(interrupted))
+        pending.sort(key=lambda j: j['created_at'])
+        self._write_snapshot(self._snapshot_lines())
+        self._release_orphan_journals(orphans)
+
+        # Статусы, измененные при восстановлении (повтор или отказ), видны остальным воркерам
+        await self._publish([job for job in self._jobs.values() if job['updated_at'] >= started_at])
+        await self._purge_expired_published()
+        for job in pending:
+            self._queue.put_nowait(job['job_id'])
+
+        self._worker_tasks = [
+            asyncio.create_task(self._worker(i), name=f"answer-job-worker-{i}")
+            for i in range(self.workers)
+        ]
+        logger.info(
+            f"Answer job queue started: journal={self.journal_path.name}, workers={self.workers}, "
+            f"adopted_journals={len(orphans)}, restored={len(self._jobs)}, requeued={len(pending)}"
+        )
+
+    async def stop(self):
+        """
+        Остановить воркеры.
+
+        Задачи, которые не успели завершиться, остаются в журнале и будут
+        обработаны после перезапуска.
+        """
+        for task in self._worker_tasks:
+            task.cancel()
+        await asyncio.gather(*self._worker_tasks, return_exceptions=True)
+        self._worker_tasks = []
+        if self._journal_lock_file is not None:
+            # Закрытие файла снимает блокировку: номер журнала освобождается
+            self._journal_lock_file.close()
+            self._journal_lock_file = None
+        logger.info("Answer job queue stopped")
+
+    # === Публичный API ===
+
+    async def enqueue(
+        self,
+        user_id: str,
+        assessment_id: str,
+        competency_id: str,
+        question_text: str,
+        difficulty: int,
+        question_id: Optional[str],
+        audio_file_path: str,
+        auto_complete: bool = False
+    ) -> Dict:
+        """
+        Поставить ответ в очередь.
+
+        Args:
+            audio_file_path: Аудио, сохраненное в audio_dir (удаляется после обработки)
+            auto_complete: Завершить assessment, если после ответа все компетенции оценены
+
+        Returns:
+            Запись задачи
+        """
+        if self._queue is None:
+            raise RuntimeError("Answer job queue is not started")
+
+        self._purge_expired()
+
+        now = time.time()
+        job = {
+            "job_id": str(uuid.uuid4()),
+            "status": JOB_QUEUED,
+            "user_id": user_id,
+            "assessment_id": assessment_id,
+            "competency_id": competency_id,
+            "question_text": question_text,
+            "difficulty": difficulty,
+            "question_id": question_id,
+            "audio_file_path": audio_file_path,
+            "auto_complete": auto_complete,
+            "result": None,
+            "error": None,
+            "assessment_auto_completed": False,
+            "overall_score": None,
+            "created_at": now,
+            "updated_at": now,
+        }
+
+        self._jobs[job['job_id']] = job
+        self._events[job['job_id']] = asyncio.Event()
+        # Журнал пишется до постановки в очередь: принятый ответ не теряется при падении процесса
+        await self._append_journal({"op": "put", "job": job})
+        await self._publish([job])
+        self._queue.put_nowait(job['job_id'])
+
+        logger.info(f"Answer job {job['job_id']} queued (assessment {assessment_id}, queue size {self._queue.qsize()})")
+        return job
+
+    async def get_job(self, job_id: str) -> Optional[Dict]:
+        """
+        Получить задачу по ID (None если не найдена или результат устарел).
+
+        Задачи, принятые другим процессом, читаются из таблицы answer_jobs.
+        """
+        self._purge_expired()
+        job = self._jobs.get(job_id)
+        if job is not None:
+            return job
+        return await self._fetch_published(job_id)
+
+    async def wait_for_job(self, job_id: str, timeout: float) -> Optional[Dict]:
+        """
+        Long-poll: дождаться завершения задачи, но не дольше timeout секунд.
+
+        Returns:
+            Задача в текущем состоянии (может быть еще не завершена)
+        """
+        job = await self.get_job(job_id)
+        if not job or job['status'] in FINISHED_STATUSES or timeout <= 0:
+            return job
+
+        if job_id not in self._jobs:
+            # Задачу обрабатывает другой процесс: событие завершения здесь не сработает
+            deadline = time.monotonic() + timeout
+            while job and job['status'] not in FINISHED_STATUSES:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                await asyncio.sleep(min(REMOTE_POLL_INTERVAL_SECONDS, remaining))
+                job = await self._fetch_published(job_id)
+            return job
+
+        event = self._events.setdefault(job_id, asyncio.Event())
+        try:
+            await asyncio.wait_for(event.wait(), timeout=timeout)
+        except asyncio.TimeoutError:
+            pass
+        return self._jobs.get(job_id)
+
+    def stats(self) -> Dict:
+        """Размер очереди и количество задач по статусам"""
+        by_status: Dict[str, int] = {}
+        for job in self._jobs.values():
+            by_status[job['status']] = by_status.get(job['status'], 0) + 1
+        return {
+            "workers": len(self._worker_tasks),
+            "queue_size": self._queue.qsize() if self._queue else 0,
+            "jobs": by_status,
+        }
+
+    # === Обработка ===
+
+    async def _worker(self, index: int):
+        while True:
+            job_id = await self._queue.get()
+            try:
+                job = self._jobs.get(job_id)
+                if job and job['status'] not in FINISHED_STATUSES:
+                    await self._process(job)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Answer job worker {index} crashed on job {job_id}: {e}")
+            finally:
+                self._queue.task_done()
+
+    async def _process(self, job: Dict):
+        job_id = job['job_id']
+        await self._update(job, status=JOB_PROCESSING)
+
+        try:
+            assessment_service = self.service_factory()
+            assessment = await assessment_service.get_assessment_with_progress(job['assessment_id'])
+            if not assessment:
+                raise ValueError("Assessment not found")
+
+            result = await assessment_service.process_answer(
+                assessment=assessment,
+                competency_id=job['competency_id'],
+                question_text=job['question_text'],
+                difficulty=job['difficulty'],
+                question_id=job['question_id'],
+                audio_file_path=job['audio_file_path']
+            )
+
+            changes = {"status": JOB_COMPLETED, "result": result}
+            if job.get('auto_complete'):
+                try:
+                    completed = await assessment_service.auto_complete_if_finished(job['assessment_id'])
+                    if completed:
+                        changes["assessment_auto_completed"] = True
+                        changes["overall_score"] = completed.get('overall_score')
+                except Exception as e:
+                    # Не критично, если авто-complete не сработал
+                    logger.warning(f"Auto-complete check failed for assessment {job['assessment_id']}: {e}")
+
+            await self._update(job, **changes)
+            logger.info(f"Answer job {job_id} completed")
+
+        except asyncio.CancelledError:
+            # Остановка приложения: задача останется в журнале как processing и будет повторена
+            raise
+        except Exception as e:
+            detail = getattr(e, 'detail', None) or str(e)
+            logger.error(f"Answer job {job_id} failed: {detail}")
+            await self._update(job, status=JOB_FAILED, error=str(detail))
+
+        cleanup_temp_file(job['audio_file_path'])
+
+    async def _update(self, job: Dict, **changes):
+        changes["updated_at"] = time.time()
+        job.update(changes)
+        await self._append_journal({"op": "update", "job_id": job['job_id'], "changes": changes})
+        await self._publish([job])
+
+        if job['status'] in FINISHED_STATUSES:
+            event = self._events.get(job['job_id'])
+            if event:
+                event.set()
+
+            self._finished_since_compaction += 1
+            if self._finished_since_compaction >= self.compact_every:
+                await self._compact_journal()
+
+    def _purge_expired(self):
+        """Удалить завершенные задачи старше result_ttl_seconds"""
+        deadline = time.time() - self.result_ttl_seconds
+        expired = [
+            job_id for job_id, job in self._jobs.items()
+            if job['status'] in FINISHED_STATUSES and job['updated_at'] < deadline
+        ]
+        for job_id in expired:
+            self._jobs.pop(job_id, None)
+            self._events.pop(job_id, None)
+
+    # === Общий статус задач (таблица answer_jobs) ===
+
+    async def _publish(self, jobs: List[Dict]):
+        """
+        Записать состояние задач в answer_jobs, откуда их читают остальные процессы.
+
+        Ошибка не прерывает обработку: задача остается доступной процессу-владельцу.
+        """
+        if self.supabase_factory is None or not jobs:
+            return
+        try:
+            await self.supabase_factory().save_answer_jobs([self._to_row(job) for job in jobs])
+        except Exception as e:
+            logger.error(f"Error publishing answer job status ({len(jobs)} jobs): {e}")
+
+    async def _fetch_published(self, job_id: str) -> Optional[Dict]:
+        """Задача другого процесса из answer_jobs (None если не найдена или результат устарел)"""
+        if self.supabase_factory is None:
+            return None
+        try:
+            row = await self.supabase_factory().get_answer_job(job_id)
+        except Exception as e:
+            logger.error(f"Error fetching answer job {job_id}: {e}")
+            raise
+
+        if not row:
+            return None
+        job = self._from_row(row)
+        if job['status'] in FINISHED_STATUSES and job['updated_at'] < time.time() - self.result_ttl_seconds:
+            return None
+        return job
+
+    async def _purge_expired_published(self):
+        """Удалить из answer_jobs завершенные задачи старше result_ttl_seconds (всех процессов)"""
+        if self.supabase_factory is None:
+            return
+        deadline = datetime.now(timezone.utc) - timedelta(seconds=self.result_ttl_seconds)
+        try:
+            await self.supabase_factory().delete_finished_answer_jobs(deadline, list(FINISHED_STATUSES))
+        except Exception as e:
+            logger.error(f"Error purging expired answer jobs: {e}")
+
+    @staticmethod
+    def _to_row(job: Dict) -> Dict:
+        """Строка answer_jobs: только то, что отдается в статусе задачи"""
+        return {
+            "id": job['job_id'],
+            "user_id": job['user_id'],
+            "assessment_id": job['assessment_id'],
+            "status": job['status'],
+            # Через JSON: в результате могут быть значения, которые клиент БД не сериализует
+            "result": json.loads(json.dumps(job['result'], default=str)) if job.get('result') is not None else None,
+            "error": job.get('error'),
+            "assessment_auto_completed": job.get('assessment_auto_completed', False),
+            "overall_score": job.get('overall_score'),
+            "created_at": datetime.fromtimestamp(job['created_at'], tz=timezone.utc).isoformat(),
+            "updated_at": datetime.fromtimestamp(job['updated_at'], tz=timezone.utc).isoformat(),
+        }
+
+    @staticmethod
+    def _from_row(row: Dict) -> Dict:
+        """Задача в формате очереди из строки answer_jobs"""
+        return {
+            "job_id": str(row['id']),
+            "user_id": str(row['user_id']),
+            "assessment_id": str(row['assessment_id']),
+            "status": row['status'],
+            "result": row.get('result'),
+            "error": row.get('error'),
+            "assessment_auto_completed": bool(row.get('assessment_auto_completed')),
+            "overall_score": row.get('overall_score'),
+            "created_at": datetime.fromisoformat(str(row['created_at']).replace('Z', '+00:00')).timestamp(),
+            "updated_at": datetime.fromisoformat(str(row['updated_at']).replace('Z', '+00:00')).timestamp(),
+        }
+
+    # === Журнал ===
+
+    def _claim_journal(self) -> Path:
+        """
+        Занять свободный номер журнала (journal-0, journal-1, ...).
+
+        Блокировка flock держится до остановки очереди или завершения процесса, поэтому
+        несколько воркеров uvicorn не читают и не перезаписывают журналы друг друга.
+        """
+        if fcntl is None:
+            return self.jobs_dir / "journal.jsonl"
+
+        slot = 0
+        while True:
+            lock_file = open(self.jobs_dir / f"journal-{slot}.lock", "a")
+            try:
+                fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError:
+                lock_file.close()
+                slot += 1
+                continue
+            self._journal_lock_file = lock_file
+            break
+
+        journal_path = self.jobs_dir / f"journal-{slot}.jsonl"
+        legacy_path = self.jobs_dir / "journal.jsonl"
+        if slot == 0 and legacy_path.exists() and not journal_path.exists():
+            # Общий журнал предыдущей версии переходит к первому процессу
+            os.replace(legacy_path, journal_path)
+        return journal_path
+
+    async def _append_journal(self, record: Dict):
+        line = json.dumps(record, ensure_ascii=False, default=str) + "\n"
+        async with self._journal_lock:
+            await asyncio.to_thread(self._write_lines, self.journal_path, [line], "a")
+
+    @staticmethod
+    def _write_lines(path: Path, lines: list[str], mode: str):
+        with open(path, mode, encoding="utf-8") as f:
+            f.writelines(lines)
+            f.flush()
+            os.fsync(f.fileno())
+
+    def _adopt_orphan_journals(self) -> List[Tuple[Path, TextIO]]:
+        """
+        Занять журналы завершившихся процессов, номера которых никто не держит.
+
+        Иначе задачи упавшего воркера ждали бы процесса с тем же номером журнала,
+        а после уменьшения числа воркеров - не дождались бы вовсе.
+
+        Returns:
+            [(путь журнала, файл его блокировки)] - освобождаются после записи снимка
+        """
+        if fcntl is None:
+            return []
+
+        orphans = []
+        for journal_path in sorted(self.jobs_dir.glob("journal-*.jsonl")):
+            if journal_path == self.journal_path:
+                continue
+            lock_file = open(journal_path.with_suffix(".lock"), "a")
+            try:
+                fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError:
+                # Журнал работающего процесса
+                lock_file.close()
+                continue
+            orphans.append((journal_path, lock_file))
+        return orphans
+
+    @staticmethod
+    def _release_orphan_journals(orphans: List[Tuple[Path, TextIO]]):
+        """Удалить перенесенные в свой журнал чужие журналы и снять их блокировки"""
+        for journal_path, lock_file in orphans:
+            journal_path.unlink(missing_ok=True)
+            lock_file.close()
+
+    def _replay_journal(self, journal_paths: List[Path]) -> Tuple[List[Dict], List[Dict]]:
+        """
+        Восстановить состояние задач из журналов (своего и занятых чужих).
+
+        Returns:
+            (задачи в статусе queued - ставятся в очередь заново,
+             задачи, прерванные в статусе processing - их ответ мог быть уже записан в БД)
+        """
+        for journal_path in journal_paths:
+            if not journal_path.exists():
+                continue
+
+            with open(journal_path, encoding="utf-8") as f:
+                for line_number, line in enumerate(f, 1):
+                    line = line.strip()
+                    if not line:
+                        continue
+                    try:
+                        record = json.loads(line)
+                    except json.JSONDecodeError:
+                        # Оборванная последняя строка после аварийного завершения
+                        logger.warning(f"Skipping corrupted line {line_number} of answer job journal {journal_path.name}")
+                        continue
+
+                    if record.get('op') == 'put':
+                        self._jobs[record['job']['job_id']] = record['job']
+                    elif record.get('op') == 'update' and record.get('job_id') in self._jobs:
+                        self._jobs[record['job_id']].update(record.get('changes', {}))
+
+        self._purge_expired()
+
+        pending = []
+        interrupted = []
+        for job_id, job in list(self._jobs.items()):
+            if job['status'] in FINISHED_STATUSES:
+                self._events[job_id] = asyncio.Event()
+                self._events[job_id].set()
+                continue
+            self._events[job_id] = asyncio.Event()
+            if not os.path.exists(job['audio_file_path']):
+                self._fail_restored(job, "Audio file is missing after restart")
+                continue
+            if job['status'] == JOB_PROCESSING:
+                interrupted.append(job)
+            else:
+                pending.append(job)
+
+        return pending, interrupted
+
+    async def _resolve_interrupted(self, jobs: List[Dict]) -> List[Dict]:
+        """
+        Решить судьбу задач, прерванных во время обработки.
+
+        Если ответ уже попал в question_history, повтор добавил бы вторую строку
+        истории и пересчитал оценку дважды - такая задача завершается ошибкой.
+        Если не попал - задача ставится в очередь заново.
+
+        Returns:
+            Задачи, которые нужно обработать повторно
+        """
+        if not jobs:
+            return []
+
+        assessment_service = self.service_factory()
+        retry = []
+        for job in jobs:
+            since = datetime.fromtimestamp(job['created_at'], tz=timezone.utc) - CLOCK_SKEW
+            try:
+                recorded = await assessment_service.is_answer_recorded(
+                    job['assessment_id'], job['competency_id'], job['question_text'], since
+                )
+            except Exception as e:
+                logger.error(f"Could not check answer job {job['job_id']} before retry: {e}")
+                self._fail_restored(job, "Processing was interrupted by a restart, please submit the answer again")
+                continue
+
+            if recorded:
+                logger.warning(f"Answer job {job['job_id']} was already recorded before restart, not retrying")
+                self._fail_restored(
+                    job,
+                    "Processing was interrupted by a restart after the answer was saved; "
+                    "reload the assessment to see the result"
+                )
+                continue
+
+            job.update(status=JOB_QUEUED, updated_at=time.time())
+            retry.append(job)
+        return retry
+
+    def _fail_restored(self, job: Dict, error: str):
+        """Завершить восстановленную из журнала задачу ошибкой (до старта воркеров)"""
+        job.update(status=JOB_FAILED, error=error, updated_at=time.time())
+        self._events.setdefault(job['job_id'], asyncio.Event()).set()
+        cleanup_temp_file(job['audio_file_path'])
+
+    async def _compact_journal(self):
+        """
+        Сжать журнал до текущего состояния задач: история изменений заменяется
+        последней записью каждой задачи. Завершенные задачи остаются в журнале до
+        истечения result_ttl_seconds, затем выбрасываются.
+        """
+        async with self._journal_lock:
+            self._purge_expired()
+            self._finished_since_compaction = 0
+            lines = self._snapshot_lines()
+            await asyncio.to_thread(self._write_snapshot, lines)
+        await self._purge_expired_published()
+
+    def _snapshot_lines(self) -> list[str]:
+        return [
+            json.dumps({"op": "put", "job": job}, ensure_ascii=False, default=str) + "\n"
+            for job in self._jobs.values()
+        ]
+
+    def _write_snapshot(self, lines: list[str]):
+        """Перезаписать журнал текущим состоянием задач (без истории изменений)"""
+        tmp_path = self.journal_path.with_suffix(".tmp")
+        self._write_lines(tmp_path, lines, "w")
+        os.replace(tmp_path, self.journal_path)
@@ -1,11 +1,45 @@
+import asyncio
+from datetime import datetime, timezone
 from typing import Dict, List, Optional
 from uuid import UUID
 import logging
-from app.services.supabase_service import SupabaseService
+from fastapi import HTTPException
+from app.config import settings
+from app.services.supabase_service import QUESTION_HISTORY_SCORING_COLUMNS, SupabaseService
 from app.services.openai_service import OpenAIService
+from app.utils.cache import LRUCache
+from app.utils.text import normalize_direction_key
 
 logger = logging.getLogger(__name__)
 
+# Компетенции по нормализованному ключу направления (общий для всех запросов процесса)
+_direction_competencies_cache = LRUCache(maxsize=settings.direction_competencies_cache_size)
+
+# Пользователи, уже заведенные в БД этим процессом. TTL записи - интервал обновления
+# last_login: пока запись жива, users не трогаем вообще
+_known_users = LRUCache(
+    maxsize=settings.known_users_cache_size,
+    ttl_seconds=settings.user_last_login_update_interval_seconds
+)
+
+# Заранее подобранный следующий вопрос по (assessment_id, competency_id)
+_next_question_cache = LRUCache(
+    maxsize=settings.next_question_prefetch_cache_size,
+    ttl_seconds=settings.next_question_prefetch_ttl_seconds
+)
+
+# Ссылки на задачи предвыборки, чтобы их не собрал сборщик мусора до завершения
+_prefetch_tasks: set = set()
+
+# Максимальный номер вопроса в компетенции (см. question_number в /questions/generate)
+MAX_QUESTION_NUMBER = 5
+
+
+def _prefetch_done(task: asyncio.Task) -> None:
+    _prefetch_tasks.discard(task)
+    if not task.cancelled() and task.exception() is not None:
+        logger.warning(f"Next question prefetch task failed: {task.exception()}")
+
 
 class AssessmentService:
     def __init__(self, supabase_service: SupabaseService, openai_service: OpenAIService):
@@ -33,6 +67,16 @@ class AssessmentService:
             "status": assessment['status']
         }
 
+    async def ensure_user(self, user_id: str) -> None:
+        """
+        Завести пользователя в БД и обновить last_login не чаще раза в
+        user_last_login_update_interval_seconds (остальные вызовы не обращаются к БД).
+        """
+        if user_id in _known_users:
+            return
+        await self.supabase.ensure_user(user_id)
+        _known_users.set(user_id, True)
+
     async def start_assessment_by_direction(
         self, 
         user_id: str, 
@@ -41,7 +85,7 @@ class AssessmentService:
     ) -> Dict:
         """Начать новое тестирование по направлению и технологии"""
         # Убеждаемся, что пользователь существует в БД (создаем если нет)
-        await self.supabase.get_or_create_user(user_id)
+        await self.ensure_user(user_id)
         
         # Находим направление в БД
         direction_obj = await self.supabase.find_or_create_direction(
@@ -97,9 +141,14 @@ class AssessmentService:
             logger.info(f"Found {len(direction_competencies)} direction competencies for {direction}")
             
             if not direction_competencies:
-                raise ValueError(
-                    f"No competencies found for direction '{direction}'. "
-                    f"Please add competencies to the direction first, or specify a technology."
+                if not settings.direction_competencies_autodetect:
+                    raise ValueError(
+                        f"No competencies found for direction '{direction}'. "
+                        f"Please add competencies to the direction first, or specify a technology."
+                    )
+                # Направление без компетенций: определяем их через GPT (с кэшем) и привязываем
+                direction_competencies = await self._provision_direction_competencies(
+                    direction, str(direction_id)
                 )
             
             # Извлекаем компетенции из структуры ответа Supabase
@@ -156,6 +205,86 @@ class AssessmentService:
             "status": assessment['status']
         }
 
+    async def determine_competencies_by_direction(self, direction: str) -> List[Dict]:
+        """
+        Определить компетенции по тексту направления, например "backend(golang, sql)".
+
+        Эквивалентные направления (регистр, пробелы, порядок технологий) дают один
+        нормализованный ключ. Порядок поиска: кэш процесса → таблица
+        direction_competency_cache → GPT (результат сохраняется в БД и в кэш).
+        """
+        direction_key = normalize_direction_key(direction)
+        if not direction_key:
+            raise ValueError("Direction text is empty")
+
+        competencies = _direction_competencies_cache.get(direction_key)
+        if competencies is not None:
+            return competencies
+
+        try:
+            competencies = await self.supabase.get_cached_direction_competencies(direction_key)
+        except Exception as e:
+            # Кэш в БД недоступен (например, миграция не применена) - идем в GPT
+            logger.warning(f"Could not read direction competencies cache: {e}")
+            competencies = None
+
+        if competencies is None:
+            logger.info(f"Determining competencies via GPT for direction key '{direction_key}'")
+            result = await self.openai.determine_competencies_by_direction(direction)
+            competencies = result['competencies']
+            try:
+                await self.supabase.save_direction_competencies(direction_key, direction, competencies)
+            except Exception as e:
+                logger.warning(f"Could not persist direction competencies cache: {e}")
+
+        _direction_competencies_cache.set(direction_key, competencies)
+        return competencies
+
+    async def _provision_direction_competencies(self, direction: str, direction_id: str) -> List[Dict]:
+        """
+        Создать компетенции направления по результату determine_competencies_by_direction
+        и привязать их к направлению (direction_competencies).
+
+        Следующие тестирования по направлению берут компетенции из БД и в GPT не ходят.
+
+        Returns:
+            Связи в формате get_direction_competencies
+        """
+        detected = await self.determine_competencies_by_direction(direction)
+
+        competencies = []
+        for item in detected:
+            name = (item.get('name') or '').strip() if isinstance(item, dict) else ''
+            if not name:
+                continue
+            competency = await self.supabase.find_or_create_competency_by_name(
+                name=name,
+                description=item.get('description') or '',
+                category=item.get('category') or ''
+            )
+            if all(c['id'] != competency['id'] for c in competencies):
+                competencies.append(competency)
+
+        if not competencies:
+            raise ValueError(f"Could not determine competencies for direction '{direction}'")
+
+        competency_ids = [str(c['id']) for c in competencies]
+        # upsert по первичному ключу связи - параллельный старт по тому же направлению не падает
+        await self.supabase.bulk_upsert_links(
+            'direction_competencies',
+            'direction_id',
+            direction_id,
+            'competency_id',
+            competency_ids,
+            order_indexes={competency_id: index for index, competency_id in enumerate(competency_ids)}
+        )
+        logger.info(f"Provisioned {len(competencies)} competencies for direction '{direction}'")
+
+        return [
+            {'competency_id': c['id'], 'order_index': index, 'competencies': c}
+            for index, c in enumerate(competencies)
+        ]
+
     async def get_user_assessments(
         self,
         user_id: str,
@@ -220,7 +349,7 @@ class AssessmentService:
         for ca in competency_assessments:
             ca_id = ca.get('id')
             if ca_id:
-                question_history = await self.supabase.get_question_history(str(ca_id))
+                question_history = await self.supabase.get_question_history(str(ca_id), columns='score')
                 # Считаем вопросы с оценками (score не NULL)
                 answered_count = len([q for q in question_history if q.get('score') is not None])
                 total_answers += answered_count
@@ -243,22 +372,35 @@ class AssessmentService:
         overall_score = await self.calculate_overall_score(assessment_id)
 
         # Обновляем статус
-        assessment = await self.supabase.update_assessment_status(
+        completed = await self.supabase.update_assessment_status(
             assessment_id,
             'completed',
             overall_score
         )
 
-        return assessment
+        # Пересчитываем сводку прогресса; ошибка не отменяет завершение тестирования
+        try:
+            await self.supabase.refresh_user_progress_summary(
+                str(assessment['user_id']),
+                direction_id=str(assessment['direction_id']) if assessment.get('direction_id') else None,
+                technology_id=str(assessment['technology_id']) if assessment.get('technology_id') else None
+            )
+        except Exception as e:
+            logger.warning(f"Could not refresh progress summary for assessment {assessment_id}: {e}")
+
+        return completed
 
     async def get_competency_assessment_context(
         self,
         assessment_id: str,
         competency_id: str
     ) -> Dict:
-        """Получить контекст для генерации вопроса (предыдущие ответы, пробелы)"""
-        # Получаем competency_assessment
-        ca = await self.supabase.get_competency_assessment_by_ids(
+        """
+        Получить контекст для генерации вопроса (предыдущие ответы, пробелы,
+        уже заданные вопросы) одним запросом к БД.
+        """
+        # competency_assessment вместе с историей вопросов
+        ca = await self.supabase.get_competency_assessment_with_history(
             assessment_id,
             competency_id
         )
@@ -267,11 +409,13 @@ class AssessmentService:
             return {
                 "previous_answers": [],
                 "knowledge_gaps": [],
-                "current_difficulty": 3
+                "current_difficulty": 3,
+                "competency_assessment_id": None,
+                "questions_asked": 0,
+                "used_question_ids": []
             }
 
-        # Получаем историю вопросов
-        question_history = await self.supabase.get_question_history(ca['id'])
+        question_history = ca.get('question_history') or []
 
         # Формируем предыдущие ответы
         previous_answers = []
@@ -315,5 +459,338 @@ class AssessmentService:
             "knowledge_gaps": unique_gaps,
             "current_difficulty": current_difficulty,
             "competency_assessment_id": ca['id'],
-            "questions_asked": len(question_history)
+            "questions_asked": len(question_history),
+            # Вопросы из банка, которые уже задавались (исключаются при выборе следующего)
+            "used_question_ids": [
+                str(qh['question_id']) for qh in question_history
+                if qh.get('question_id') is not None
+            ]
+        }
+
+    async def process_answer(
+        self,
+        assessment: Dict,
+        competency_id: str,
+        question_text: str,
+        difficulty: int,
+        question_id: Optional[str],
+        audio_file_path: str
+    ) -> Dict:
+        """
+        Обработать голосовой ответ: транскрипция, оценка, сохранение в историю
+        и пересчет оценки компетенции.
+
+        Args:
+            assessment: Assessment с competency_assessments (доступ уже проверен)
+            audio_file_path: Путь к сохраненному аудио файлу (удаляет вызывающий код)
+
+        Returns:
+            Dict в формате AnswerResponse: {"transcript": str, "evaluation": Dict}
+        """
+        assessment_id = str(assessment['id'])
+
+        # Получаем или создаем competency_assessment
+        ca = await self.supabase.get_competency_assessment_by_ids(assessment_id, competency_id, columns='id')
+        if not ca:
+            ca = await self.supabase.create_competency_assessment(assessment_id, competency_id)
+        
+        if not ca or 'id' not in ca:
+            raise HTTPException(
+                status_code=500,
+                detail="Failed to get or create competency assessment"
+            )
+        
+        competency_assessment_id = ca['id']
+
+        # Получаем информацию о компетенции
+        competency_assessments = assessment.get('competency_assessments', [])
+        comp_assessment = next(
+            (ca_item for ca_item in competency_assessments if str(ca_item.get('competency_id')) == competency_id),
+            None
+        )
+        competency = comp_assessment.get('competencies', {}) if comp_assessment else {}
+
+        # Транскрибируем аудио
+        transcription = await self.openai.transcribe_audio(audio_file_path)
+
+        # Оцениваем ответ
+        evaluation = await self.openai.evaluate_answer(
+            question_text=question_text,
+            transcript=transcription['text'],
+            competency_name=competency.get('name', 'Unknown') if competency else 'Unknown',
+            difficulty=difficulty,
+            question_id=question_id
+        )
+
+        # Используем переданный question_id или пытаемся найти вопрос по тексту
+        stored_question_id = None
+        if question_id:
+            stored_question_id = question_id
+            logger.info(f"Using provided question_id: {stored_question_id}")
+        else:
+            # Пытаемся найти сохраненный вопрос по тексту и компетенции
+            try:
+                stored_question = await self.supabase.find_question(
+                    competency_id=competency_id,
+                    difficulty=difficulty
+                )
+                # Проверяем, что текст совпадает (примерно)
+                if stored_question and stored_question.get('question_text') == question_text:
+                    stored_question_id = str(stored_question['id'])
+                    logger.info(f"Found stored question by text: {stored_question_id}")
+            except Exception as e:
+                logger.warning(f"Could not find stored question: {e}")
+
+        # Сохраняем вопрос и ответ в БД (впервые, только после ответа)
+        question_history = await self.supabase.create_question_history(
+            competency_assessment_id=str(competency_assessment_id),
+            question_text=question_text,
+            difficulty_level=difficulty,
+            question_type=None,
+            question_id=stored_question_id
+        )
+
+        if not question_history or 'id' not in question_history:
+            raise HTTPException(
+                status_code=500,
+                detail="Failed to create question history record"
+            )
+
+        # Обновляем вопрос с ответом и оценкой (сохраняем только оценки, не транскрипты)
+        await self.supabase.update_question_history(
+            question_id=str(question_history['id']),
+            score=evaluation.get('score'),
+            is_correct=evaluation.get('isCorrect'),
+            understanding_depth=evaluation.get('understandingDepth'),
+            feedback=evaluation.get('feedback'),
+            knowledge_gaps=evaluation.get('knowledgeGaps', []),
+            time_spent_seconds=None  # Можно добавить из фронтенда
+            # Транскрипт НЕ сохраняется для экономии места
+        )
+
+        # Обновляем competency_assessment с учетом новой оценки
+        # Собираем все оценки для этой компетенции
+        all_questions = await self.supabase.get_question_history(
+            str(competency_assessment_id),
+            columns=QUESTION_HISTORY_SCORING_COLUMNS
+        )
+
+        # Используем новые структурированные поля
+        answered_questions = [q for q in all_questions if q.get('score') is not None]
+        if answered_questions:
+            # Вычисляем средний балл
+            scores = [q.get('score', 0) for q in answered_questions]
+            avg_score = sum(scores) / len(scores) if scores else 0
+
+            # Собираем все пробелы
+            all_gaps = []
+            for q in answered_questions:
+                gaps = q.get('knowledge_gaps', [])
+                if gaps:
+                    all_gaps.extend(gaps)
+
+            unique_gaps = list(set(all_gaps))
+
+            # Определяем confidence_level на основе количества ответов
+            if len(answered_questions) >= 5:
+                confidence = 'high'
+            elif len(answered_questions) >= 3:
+                confidence = 'medium'
+            else:
+                confidence = 'low'
+
+            # Округляем оценку (минимум 1, максимум 5)
+            final_score = max(1, min(5, int(round(avg_score))))
+            
+            logger.info(
+                f"Updating competency assessment {competency_assessment_id}: "
+                f"scores={scores}, avg_score={avg_score}, final_score={final_score}, "
+                f"confidence={confidence}, answered={len(answered_questions)}/{len(all_questions)}"
+            )
+            
+            await self.supabase.update_competency_assessment(
+                competency_assessment_id=str(competency_assessment_id),
+                ai_assessed_score=final_score,
+                confidence_level=confidence,
+                gap_analysis={'knowledgeGaps': unique_gaps},
+                test_session_data={
+                    'questionsCount': len(all_questions),
+                    'answeredCount': len(answered_questions),
+                    'averageScore': avg_score
+                }
+            )
+
+        # Подбираем следующий вопрос заранее, пока клиент читает оценку. Ответ не ждет
+        # предвыборку: если клиент успеет раньше, вопрос найдется обычным путем
+        task = asyncio.create_task(self._prefetch_next_question(
+            assessment=assessment,
+            competency_id=competency_id,
+            question_history=all_questions,
+            next_difficulty=evaluation.get('nextDifficulty'),
+            answered_difficulty=difficulty,
+            answered_score=evaluation.get('score')
+        ))
+        _prefetch_tasks.add(task)
+        task.add_done_callback(_prefetch_done)
+
+        return {
+            "transcript": transcription['text'],
+            "evaluation": {
+                "score": evaluation['score'],
+                "understandingDepth": evaluation['understandingDepth'],
+                "isCorrect": evaluation['isCorrect'],
+                "feedback": evaluation['feedback'],
+                "knowledgeGaps": evaluation['knowledgeGaps'],
+                "nextDifficulty": evaluation['nextDifficulty'],
+                "reasoning": evaluation.get('reasoning'),
+                "correctAnswer": evaluation.get('correctAnswer', ''),
+                "expectedKeyPoints": evaluation.get('expectedKeyPoints', [])
+            }
         }
+
+    async def is_answer_recorded(
+        self,
+        assessment_id: str,
+        competency_id: str,
+        question_text: str,
+        since: datetime
+    ) -> bool:
+        """
+        Есть ли в истории компетенции ответ на вопрос, заданный не раньше since.
+
+        process_answer не идемпотентен (каждый вызов добавляет строку question_history
+        и пересчитывает оценку), поэтому перед повторной обработкой прерванного ответа
+        нужно убедиться, что он еще не записан.
+        """
+        ca = await self.supabase.get_competency_assessment_by_ids(assessment_id, competency_id, columns='id')
+        if not ca:
+            return False
+
+        history = await self.supabase.get_question_history(str(ca['id']), columns='question_text, asked_at')
+        for row in history:
+            if row.get('question_text') != question_text or not row.get('asked_at'):
+                continue
+            asked_at = datetime.fromisoformat(str(row['asked_at']).replace('Z', '+00:00'))
+            if asked_at.tzinfo is None:
+                asked_at = asked_at.replace(tzinfo=timezone.utc)
+            if asked_at >= since:
+                return True
+        return False
+
+    async def _prefetch_next_question(
+        self,
+        assessment: Dict,
+        competency_id: str,
+        question_history: List[Dict],
+        next_difficulty: Optional[int],
+        answered_difficulty: int,
+        answered_score: Optional[int]
+    ) -> None:
+        """
+        Найти следующий вопрос для компетенции и положить его в кэш.
+
+        Вопрос подбирается так же, как в /questions/generate: сложность nextDifficulty
+        из оценки, номер = количество заданных вопросов + 1, без уже использованных.
+        Ошибки не пробрасываются - при промахе кэша вопрос будет найден обычным путем.
+        """
+        question_number = len(question_history) + 1
+        if question_number > MAX_QUESTION_NUMBER:
+            return
+
+        try:
+            difficulty = max(1, min(5, int(next_difficulty or answered_difficulty)))
+
+            # Сложность, которую get_competency_assessment_context вычислит по последнему ответу
+            # (используется, если клиент не передаст difficulty явно)
+            if answered_score is None:
+                context_difficulty = answered_difficulty
+            elif answered_score >= 4:
+                context_difficulty = min(5, answered_difficulty + 1)
+            elif answered_score <= 2:
+                context_difficulty = max(1, answered_difficulty - 1)
+            else:
+                context_difficulty = answered_difficulty
+
+            exclude_question_ids = [
+                str(qh['question_id']) for qh in question_history
+                if qh.get('question_id') is not None
+            ]
+
+            question = await self.supabase.find_question(
+                competency_id=competency_id,
+                difficulty=difficulty,
+                question_number=question_number,
+                exclude_question_ids=exclude_question_ids or None
+            )
+            if not question:
+                question = await self.supabase.find_question(
+                    competency_id=competency_id,
+                    difficulty=difficulty,
+                    question_number=None,
+                    exclude_question_ids=exclude_question_ids or None
+                )
+
+            _next_question_cache.set((str(assessment['id']), competency_id), {
+                "user_id": assessment.get('user_id'),
+                "difficulty": difficulty,
+                "context_difficulty": context_difficulty,
+                "question_number": question_number,
+                "question": question,  # None - вопросов больше нет
+            })
+            logger.info(
+                f"Prefetched next question for assessment {assessment['id']}, competency {competency_id}: "
+                f"difficulty={difficulty}, question_number={question_number}, "
+                f"question_id={question['id'] if question else None}"
+            )
+        except Exception as e:
+            logger.warning(f"Next question prefetch failed for competency {competency_id}: {e}")
+
+    def pop_prefetched_question(
+        self,
+        assessment_id: str,
+        competency_id: str,
+        user_id: str,
+        question_number: int,
+        difficulty: Optional[int] = None
+    ) -> Optional[Dict]:
+        """
+        Забрать заранее подобранный вопрос, если он соответствует запросу.
+
+        Returns:
+            {"question": Dict | None, "difficulty": int} или None при промахе
+            (question=None означает, что вопросов для компетенции больше нет)
+        """
+        key = (assessment_id, competency_id)
+        entry = _next_question_cache.get(key)
+        if not entry or entry['user_id'] != user_id or entry['question_number'] != question_number:
+            return None
+
+        if difficulty is None:
+            difficulty = entry['context_difficulty']
+        if difficulty != entry['difficulty']:
+            return None
+
+        # Вопрос выдается один раз
+        _next_question_cache.pop(key)
+        return {"question": entry['question'], "difficulty": difficulty}
+
+    async def auto_complete_if_finished(self, assessment_id: str) -> Optional[Dict]:
+        """
+        Завершить assessment, если все компетенции уже получили оценку.
+
+        Returns:
+            Завершенный assessment или None, если завершать еще рано
+        """
+        assessment = await self.get_assessment_with_progress(assessment_id)
+        all_competencies = assessment.get('competency_assessments', []) if assessment else []
+        
+        if not all_competencies or assessment.get('status') != 'in_progress':
+            return None
+
+        # Проверяем, что все компетенции имеют оценки
+        if not all(ca.get('ai_assessed_score') is not None for ca in all_competencies):
+            return None
+
+        completed_assessment = await self.complete_assessment(assessment_id)
+        logger.info(f"Assessment {assessment_id} auto-completed with score {completed_assessment.get('overall_score')}")
+        return completed_assessment
@@ -0,0 +1,189 @@
+import asyncio
+import csv
+import io
+import json
+import logging
+from datetime import datetime
+from typing import AsyncIterator, Callable, Dict, List, Optional
+
+from app.services.supabase_service import ASSESSMENT_COLUMNS, SupabaseService
+
+logger = logging.getLogger(__name__)
+
+EXPORT_FORMATS = ("ndjson", "csv")
+
+MEDIA_TYPES = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv; charset=utf-8",
+}
+
+
+def _flatten_competency_score(row: Dict) -> Dict:
+    assessment = row.pop('assessments', None) or {}
+    competency = row.pop('competencies', None) or {}
+    row['competency_name'] = competency.get('name')
+    for key in ('user_id', 'direction_id', 'technology_id', 'status'):
+        row[key] = assessment.get(key)
+    return row
+
+
+# Наборы данных экспорта: таблица, проекция, колонка для фильтра по периоду,
+# порядок колонок CSV и преобразование строки (разворачивание вложенных объектов)
+EXPORT_DATASETS: Dict[str, Dict] = {
+    "assessments": {
+        "table": "assessments",
+        "select": ASSESSMENT_COLUMNS,
+        "time_column": "started_at",
+        "columns": [c.strip() for c in ASSESSMENT_COLUMNS.split(",")],
+        "transform": None,
+    },
+    "competency_scores": {
+        "table": "competency_assessments",
+        "select": (
+            'id, assessment_id, competency_id, ai_assessed_score, confidence_level, completed_at, '
+            'competencies(name), assessments!inner(user_id, direction_id, technology_id, status)'
+        ),
+        "time_column": "completed_at",
+        "columns": [
+            "id", "assessment_id", "user_id", "direction_id", "technology_id", "status",
+            "competency_id", "competency_name", "ai_assessed_score", "confidence_level", "completed_at",
+        ],
+        "transform": _flatten_competency_score,
+    },
+    "question_history": {
+        "table": "question_history",
+        "select": (
+            'id, competency_assessment_id, question_id, difficulty_level, score, is_correct, '
+            'understanding_depth, knowledge_gaps, time_spent_seconds, asked_at, answered_at'
+        ),
+        "time_column": "asked_at",
+        "columns": [
+            "id", "competency_assessment_id", "question_id", "difficulty_level", "score", "is_correct",
+            "understanding_depth", "knowledge_gaps", "time_spent_seconds", "asked_at", "answered_at",
+        ],
+        "transform": None,
+    },
+}
+
+
+class ExportService:
+    """
+    Потоковая выгрузка результатов тестирований в NDJSON/CSV.
+
+    Таблица читается страницами по первичному ключу (WHERE id > последний ORDER BY id
+    LIMIT n): каждая страница - один проход по индексу независимо от глубины выгрузки,
+    а в памяти держится только текущая страница. Страницы отдаются клиенту по мере
+    чтения, поэтому многогигабайтная выгрузка не упирается в таймаут запроса.
+    """
+
+    def __init__(self, supabase_service: SupabaseService):
+        self.supabase = supabase_service
+
+    async def iter_pages(
+        self,
+        dataset: str,
+        since: Optional[datetime] = None,
+        until: Optional[datetime] = None,
+        page_size: int = 1000
+    ) -> AsyncIterator[List[Dict]]:
+        """
+        Страницы строк набора данных.
+
+        Raises:
+            ValueError: Неизвестный набор данных
+        """
+        spec = EXPORT_DATASETS.get(dataset)
+        if spec is None:
+            raise ValueError(f"Неизвестный набор данных '{dataset}'. Доступны: {', '.join(EXPORT_DATASETS)}")
+
+        last_id: Optional[str] = None
+        while True:
+            rows = await asyncio.to_thread(self._fetch_page, spec, last_id, since, until, page_size)
+            if not rows:
+                return
+
+            last_id = str(rows[-1]['id'])
+            transform: Optional[Callable[[Dict], Dict]] = spec["transform"]
+            yield [transform(row) for row in rows] if transform else rows
+
+            if len(rows) < page_size:
+                return
+
+    def _fetch_page(
+        self,
+        spec: Dict,
+        last_id: Optional[str],
+        since: Optional[datetime],
+        until: Optional[datetime],
+        page_size: int
+    ) -> List[Dict]:
+        query = self.supabase.client.table(spec["table"]).select(spec["select"])
+        if last_id is not None:
+            query = query.gt('id', last_id)
+        if since:
+            query = query.gte(spec["time_column"], since.isoformat())
+        if until:
+            query = query.lt(spec["time_column"], until.isoformat())
+        response = query.order('id').limit(page_size).execute()
+        return response.data or []
+
+    async def stream(
+        self,
+        dataset: str,
+        export_format: str,
+        since: Optional[datetime] = None,
+        until: Optional[datetime] = None,
+        page_size: int = 1000
+    ) -> AsyncIterator[bytes]:
+        """
+        Выгрузка в виде чанков байт (один чанк на страницу).
+
+        Ошибка посреди выгрузки логируется и пробрасывается дальше; в NDJSON перед этим
+        отдается строка {"_error": ..., "exported_rows": N}.
+
+        Raises:
+            ValueError: Неизвестный набор данных или формат
+        """
+        if export_format not in EXPORT_FORMATS:
+            raise ValueError(f"Неподдерживаемый формат '{export_format}'. Поддерживаются: {', '.join(EXPORT_FORMATS)}")
+        if dataset not in EXPORT_DATASETS:
+            raise ValueError(f"Неизвестный набор данных '{dataset}'. Доступны: {', '.join(EXPORT_DATASETS)}")
+
+        columns = EXPORT_DATASETS[dataset]["columns"]
+        if export_format == "csv":
+            yield _csv_chunk([columns], header=True)
+
+        exported = 0
+        try:
+            async for rows in self.iter_pages(dataset, since=since, until=until, page_size=page_size):
+                if export_format == "csv":
+                    yield _csv_chunk([[_csv_value(row.get(column)) for column in columns] for row in rows])
+                else:
+                    yield "".join(
+                        json.dumps(row, ensure_ascii=False, default=str) + "\n" for row in rows
+                    ).encode("utf-8")
+                exported += len(rows)
+        except Exception as e:
+            logger.error(f"Export of {dataset} ({export_format}) failed after {exported} rows: {e}")
+            if export_format == "ndjson":
+                # Статус 200 уже отправлен: последняя строка сообщает об ошибке
+                yield (json.dumps({"_error": str(e), "exported_rows": exported}, ensure_ascii=False) + "\n").encode("utf-8")
+            # Исключение обрывает поток без завершающего чанка - клиент видит неполный ответ
+            raise
+
+        logger.info(f"Export of {dataset} ({export_format}) finished: {exported} rows")
+
+
+def _csv_value(value):
+    # Массивы (knowledge_gaps) и объекты - JSON строкой в одной ячейке
+    if isinstance(value, (list, dict)):
+        return json.dumps(value, ensure_ascii=False)
+    return value
+
+
+def _csv_chunk(rows: List[List], header: bool = False) -> bytes:
+    buffer = io.StringIO()
+    csv.writer(buffer).writerows(rows)
+    data = buffer.getvalue()
+    # BOM в начале файла - чтобы Excel открыл UTF-8 без ручной настройки кодировки
+    return ("\ufeff" + data if header else data).encode("utf-8")
@@ -1,34 +1,413 @@
 from openai import AsyncOpenAI
+import copy
+import hashlib
 import json
+from contextlib import asynccontextmanager
 from typing import Optional, Dict, List
 import logging
+import time
+import httpx
 from httpx import Timeout
 from fastapi import HTTPException
+from app.utils.cache import LRUCache
+from app.utils.text import normalize_answer_key, normalize_question_text, normalize_transcript
 
 logger = logging.getLogger(__name__)
 
+# Модель по умолчанию для операций, не указанных в таблице маршрутизации
+DEFAULT_CHAT_MODEL = "gpt-4-turbo-preview"
+
+# Вес нового замера в скользящей средней латентности
+LATENCY_EWMA_ALPHA = 0.2
+
+# Системные промпты - неизменяемые константы модуля. Статичные инструкции и формат
+# ответа идут первыми и совпадают байт в байт между вызовами, поэтому провайдер
+# кэширует этот префикс (prompt caching); переменные данные передаются в user сообщении.
+
+QUESTION_SYSTEM_PROMPT = """Ты эксперт по оценке технических компетенций специалистов. 
+Твоя задача - генерировать вопросы для голосового собеседования, которые помогут объективно оценить уровень знаний кандидата.
+
+Принципы создания вопросов:
+1. Вопросы должны проверять ПОНИМАНИЕ, а не заученные факты
+2. Кандидат будет отвечать ГОЛОСОМ (устно), поэтому вопрос должен подразумевать развернутый ответ на 1-3 минуты
+3. Избегай вопросов типа "да/нет" или simple choice
+4. Вопрос должен выявлять глубину понимания концепций
+5. Адаптируй сложность под уровень кандидата на основе предыдущих ответов
+
+Уровни сложности:
+- 1/5: Базовые концепции, определения
+- 2/5: Понимание основ, простые примеры
+- 3/5: Практическое применение, типичные кейсы
+- 4/5: Глубокое понимание, edge cases, оптимизация
+- 5/5: Экспертный уровень, архитектурные решения, trade-offs
+
+Сгенерируй ОДИН вопрос для голосового ответа, который:
+1. Соответствует указанному уровню сложности
+2. Проверяет глубину понимания указанной компетенции
+3. Если указаны пробелы в знаниях - желательно затрагивает один из них
+
+Верни JSON в формате:
+{
+  "question": "текст вопроса",
+  "difficulty": уровень сложности (число 1-5, равный запрошенному),
+  "expectedKeyPoints": ["ключевой момент 1", "ключевой момент 2", "ключевой момент 3"],
+  "estimatedAnswerTime": "1-2 минуты"
+}
+
+Всегда возвращай ответ ТОЛЬКО в JSON формате без дополнительного текста."""
+
+EVALUATION_SYSTEM_PROMPT = """Ты эксперт по оценке технических ответов кандидатов на собеседованиях.
+Твоя задача - объективно оценить устный ответ кандидата, который был транскрибирован в текст.
+
+Критерии оценки:
+1. **Правильность (score 1-5)**:
+   - 1: Полностью неправильный или нерелевантный ответ
+   - 2: Частично правильный, много ошибок
+   - 3: В целом правильный, но с недочетами
+   - 4: Правильный и достаточно полный ответ
+   - 5: Отличный ответ, все ключевые моменты, примеры
+
+2. **Глубина понимания (understandingDepth)**:
+   - shallow: Поверхностное понимание, общие фразы, нет конкретики
+   - medium: Понимает основы, но не углубляется в детали
+   - deep: Глубокое понимание, примеры из практики, нюансы
+
+3. **Выявление пробелов**:
+   - Конкретные темы/концепции, которые кандидат не знает или путает
+   - Что нужно изучить дополнительно
+
+4. **Адаптивность**:
+   - Если ответ хороший (4-5) → увеличить сложность
+   - Если средний (3) → оставить ту же сложность
+   - Если слабый (1-2) → уменьшить сложность
+
+5. **Правильный ответ (correctAnswer)**:
+   - Должен быть развернутым и полным
+   - Включать все ключевые концепции, примеры, лучшие практики
+   - Написан как для учебного материала - понятно и структурированно
+   - Длина: 3-7 предложений для среднего вопроса, больше для сложных
+
+6. **Ключевые моменты (expectedKeyPoints)**:
+   - Список из 3-7 ключевых концепций/моментов, которые должны быть в правильном ответе
+   - Каждый пункт - короткая формулировка (1-5 слов)
+   - Должны отражать основной смысл правильного ответа
+
+Учитывай что это транскрипция устной речи - могут быть запинки, повторы, неидеальная грамматика.
+
+Оцени ответ и верни JSON со ВСЕМИ полями (обязательно все поля должны присутствовать):
+{
+  "score": 1-5,
+  "understandingDepth": "shallow|medium|deep",
+  "isCorrect": true|false,
+  "feedback": "Краткий конструктивный фидбек для кандидата (2-3 предложения)",
+  "knowledgeGaps": ["пробел 1", "пробел 2"],
+  "nextDifficulty": 1-5,
+  "reasoning": "Объяснение почему выставлена такая оценка",
+  "correctAnswer": "Эталонный правильный ответ на вопрос. Должен быть развернутым и содержать все ключевые моменты. Минимум 3-5 предложений.",
+  "expectedKeyPoints": ["ключевой момент 1", "ключевой момент 2", "ключевой момент 3"]
+}
+
+ВАЖНО: Все поля обязательны! Не пропускай ни одно поле.
+
+Всегда возвращай ответ ТОЛЬКО в JSON формате без дополнительного текста."""
+
+REFERENCE_ANSWER_SYSTEM_PROMPT = """Ты эксперт по техническим собеседованиям.
+Твоя задача - написать эталонный правильный ответ на вопрос устного собеседования.
+
+Правильный ответ (correctAnswer):
+- Должен быть развернутым и полным
+- Включать все ключевые концепции, примеры, лучшие практики
+- Написан как для учебного материала - понятно и структурированно
+- Длина: 3-7 предложений для среднего вопроса, больше для сложных
+
+Ключевые моменты (expectedKeyPoints):
+- Список из 3-7 ключевых концепций/моментов, которые должны быть в правильном ответе
+- Каждый пункт - короткая формулировка (1-5 слов)
+
+Верни JSON в формате:
+{
+  "correctAnswer": "Эталонный правильный ответ на вопрос",
+  "expectedKeyPoints": ["ключевой момент 1", "ключевой момент 2", "ключевой момент 3"]
+}
+
+Всегда возвращай ответ ТОЛЬКО в JSON формате без дополнительного текста."""
+
+COMPETENCIES_SYSTEM_PROMPT = """Ты эксперт по определению технических компетенций для тестирования специалистов.
+Твоя задача - определить список ключевых компетенций для тестирования на основе направления.
+
+Компетенция должна быть:
+- Конкретной и измеримой
+- Релевантной для указанного направления
+- Подходящей для голосового тестирования (можно проверить понимание устно)
+
+Определи 5-7 ключевых компетенций для тестирования специалиста в указанном направлении.
+
+Верни JSON в формате:
+{
+  "competencies": [
+    {
+      "name": "Название компетенции",
+      "description": "Краткое описание что проверяет эта компетенция",
+      "category": "Категория (например, 'Языки программирования', 'Базы данных', 'Архитектура')"
+    }
+  ]
+}
+
+Всегда возвращай ответ ТОЛЬКО в JSON формате без дополнительного текста."""
+
 
 class OpenAIService:
-    def __init__(self, api_key: str, timeout: int = 180):
+    def __init__(
+        self,
+        api_key: str,
+        timeout: int = 180,
+        max_connections: int = 100,
+        max_keepalive_connections: int = 20,
+        keepalive_expiry: float = 30.0,
+        pool_timeout: float = 30.0,
+        http2: bool = False,
+        http_client: Optional[httpx.AsyncClient] = None,
+        model_routes: Optional[Dict[str, str]] = None,
+        fallback_model: Optional[str] = None,
+        fallback_max_in_flight: int = 0,
+        fallback_latency_seconds: float = 0.0,
+        fallback_cooldown_seconds: float = 60.0,
+        evaluation_cache_size: int = 2048,
+        evaluation_cache_ttl_seconds: Optional[float] = 86400.0,
+        trivial_answer_phrases: Optional[List[str]] = None
+    ):
         """
         Инициализация OpenAI сервиса
         
         Args:
             api_key: API ключ OpenAI
             timeout: Таймаут для запросов в секундах (по умолчанию 180)
+            max_connections: Максимум одновременных соединений в пуле
+            max_keepalive_connections: Сколько простаивающих соединений держать открытыми
+            keepalive_expiry: Время жизни простаивающего соединения в секундах
+            pool_timeout: Сколько ждать свободного соединения из пула в секундах
+            http2: Использовать HTTP/2 (требует пакет h2)
+            http_client: Готовый httpx.AsyncClient (если передан, параметры пула игнорируются)
+            model_routes: Модель для каждой операции (generate_question, evaluate_answer,
+                determine_competencies, reference_answer)
+            fallback_model: Модель, на которую переключаемся под нагрузкой (None - не переключаться)
+            fallback_max_in_flight: Порог запросов в полете для переключения (0 - не учитывать)
+            fallback_latency_seconds: Порог средней латентности операции (0 - не учитывать)
+            fallback_cooldown_seconds: Сколько секунд держать fallback после превышения латентности
+            evaluation_cache_size: Размер кэша оценок ответов
+            evaluation_cache_ttl_seconds: Время жизни оценки в кэше (None - без ограничения)
+            trivial_answer_phrases: Фразы ("не знаю", "i don't know"), оцениваемые без GPT
         """
-        # Создаем таймаут: connect=10s, read=timeout, write=10s, pool=5s
-        http_timeout = Timeout(
-            connect=10.0,
-            read=float(timeout),
-            write=10.0,
-            pool=5.0
-        )
+        self.max_connections = max_connections
+        self.max_keepalive_connections = max_keepalive_connections
+        self.keepalive_expiry = keepalive_expiry
+        self.http2 = http2
+
+        if http_client is None:
+            # Создаем таймаут: connect=10s, read=timeout, write=10s, pool=pool_timeout
+            http_timeout = Timeout(
+                connect=10.0,
+                read=float(timeout),
+                write=10.0,
+                pool=float(pool_timeout)
+            )
+            # Один клиент на весь сервис: соединения переиспользуются между вызовами,
+            # TLS handshake не выполняется на каждый запрос
+            http_client = httpx.AsyncClient(
+                timeout=http_timeout,
+                limits=httpx.Limits(
+                    max_connections=max_connections,
+                    max_keepalive_connections=max_keepalive_connections,
+                    keepalive_expiry=keepalive_expiry
+                ),
+                http2=http2
+            )
+
+        self.http_client = http_client
         self.client = AsyncOpenAI(
             api_key=api_key,
-            timeout=http_timeout
+            http_client=http_client
         )
 
+        # Счетчики использования пула
+        self._in_flight = 0
+        self._peak_in_flight = 0
+        self._total_requests = 0
+        self._pool_timeouts = 0
+
+        # Маршрутизация моделей
+        self.model_routes = dict(model_routes or {})
+        self.fallback_model = fallback_model
+        self.fallback_max_in_flight = fallback_max_in_flight
+        self.fallback_latency_seconds = fallback_latency_seconds
+        self.fallback_cooldown_seconds = fallback_cooldown_seconds
+        self._latency_ewma: Dict[str, float] = {}  # operation -> средняя латентность основной модели
+        self._fallback_until: Dict[str, float] = {}  # operation -> monotonic время окончания fallback
+        self._fallback_count: Dict[str, int] = {}
+
+        # Учет токенов по операциям (в т.ч. закэшированных провайдером)
+        self._usage: Dict[str, Dict[str, int]] = {}
+
+        # Кэш оценок: (вопрос, сложность, транскрипт без учета регистра и пробелов) -> оценка
+        self._evaluation_cache = LRUCache(maxsize=evaluation_cache_size, ttl_seconds=evaluation_cache_ttl_seconds)
+        # Эталонные ответы по вопросу - для локальной оценки тривиальных ответов
+        self._reference_cache = LRUCache(maxsize=evaluation_cache_size)
+        self.trivial_answer_phrases = {
+            normalize_transcript(phrase) for phrase in (trivial_answer_phrases or [])
+        }
+        self._trivial_evaluations = 0
+
+    def _select_model(self, operation: str) -> str:
+        """
+        Выбрать модель для операции по таблице маршрутизации.
+
+        Если задан fallback_model, под нагрузкой (много запросов в полете или высокая
+        средняя латентность операции) возвращает его вместо основной модели.
+        """
+        primary = self.model_routes.get(operation, DEFAULT_CHAT_MODEL)
+        if not self.fallback_model or self.fallback_model == primary:
+            return primary
+
+        reason = None
+        now = time.monotonic()
+        if self.fallback_max_in_flight and self._in_flight >= self.fallback_max_in_flight:
+            reason = f"in_flight={self._in_flight}"
+        elif now < self._fallback_until.get(operation, 0.0):
+            reason = "latency cooldown"
+        elif self.fallback_latency_seconds and self._latency_ewma.get(operation, 0.0) > self.fallback_latency_seconds:
+            reason = f"latency={self._latency_ewma[operation]:.1f}s"
+            self._fallback_until[operation] = now + self.fallback_cooldown_seconds
+            # После cooldown основная модель получает новый шанс с чистой статистикой
+            self._latency_ewma.pop(operation, None)
+
+        if reason is None:
+            return primary
+
+        self._fallback_count[operation] = self._fallback_count.get(operation, 0) + 1
+        logger.info(f"Routing {operation} to fallback model {self.fallback_model} ({reason})")
+        return self.fallback_model
+
+    def _record_latency(self, operation: str, model: str, elapsed: float):
+        """Обновить скользящую среднюю латентности основной модели операции"""
+        if model != self.model_routes.get(operation, DEFAULT_CHAT_MODEL):
+            return
+        previous = self._latency_ewma.get(operation)
+        if previous is None:
+            self._latency_ewma[operation] = elapsed
+        else:
+            self._latency_ewma[operation] = previous + LATENCY_EWMA_ALPHA * (elapsed - previous)
+
+    def get_routing_stats(self) -> Dict:
+        """Текущая таблица маршрутизации, латентность операций и количество переключений на fallback"""
+        return {
+            "routes": {
+                operation: self.model_routes.get(operation, DEFAULT_CHAT_MODEL)
+                for operation in sorted(set(self.model_routes) | set(self._fallback_count))
+            },
+            "fallback_model": self.fallback_model,
+            "latency_ewma_seconds": {op: round(v, 3) for op, v in self._latency_ewma.items()},
+            "fallback_count": dict(self._fallback_count),
+        }
+
+    def _record_usage(self, operation: str, model: str, response) -> None:
+        """Учесть токены ответа chat.completions (prompt, cached, completion)"""
+        usage = getattr(response, 'usage', None)
+        if usage is None:
+            return
+
+        prompt_tokens = usage.prompt_tokens or 0
+        completion_tokens = usage.completion_tokens or 0
+        details = getattr(usage, 'prompt_tokens_details', None)
+        cached_tokens = (getattr(details, 'cached_tokens', None) or 0) if details else 0
+
+        stats = self._usage.setdefault(operation, {
+            "calls": 0,
+            "prompt_tokens": 0,
+            "cached_tokens": 0,
+            "completion_tokens": 0,
+        })
+        stats["calls"] += 1
+        stats["prompt_tokens"] += prompt_tokens
+        stats["cached_tokens"] += cached_tokens
+        stats["completion_tokens"] += completion_tokens
+
+        logger.debug(
+            f"OpenAI usage: operation={operation}, model={model}, "
+            f"prompt_tokens={prompt_tokens}, cached_tokens={cached_tokens}, "
+            f"completion_tokens={completion_tokens}"
+        )
+
+    def get_usage_stats(self) -> Dict:
+        """Суммарный расход токенов по операциям и доля закэшированных prompt токенов"""
+        result = {}
+        for operation, stats in self._usage.items():
+            prompt_tokens = stats["prompt_tokens"]
+            result[operation] = {
+                **stats,
+                "cache_hit_ratio": round(stats["cached_tokens"] / prompt_tokens, 3) if prompt_tokens else 0.0,
+            }
+        return result
+
+    @asynccontextmanager
+    async def _track_request(self, operation: Optional[str] = None, model: Optional[str] = None):
+        """Учитывает запрос в статистике пула соединений и латентности операции"""
+        self._in_flight += 1
+        self._total_requests += 1
+        self._peak_in_flight = max(self._peak_in_flight, self._in_flight)
+        started = time.monotonic()
+        try:
+            yield
+            if operation and model:
+                self._record_latency(operation, model, time.monotonic() - started)
+        except Exception as e:
+            # OpenAI SDK оборачивает httpx.PoolTimeout в APITimeoutError
+            if isinstance(e, httpx.PoolTimeout) or isinstance(e.__cause__, httpx.PoolTimeout):
+                self._pool_timeouts += 1
+                logger.warning(
+                    f"OpenAI connection pool exhausted: in_flight={self._in_flight}, "
+                    f"max_connections={self.max_connections}"
+                )
+            raise
+        finally:
+            self._in_flight -= 1
+
+    def get_pool_stats(self) -> Dict:
+        """
+        Статистика использования пула соединений к OpenAI.
+
+        Returns:
+            Dict с настройками пула, текущей загрузкой и счетчиком исчерпаний пула
+        """
+        open_connections = None
+        idle_connections = None
+        try:
+            # httpx не публикует состояние пула, берем его из httpcore транспорта
+            pool = getattr(self.http_client._transport, '_pool', None)
+            if pool is not None:
+                connections = list(pool.connections)
+                open_connections = len(connections)
+                idle_connections = len([c for c in connections if c.is_idle()])
+        except Exception as e:
+            logger.debug(f"Could not inspect OpenAI connection pool: {e}")
+
+        return {
+            "max_connections": self.max_connections,
+            "max_keepalive_connections": self.max_keepalive_connections,
+            "keepalive_expiry": self.keepalive_expiry,
+            "http2": self.http2,
+            "open_connections": open_connections,
+            "idle_connections": idle_connections,
+            "in_flight": self._in_flight,
+            "peak_in_flight": self._peak_in_flight,
+            "utilization": round(self._in_flight / self.max_connections, 3) if self.max_connections else None,
+            "total_requests": self._total_requests,
+            "pool_timeouts": self._pool_timeouts,
+        }
+
+    async def close(self):
+        """Закрыть HTTP клиент и освободить соединения"""
+        await self.http_client.aclose()
+
     async def transcribe_audio(self, audio_file_path: str, language: str = "ru") -> Dict:
         """
         Транскрибирует аудио в текст через Whisper API
@@ -42,13 +421,14 @@ class OpenAIService:
         """
         try:
             with open(audio_file_path, "rb") as audio_file:
-                transcript = await self.client.audio.transcriptions.create(
-                    model="whisper-1",
-                    file=audio_file,
-                    language=language if language != "auto" else None,
-                    response_format="verbose_json",
-                    temperature=0
-                )
+                async with self._track_request():
+                    transcript = await self.client.audio.transcriptions.create(
+                        model="whisper-1",
+                        file=audio_file,
+                        language=language if language != "auto" else None,
+                        response_format="verbose_json",
+                        temperature=0
+                    )
 
             return {
                 "text": transcript.text,
@@ -78,33 +458,19 @@ class OpenAIService:
         question_number: int,
         difficulty: int,
         previous_answers: Optional[List[Dict]] = None,
-        knowledge_gaps: Optional[List[str]] = None
+        knowledge_gaps: Optional[List[str]] = None,
+        avoid_questions: Optional[List[str]] = None
     ) -> Dict:
         """
         Генерирует вопрос через GPT-4
 
+        Args:
+            avoid_questions: Уже существующие вопросы, которые не нужно повторять
+                (используется при офлайн-генерации банка вопросов)
+
         Returns:
             Dict с вопросом и метаданными
         """
-        system_prompt = """Ты эксперт по оценке технических компетенций специалистов. 
-Твоя задача - генерировать вопросы для голосового собеседования, которые помогут объективно оценить уровень знаний кандидата.
-
-Принципы создания вопросов:
-1. Вопросы должны проверять ПОНИМАНИЕ, а не заученные факты
-2. Кандидат будет отвечать ГОЛОСОМ (устно), поэтому вопрос должен подразумевать развернутый ответ на 1-3 минуты
-3. Избегай вопросов типа "да/нет" или simple choice
-4. Вопрос должен выявлять глубину понимания концепций
-5. Адаптируй сложность под уровень кандидата на основе предыдущих ответов
-
-Уровни сложности:
-- 1/5: Базовые концепции, определения
-- 2/5: Понимание основ, простые примеры
-- 3/5: Практическое применение, типичные кейсы
-- 4/5: Глубокое понимание, edge cases, оптимизация
-- 5/5: Экспертный уровень, архитектурные решения, trade-offs
-
-Всегда возвращай ответ ТОЛЬКО в JSON формате без дополнительного текста."""
-
         previous_answers_text = ""
         if previous_answers:
             previous_answers_text = "\n".join([
@@ -116,45 +482,47 @@ class OpenAIService:
         else:
             previous_answers_text = "Это первый вопрос по данной компетенции."
 
-        knowledge_gaps_text = ""
-        if knowledge_gaps:
-            knowledge_gaps_text = f'\n\nВыявленные пробелы в знаниях: {", ".join(knowledge_gaps)}'
-
+        # Переменная часть: от наиболее стабильного (роль, компетенция) к наиболее
+        # изменчивому (история ответов), статичные инструкции - в QUESTION_SYSTEM_PROMPT
         user_prompt = f"""Роль: {role_name}
 Компетенция: {competency_name}
 Описание: {competency_description}
-Текущий вопрос: {question_number} из 5
 Уровень сложности: {difficulty}/5
+Текущий вопрос: {question_number} из 5"""
+
+        if knowledge_gaps:
+            user_prompt += (
+                f'\n\nВыявленные пробелы в знаниях: {", ".join(knowledge_gaps)}'
+                f'\nЖелательно затронуть пробел: {knowledge_gaps[0]}'
+            )
+
+        user_prompt += f"""
 
 Контекст предыдущих ответов:
-{previous_answers_text}
-{knowledge_gaps_text if knowledge_gaps_text else ''}
+{previous_answers_text}"""
 
-Сгенерируй ОДИН вопрос для голосового ответа, который:
-1. Соответствует уровню сложности {difficulty}/5
-2. Проверяет глубину понимания компетенции "{competency_name}"
-{f'3. Желательно затрагивает один из пробелов: {knowledge_gaps[0] if knowledge_gaps else ""}' if knowledge_gaps else ''}
+        if avoid_questions:
+            avoided_text = "\n".join(f"- {q}" for q in avoid_questions)
+            user_prompt += f"""
 
-Верни JSON в формате:
-{{
-  "question": "текст вопроса",
-  "difficulty": {difficulty},
-  "expectedKeyPoints": ["ключевой момент 1", "ключевой момент 2", "ключевой момент 3"],
-  "estimatedAnswerTime": "1-2 минуты"
-}}"""
+Не повторяй эти вопросы и не перефразируй их:
+{avoided_text}"""
 
         try:
             logger.info(f"Generating question for competency: {competency_name}, difficulty: {difficulty}")
-            response = await self.client.chat.completions.create(
-                model="gpt-4-turbo-preview",
-                messages=[
-                    {"role": "system", "content": system_prompt},
-                    {"role": "user", "content": user_prompt}
-                ],
-                response_format={"type": "json_object"},
-                temperature=0.7,
-                max_tokens=500
-            )
+            model = self._select_model("generate_question")
+            async with self._track_request("generate_question", model):
+                response = await self.client.chat.completions.create(
+                    model=model,
+                    messages=[
+                        {"role": "system", "content": QUESTION_SYSTEM_PROMPT},
+                        {"role": "user", "content": user_prompt}
+                    ],
+                    response_format={"type": "json_object"},
+                    temperature=0.7,
+                    max_tokens=500
+                )
+            self._record_usage("generate_question", model, response)
             logger.info("Question generated successfully")
 
             result = json.loads(response.choices[0].message.content)
@@ -201,89 +569,185 @@ class OpenAIService:
         question_text: str,
         transcript: str,
         competency_name: str,
-        difficulty: int
+        difficulty: int,
+        question_id: Optional[str] = None
     ) -> Dict:
         """
-        Оценивает ответ кандидата через GPT-4
+        Оценивает ответ кандидата
+
+        Пустые и тривиальные ответы ("не знаю", пара слов) оцениваются локально без GPT.
+        Повторные ответы с тем же текстом (без учета регистра и пробелов) на тот же
+        вопрос и сложность берутся из кэша. Остальные оцениваются через GPT-4.
+
+        Args:
+            question_id: ID вопроса из БД (если нет - ключом кэша служит хэш текста вопроса)
 
         Returns:
             Dict с оценкой и фидбеком
         """
-        system_prompt = """Ты эксперт по оценке технических ответов кандидатов на собеседованиях.
-Твоя задача - объективно оценить устный ответ кандидата, который был транскрибирован в текст.
-
-Критерии оценки:
-1. **Правильность (score 1-5)**:
-   - 1: Полностью неправильный или нерелевантный ответ
-   - 2: Частично правильный, много ошибок
-   - 3: В целом правильный, но с недочетами
-   - 4: Правильный и достаточно полный ответ
-   - 5: Отличный ответ, все ключевые моменты, примеры
-
-2. **Глубина понимания (understandingDepth)**:
-   - shallow: Поверхностное понимание, общие фразы, нет конкретики
-   - medium: Понимает основы, но не углубляется в детали
-   - deep: Глубокое понимание, примеры из практики, нюансы
+        question_key = question_id or hashlib.sha256(
+            normalize_question_text(question_text).encode("utf-8")
+        ).hexdigest()
+        cache_key = (question_key, difficulty, normalize_answer_key(transcript))
+
+        cached = self._evaluation_cache.get(cache_key)
+        if cached is not None:
+            logger.info(f"Evaluation cache hit for question {question_key[:12]}")
+            return copy.deepcopy(cached)
+
+        normalized_transcript = normalize_transcript(transcript)
+        if self._is_trivial_answer(normalized_transcript):
+            self._trivial_evaluations += 1
+            logger.info(f"Trivial answer evaluated locally: '{normalized_transcript[:50]}'")
+            reference = await self._get_reference_answer(
+                question_key, question_text, competency_name, difficulty
+            )
+            result = self._trivial_evaluation(difficulty, reference)
+        else:
+            result = await self._evaluate_answer_with_gpt(
+                question_text, transcript, competency_name, difficulty
+            )
+            # Эталонный ответ из полной оценки переиспользуется для тривиальных ответов
+            self._reference_cache.set(question_key, {
+                "correctAnswer": result["correctAnswer"],
+                "expectedKeyPoints": list(result["expectedKeyPoints"]),
+            })
 
-3. **Выявление пробелов**:
-   - Конкретные темы/концепции, которые кандидат не знает или путает
-   - Что нужно изучить дополнительно
+        self._evaluation_cache.set(cache_key, copy.deepcopy(result))
+        return result
 
-4. **Адаптивность**:
-   - Если ответ хороший (4-5) → увеличить сложность
-   - Если средний (3) → оставить ту же сложность
-   - Если слабый (1-2) → уменьшить сложность
+    def _is_trivial_answer(self, normalized_transcript: str) -> bool:
+        """
+        Пустой ответ или явное "не знаю" - оценивать через GPT нет смысла.
 
-5. **Правильный ответ (correctAnswer)**:
-   - Должен быть развернутым и полным
-   - Включать все ключевые концепции, примеры, лучшие практики
-   - Написан как для учебного материала - понятно и структурированно
-   - Длина: 3-7 предложений для среднего вопроса, больше для сложных
+        Длину ответа не учитываем: короткий ответ ("Virtual DOM", "O(log n)") может быть
+        верным, а локальная оценка к тому же попадает в кэш для всех пользователей.
+        """
+        if not normalized_transcript:
+            return True
+        return normalized_transcript in self.trivial_answer_phrases
+
+    @staticmethod
+    def _trivial_evaluation(difficulty: int, reference: Dict) -> Dict:
+        """Локальная оценка пустого или тривиального ответа (формат как у evaluate_answer)"""
+        return {
+            "score": 1,
+            "understandingDepth": "shallow",
+            "isCorrect": False,
+            "feedback": "Ответ не получен. "
+                        "Попробуйте своими словами рассказать, что вы знаете по теме - "
+                        "даже частичный ответ помогает точнее определить ваш уровень.",
+            "knowledgeGaps": [],
+            "nextDifficulty": max(1, difficulty - 1),
+            "reasoning": "Оценено без GPT: пустой ответ или отказ от ответа",
+            "correctAnswer": reference.get("correctAnswer") or "Правильный ответ не был сгенерирован.",
+            # Копия: список из _reference_cache не должен меняться вызывающим кодом
+            "expectedKeyPoints": list(reference.get("expectedKeyPoints") or []),
+        }
+
+    async def _get_reference_answer(
+        self,
+        question_key: str,
+        question_text: str,
+        competency_name: str,
+        difficulty: int
+    ) -> Dict:
+        """Эталонный ответ на вопрос из кэша или через GPT (ошибка не прерывает оценку)"""
+        reference = self._reference_cache.get(question_key)
+        if reference is not None:
+            return reference
 
-6. **Ключевые моменты (expectedKeyPoints)**:
-   - Список из 3-7 ключевых концепций/моментов, которые должны быть в правильном ответе
-   - Каждый пункт - короткая формулировка (1-5 слов)
-   - Должны отражать основной смысл правильного ответа
+        try:
+            reference = await self.generate_reference_answer(question_text, competency_name, difficulty)
+        except Exception as e:
+            logger.warning(f"Could not generate reference answer: {e}")
+            return {}
 
-Учитывай что это транскрипция устной речи - могут быть запинки, повторы, неидеальная грамматика.
+        self._reference_cache.set(question_key, reference)
+        return reference
 
-Всегда возвращай ответ ТОЛЬКО в JSON формате без дополнительного текста."""
+    async def generate_reference_answer(
+        self,
+        question_text: str,
+        competency_name: str,
+        difficulty: int
+    ) -> Dict:
+        """
+        Генерирует эталонный ответ на вопрос через GPT-4
 
+        Returns:
+            Dict с полями correctAnswer и expectedKeyPoints
+        """
         user_prompt = f"""Компетенция: {competency_name}
 Уровень сложности вопроса: {difficulty}/5
 
-Вопрос: {question_text}
-
-Ответ кандидата (транскрибированный из голоса):
-{transcript}
-
-Оцени ответ и верни JSON со ВСЕМИ полями (обязательно все поля должны присутствовать):
-{{
-  "score": 1-5,
-  "understandingDepth": "shallow|medium|deep",
-  "isCorrect": true|false,
-  "feedback": "Краткий конструктивный фидбек для кандидата (2-3 предложения)",
-  "knowledgeGaps": ["пробел 1", "пробел 2"],
-  "nextDifficulty": 1-5,
-  "reasoning": "Объяснение почему выставлена такая оценка",
-  "correctAnswer": "Эталонный правильный ответ на вопрос. Должен быть развернутым и содержать все ключевые моменты. Минимум 3-5 предложений.",
-  "expectedKeyPoints": ["ключевой момент 1", "ключевой момент 2", "ключевой момент 3"]
-}}
-
-ВАЖНО: Все поля обязательны! Не пропускай ни одно поле."""
+Вопрос: {question_text}"""
 
-        try:
+        model = self._select_model("reference_answer")
+        async with self._track_request("reference_answer", model):
             response = await self.client.chat.completions.create(
-                model="gpt-4-turbo-preview",
+                model=model,
                 messages=[
-                    {"role": "system", "content": system_prompt},
+                    {"role": "system", "content": REFERENCE_ANSWER_SYSTEM_PROMPT},
                     {"role": "user", "content": user_prompt}
                 ],
                 response_format={"type": "json_object"},
                 temperature=0.3,
-                max_tokens=2000  # Увеличено для правильного ответа и всех полей
+                max_tokens=1000
             )
 
+        self._record_usage("reference_answer", model, response)
+
+        result = json.loads(response.choices[0].message.content)
+        if not isinstance(result.get("expectedKeyPoints"), list):
+            result["expectedKeyPoints"] = []
+        return {
+            "correctAnswer": result.get("correctAnswer") or "",
+            "expectedKeyPoints": result["expectedKeyPoints"],
+        }
+
+    def get_evaluation_cache_stats(self) -> Dict:
+        """Статистика кэша оценок и количество локально оцененных тривиальных ответов"""
+        return {
+            **self._evaluation_cache.stats(),
+            "trivial_evaluations": self._trivial_evaluations,
+            "reference_answers_cached": len(self._reference_cache),
+        }
+
+    async def _evaluate_answer_with_gpt(
+        self,
+        question_text: str,
+        transcript: str,
+        competency_name: str,
+        difficulty: int
+    ) -> Dict:
+        """Оценка ответа через GPT-4 (без кэша)"""
+        # Статичная рубрика и формат ответа - в EVALUATION_SYSTEM_PROMPT,
+        # транскрипт (самая изменчивая часть) - в самом конце
+        user_prompt = f"""Компетенция: {competency_name}
+Уровень сложности вопроса: {difficulty}/5
+
+Вопрос: {question_text}
+
+Ответ кандидата (транскрибированный из голоса):
+{transcript}"""
+
+        try:
+            model = self._select_model("evaluate_answer")
+            async with self._track_request("evaluate_answer", model):
+                response = await self.client.chat.completions.create(
+                    model=model,
+                    messages=[
+                        {"role": "system", "content": EVALUATION_SYSTEM_PROMPT},
+                        {"role": "user", "content": user_prompt}
+                    ],
+                    response_format={"type": "json_object"},
+                    temperature=0.3,
+                    max_tokens=2000  # Увеличено для правильного ответа и всех полей
+                )
+
+            self._record_usage("evaluate_answer", model, response)
+
             # Логируем сырой ответ для отладки
             raw_content = response.choices[0].message.content
             logger.debug(f"Raw GPT response: {raw_content[:500]}...")  # Первые 500 символов
@@ -382,42 +846,23 @@ class OpenAIService:
         Returns:
             Dict с массивом компетенций
         """
-        system_prompt = """Ты эксперт по определению технических компетенций для тестирования специалистов.
-Твоя задача - определить список ключевых компетенций для тестирования на основе направления.
-
-Компетенция должна быть:
-- Конкретной и измеримой
-- Релевантной для указанного направления
-- Подходящей для голосового тестирования (можно проверить понимание устно)
-
-Всегда возвращай ответ ТОЛЬКО в JSON формате без дополнительного текста."""
-
-        user_prompt = f"""Направление: {direction}
-
-Определи 5-7 ключевых компетенций для тестирования специалиста в этом направлении.
-
-Верни JSON в формате:
-{{
-  "competencies": [
-    {{
-      "name": "Название компетенции",
-      "description": "Краткое описание что проверяет эта компетенция",
-      "category": "Категория (например, 'Языки программирования', 'Базы данных', 'Архитектура')"
-    }}
-  ]
-}}"""
+        user_prompt = f"Направление: {direction}"
 
         try:
-            response = await self.client.chat.completions.create(
-                model="gpt-4-turbo-preview",
-                messages=[
-                    {"role": "system", "content": system_prompt},
-                    {"role": "user", "content": user_prompt}
-                ],
-                response_format={"type": "json_object"},
-                temperature=0.5,
-                max_tokens=1000
-            )
+            model = self._select_model("determine_competencies")
+            async with self._track_request("determine_competencies", model):
+                response = await self.client.chat.completions.create(
+                    model=model,
+                    messages=[
+                        {"role": "system", "content": COMPETENCIES_SYSTEM_PROMPT},
+                        {"role": "user", "content": user_prompt}
+                    ],
+                    response_format={"type": "json_object"},
+                    temperature=0.5,
+                    max_tokens=1000
+                )
+
+            self._record_usage("determine_competencies", model, response)
 
             result = json.loads(response.choices[0].message.content)
             
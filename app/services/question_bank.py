@@ -0,0 +1,194 @@
+import asyncio
+import logging
+from collections import defaultdict
+from typing import Dict, List, Optional, Tuple
+
+from supabase import Client
+
+logger = logging.getLogger(__name__)
+
+# Максимум строк в одном ответе PostgREST (max-rows по умолчанию в Supabase)
+PAGE_SIZE = 1000
+
+# Колонки вопроса, нужные для выдачи и поиска (updated_at - для инкрементального обновления)
+QUESTION_COLUMNS = (
+    'id, competency_id, question_text, difficulty, question_number, '
+    'expected_key_points, estimated_answer_time, used_count, updated_at'
+)
+
+
+class QuestionBankIndex:
+    """
+    In-memory индекс таблицы questions.
+
+    Вопросы - редко меняющиеся seed-данные, поэтому весь банк загружается при старте,
+    а затем раз в refresh_interval_seconds догружаются строки с updated_at новее
+    последней увиденной. Поиск вопроса (find) выполняется без обращения к БД.
+
+    Удаления инкрементальное обновление не видит, поэтому раз в
+    full_reload_interval_seconds индекс перезагружается целиком.
+    """
+
+    def __init__(
+        self,
+        client: Client,
+        refresh_interval_seconds: float = 60.0,
+        full_reload_interval_seconds: float = 3600.0
+    ):
+        self.client = client
+        self.refresh_interval_seconds = refresh_interval_seconds
+        self.full_reload_interval_seconds = full_reload_interval_seconds
+
+        self._questions: Dict[str, Dict] = {}
+        # (competency_id, difficulty) -> {question_number -> {question_id, ...}}
+        self._cells: Dict[Tuple[str, int], Dict[Optional[int], set]] = defaultdict(lambda: defaultdict(set))
+        self._last_updated_at: Optional[str] = None
+        self._loaded = False
+        self._refresh_task: Optional[asyncio.Task] = None
+
+    @property
+    def loaded(self) -> bool:
+        return self._loaded
+
+    # === Жизненный цикл ===
+
+    async def start(self):
+        """Загрузить банк вопросов и запустить фоновое обновление"""
+        await self.load()
+        if self._refresh_task is None and self.refresh_interval_seconds > 0:
+            self._refresh_task = asyncio.create_task(self._refresh_loop(), name="question-bank-refresh")
+
+    async def stop(self):
+        if self._refresh_task is not None:
+            self._refresh_task.cancel()
+            await asyncio.gather(self._refresh_task, return_exceptions=True)
+            self._refresh_task = None
+
+    async def load(self):
+        """Полная загрузка таблицы questions"""
+        rows = await asyncio.to_thread(self._fetch_rows, None)
+
+        self._questions.clear()
+        self._cells.clear()
+        self._last_updated_at = None
+        for row in rows:
+            self.upsert(row)
+
+        self._loaded = True
+        logger.info(f"Question bank index loaded: {len(self._questions)} questions")
+
+    async def refresh(self) -> int:
+        """
+        Догрузить вопросы, созданные или измененные после последней загрузки.
+
+        Returns:
+            Количество обновленных строк
+        """
+        rows = await asyncio.to_thread(self._fetch_rows, self._last_updated_at)
+        for row in rows:
+            self.upsert(row)
+        if rows:
+            logger.info(f"Question bank index refreshed: {len(rows)} questions updated")
+        return len(rows)
+
+    async def _refresh_loop(self):
+        since_full_reload = 0.0
+        while True:
+            await asyncio.sleep(self.refresh_interval_seconds)
+            since_full_reload += self.refresh_interval_seconds
+            try:
+                if self.full_reload_interval_seconds > 0 and since_full_reload >= self.full_reload_interval_seconds:
+                    await self.load()
+                    since_full_reload = 0.0
+                else:
+                    await self.refresh()
+            except Exception as e:
+                # Индекс продолжает работать на последних загруженных данных
+                logger.error(f"Error refreshing question bank index: {e}")
+
+    def _fetch_rows(self, updated_after: Optional[str]) -> List[Dict]:
+        """Постранично выбрать вопросы (все или с updated_at >= updated_after)"""
+        rows: List[Dict] = []
+        offset = 0
+        while True:
+            query = self.client.table('questions').select(QUESTION_COLUMNS)
+            if updated_after:
+                # gte, а не gt: строки с той же меткой времени могли прийти после прошлой выборки
+                query = query.gte('updated_at', updated_after)
+            response = query \
+                .order('updated_at') \
+                .order('id') \
+                .range(offset, offset + PAGE_SIZE - 1) \
+                .execute()
+
+            page = response.data or []
+            rows.extend(page)
+            if len(page) < PAGE_SIZE:
+                return rows
+            offset += PAGE_SIZE
+
+    # === Изменения ===
+
+    def upsert(self, question: Dict):
+        """Добавить или обновить вопрос в индексе"""
+        question_id = str(question['id'])
+        self.remove(question_id)
+
+        self._questions[question_id] = question
+        cell = (str(question['competency_id']), question['difficulty'])
+        self._cells[cell][question.get('question_number')].add(question_id)
+
+        updated_at = question.get('updated_at')
+        if updated_at and (self._last_updated_at is None or updated_at > self._last_updated_at):
+            self._last_updated_at = updated_at
+
+    def remove(self, question_id: str):
+        """Удалить вопрос из индекса"""
+        question = self._questions.pop(question_id, None)
+        if not question:
+            return
+        cell = self._cells.get((str(question['competency_id']), question['difficulty']))
+        if cell:
+            cell.get(question.get('question_number'), set()).discard(question_id)
+
+    # === Поиск ===
+
+    def find(
+        self,
+        competency_id: str,
+        difficulty: int,
+        question_number: Optional[int] = None,
+        exclude_question_ids: Optional[List[str]] = None
+    ) -> Optional[Dict]:
+        """
+        Найти наименее использованный вопрос - аналог SupabaseService.find_question.
+
+        Args:
+            question_number: Номер вопроса; None - любой номер
+        """
+        cell = self._cells.get((competency_id, difficulty))
+        if not cell:
+            return None
+
+        if question_number is not None:
+            candidate_ids = cell.get(question_number, set())
+        else:
+            candidate_ids = set().union(*cell.values())
+
+        excluded = set(exclude_question_ids or [])
+        candidates = [
+            self._questions[question_id] for question_id in candidate_ids
+            if question_id not in excluded
+        ]
+        if not candidates:
+            return None
+
+        return min(candidates, key=lambda q: (q.get('used_count') or 0, str(q['id'])))
+
+    def stats(self) -> Dict:
+        return {
+            "loaded": self._loaded,
+            "questions": len(self._questions),
+            "cells": len(self._cells),
+            "last_updated_at": self._last_updated_at,
+        }
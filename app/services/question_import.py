@@ -0,0 +1,316 @@
+import csv
+import io
+import json
+import logging
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Optional, TextIO, Tuple
+
+from app.services.supabase_service import SupabaseService
+
+logger = logging.getLogger(__name__)
+
+SUPPORTED_FORMATS = ("jsonl", "json", "csv")
+
+# Сколько ошибок валидации возвращать в отчете (остальные только считаются)
+MAX_REPORTED_ERRORS = 100
+
+# Разделитель expected_key_points в CSV ("Virtual DOM|Reconciliation")
+CSV_LIST_SEPARATOR = "|"
+
+
+# Ошибка PostgreSQL, когда две строки одного upsert попадают в одну строку таблицы
+# ("ON CONFLICT DO UPDATE command cannot affect row a second time")
+CARDINALITY_VIOLATION = "21000"
+
+
+def normalize_question_text(question_text: str) -> str:
+    """
+    Текст вопроса в том виде, в котором он записывается в БД: любые пробельные символы
+    Unicode (включая неразрывный пробел и переводы строк) схлопнуты в один пробел.
+
+    Колонка questions.question_hash считается как
+    md5(lower(btrim(regexp_replace(question_text, '\\s+', ' ', 'g')))). Для уже нормализованного
+    текста regexp_replace и btrim ничего не меняют, поэтому пробелы нормализуются только
+    здесь, а ключ дедупликации отличается от БД разве что правилами lower().
+    """
+    return " ".join(question_text.split())
+
+
+def question_hash_key(question_text: str) -> str:
+    """Ключ уникальности вопроса внутри импорта (аналог questions.question_hash)"""
+    return normalize_question_text(question_text).lower()
+
+
+def resolve_competency_by_name(name: str, candidates: List[Dict]) -> Tuple[Optional[str], Optional[str]]:
+    """
+    Выбрать компетенцию среди одноименных (уникальность - (role_id, name)).
+
+    Предпочитается общая компетенция без роли; если ее нет, название однозначно,
+    только когда оно есть ровно у одной роли.
+
+    Returns:
+        (competency_id, None) или (None, текст ошибки для отчета импорта)
+    """
+    if not candidates:
+        return None, f"Компетенция '{name}' не найдена"
+
+    shared = [c for c in candidates if c.get("role_id") is None]
+    if len(shared) == 1:
+        return str(shared[0]["id"]), None
+    if not shared and len(candidates) == 1:
+        return str(candidates[0]["id"]), None
+
+    role_ids = ", ".join(sorted(str(c.get("role_id")) for c in candidates))
+    return None, (
+        f"Компетенция '{name}' неоднозначна: она есть у нескольких ролей ({role_ids}), "
+        f"укажите competency_id"
+    )
+
+
+def detect_format(filename: str) -> str:
+    """Определить формат файла по расширению (.jsonl/.ndjson, .json или .csv)"""
+    suffix = Path(filename or "").suffix.lower()
+    if suffix in (".jsonl", ".ndjson"):
+        return "jsonl"
+    if suffix == ".json":
+        return "json"
+    if suffix == ".csv":
+        return "csv"
+    raise ValueError(f"Не удалось определить формат файла '{filename}'. Поддерживаются: .jsonl, .json, .csv")
+
+
+def iter_question_rows(stream: TextIO, file_format: str) -> Iterator[Tuple[int, Dict]]:
+    """
+    Построчно читать вопросы из файла, не загружая его целиком.
+
+    JSON массив ([{...}, {...}]) читается целиком - для больших файлов используйте JSONL.
+
+    Yields:
+        (номер строки, сырая запись) - для невалидного JSON запись содержит ключ "_error";
+        для JSON массива вместо номера строки - номер элемента (с 1)
+    """
+    if file_format == "jsonl":
+        for line_number, line in enumerate(stream, 1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                row = json.loads(line)
+            except json.JSONDecodeError as e:
+                yield line_number, {"_error": f"Невалидный JSON: {e.msg}"}
+                continue
+            yield line_number, row if isinstance(row, dict) else {"_error": "Строка должна быть JSON объектом"}
+    elif file_format == "json":
+        try:
+            data = json.load(stream)
+        except json.JSONDecodeError as e:
+            yield e.lineno, {"_error": f"Невалидный JSON: {e.msg}"}
+            return
+        if not isinstance(data, list):
+            yield 1, {"_error": "Файл .json должен содержать JSON массив объектов (для построчного формата используйте .jsonl)"}
+            return
+        for index, row in enumerate(data, 1):
+            yield index, row if isinstance(row, dict) else {"_error": "Элемент массива должен быть JSON объектом"}
+    elif file_format == "csv":
+        reader = csv.DictReader(stream)
+        # Строка 1 - заголовок
+        for line_number, row in enumerate(reader, 2):
+            yield line_number, row
+    else:
+        raise ValueError(f"Неподдерживаемый формат '{file_format}'. Поддерживаются: {', '.join(SUPPORTED_FORMATS)}")
+
+
+def _parse_int(value, field: str, required: bool) -> Optional[int]:
+    if value is None or value == "":
+        if required:
+            raise ValueError(f"Поле '{field}' обязательно")
+        return None
+    try:
+        number = int(value)
+    except (TypeError, ValueError):
+        raise ValueError(f"Поле '{field}' должно быть числом, получено '{value}'")
+    if not 1 <= number <= 5:
+        raise ValueError(f"Поле '{field}' должно быть от 1 до 5, получено {number}")
+    return number
+
+
+def _parse_key_points(value) -> List[str]:
+    if value is None or value == "":
+        return []
+    if isinstance(value, list):
+        return [str(point).strip() for point in value if str(point).strip()]
+    if isinstance(value, str):
+        value = value.strip()
+        # В CSV допускается как JSON массив, так и список через "|"
+        if value.startswith("["):
+            try:
+                return _parse_key_points(json.loads(value))
+            except json.JSONDecodeError:
+                raise ValueError("Поле 'expected_key_points' содержит невалидный JSON массив")
+        return [point.strip() for point in value.split(CSV_LIST_SEPARATOR) if point.strip()]
+    raise ValueError("Поле 'expected_key_points' должно быть списком строк")
+
+
+def validate_question_row(row: Dict) -> Dict:
+    """
+    Проверить и привести к формату таблицы questions одну запись файла.
+
+    Компетенция задается полем competency_id или competency (название).
+
+    Raises:
+        ValueError: Запись невалидна
+    """
+    if "_error" in row:
+        raise ValueError(row["_error"])
+
+    question_text = normalize_question_text(row.get("question_text") or row.get("question") or "")
+    if not question_text:
+        raise ValueError("Поле 'question_text' обязательно")
+
+    competency_id = (str(row.get("competency_id") or "")).strip()
+    competency_name = (row.get("competency") or row.get("competency_name") or "").strip()
+    if not competency_id and not competency_name:
+        raise ValueError("Нужно указать 'competency_id' или 'competency'")
+
+    return {
+        "competency_id": competency_id or None,
+        "competency_name": competency_name or None,
+        "question_text": question_text,
+        "difficulty": _parse_int(row.get("difficulty"), "difficulty", required=True),
+        "question_number": _parse_int(row.get("question_number"), "question_number", required=False),
+        "expected_key_points": _parse_key_points(row.get("expected_key_points")),
+        "estimated_answer_time": (row.get("estimated_answer_time") or "").strip() or "1-2 минуты",
+    }
+
+
+class QuestionImportService:
+    """
+    Массовый импорт вопросов из JSONL/CSV.
+
+    Файл читается потоково пачками по chunk_size строк. Для каждой пачки названия
+    компетенций разрешаются одним запросом (с кэшем между пачками), а вопросы
+    записываются одним upsert: повторный импорт того же файла обновляет существующие
+    вопросы (ключ - компетенция + нормализованный текст), а не создает дубликаты.
+    """
+
+    def __init__(self, supabase_service: SupabaseService):
+        self.supabase = supabase_service
+
+    async def import_rows(
+        self,
+        rows: Iterable[Tuple[int, Dict]],
+        chunk_size: int = 1000,
+        dry_run: bool = False
+    ) -> Dict:
+        """
+        Импортировать вопросы.
+
+        Args:
+            rows: Пары (номер строки, запись), например из iter_question_rows
+            chunk_size: Сколько строк записывать одним запросом
+            dry_run: Только валидация, без записи в БД
+
+        Returns:
+            Отчет: total, imported, duplicates, invalid, errors (первые MAX_REPORTED_ERRORS)
+        """
+        report = {"total": 0, "imported": 0, "duplicates": 0, "invalid": 0, "errors": [], "dry_run": dry_run}
+        # Название -> (competency_id, ошибка разрешения названия)
+        competency_ids_by_name: Dict[str, Tuple[Optional[str], Optional[str]]] = {}
+        seen_keys = set()
+        chunk: List[Tuple[int, Dict]] = []
+
+        for line_number, row in rows:
+            report["total"] += 1
+            try:
+                chunk.append((line_number, validate_question_row(row)))
+            except ValueError as e:
+                self._add_error(report, line_number, str(e))
+                continue
+
+            if len(chunk) >= chunk_size:
+                await self._import_chunk(chunk, competency_ids_by_name, seen_keys, report, dry_run)
+                chunk = []
+
+        if chunk:
+            await self._import_chunk(chunk, competency_ids_by_name, seen_keys, report, dry_run)
+
+        logger.info(
+            f"Question import finished: total={report['total']}, imported={report['imported']}, "
+            f"duplicates={report['duplicates']}, invalid={report['invalid']}, dry_run={dry_run}"
+        )
+        return report
+
+    async def _import_chunk(
+        self,
+        chunk: List[Tuple[int, Dict]],
+        competency_ids_by_name: Dict[str, Tuple[Optional[str], Optional[str]]],
+        seen_keys: set,
+        report: Dict,
+        dry_run: bool
+    ):
+        # Одним запросом разрешаем названия компетенций, которых еще нет в кэше
+        unknown_names = {
+            question["competency_name"] for _, question in chunk
+            if not question["competency_id"] and question["competency_name"] not in competency_ids_by_name
+        }
+        if unknown_names:
+            found = await self.supabase.get_competencies_by_names(list(unknown_names))
+            for name in unknown_names:
+                competency_ids_by_name[name] = resolve_competency_by_name(name, found.get(name, []))
+
+        questions = []
+        for line_number, question in chunk:
+            competency_id = question["competency_id"]
+            if not competency_id:
+                competency_id, error = competency_ids_by_name[question["competency_name"]]
+                if error:
+                    self._add_error(report, line_number, error)
+                    continue
+
+            # Дубликаты внутри файла: upsert не может обновить одну строку дважды за запрос
+            key = (competency_id, question_hash_key(question["question_text"]))
+            if key in seen_keys:
+                report["duplicates"] += 1
+                continue
+            seen_keys.add(key)
+
+            questions.append({
+                "competency_id": competency_id,
+                "question_text": question["question_text"],
+                "difficulty": question["difficulty"],
+                "question_number": question["question_number"],
+                "expected_key_points": question["expected_key_points"],
+                "estimated_answer_time": question["estimated_answer_time"],
+            })
+
+        if not questions:
+            return
+
+        if dry_run:
+            report["imported"] += len(questions)
+            return
+
+        try:
+            saved = await self.supabase.bulk_create_questions(questions, chunk_size=len(questions), upsert=True)
+        except Exception as e:
+            if CARDINALITY_VIOLATION not in str(e):
+                raise
+            # lower() в БД склеил тексты, которые здесь различаются (зависит от collation):
+            # пишем пачку по одной строке - повторная строка обновит предыдущую
+            logger.warning(f"Question import chunk has rows with the same question_hash, retrying row by row: {e}")
+            saved = []
+            for question in questions:
+                saved.extend(await self.supabase.bulk_create_questions([question], upsert=True))
+        report["imported"] += len(saved)
+
+    @staticmethod
+    def _add_error(report: Dict, line_number: int, error: str):
+        report["invalid"] += 1
+        if len(report["errors"]) < MAX_REPORTED_ERRORS:
+            report["errors"].append({"line": line_number, "error": error})
+
+
+def open_text_stream(binary_stream) -> TextIO:
+    """Обернуть бинарный поток (файл загрузки) для построчного чтения UTF-8 текста"""
+    # utf-8-sig: CSV из Excel часто начинается с BOM
+    return io.TextIOWrapper(binary_stream, encoding="utf-8-sig", newline="")
@@ -1,15 +1,120 @@
 from supabase import Client
-from typing import List, Dict, Optional
+from typing import List, Dict, Optional, Tuple
 import logging
 from uuid import UUID
 from datetime import datetime
+from app.config import settings
+from app.services.question_bank import QUESTION_COLUMNS, QuestionBankIndex
+from app.utils.cache import LRUCache
 
 logger = logging.getLogger(__name__)
 
+# Справочники (направления, технологии, компетенции) по (таблица, name)
+_catalog_cache = LRUCache(
+    maxsize=settings.catalog_cache_size,
+    ttl_seconds=settings.catalog_cache_ttl_seconds
+)
+
+def invalidate_catalog_cache(table: Optional[str] = None, name: Optional[str] = None) -> int:
+    """
+    Сбросить закэшированные строки справочников.
+
+    Вызывается после изменения или удаления направлений, технологий и компетенций.
+    Без аргументов очищает весь кэш, с table - строки таблицы, с table и name - одну строку.
+
+    Returns:
+        Количество удаленных записей
+    """
+    keys = [
+        key for key in _catalog_cache.keys()
+        if (table is None or key[0] == table) and (name is None or key[1] == name)
+    ]
+    for key in keys:
+        _catalog_cache.pop(key)
+    return len(keys)
+
+
+# Проекции колонок для чтения: запрашиваем только то, что используют вызывающие,
+# без тяжелых JSONB/TEXT полей (ai_evaluation, transcript, test_session_data)
+ASSESSMENT_COLUMNS = (
+    'id, user_id, role_id, direction_id, technology_id, status, '
+    'overall_score, attempt_number, started_at, completed_at'
+)
+COMPETENCY_ASSESSMENT_COLUMNS = (
+    'id, assessment_id, competency_id, ai_assessed_score, confidence_level, gap_analysis, completed_at'
+)
+COMPETENCY_COLUMNS = 'id, role_id, name, description, category, importance_weight, order_index'
+QUESTION_HISTORY_COLUMNS = (
+    'id, competency_assessment_id, question_id, question_text, question_type, difficulty_level, '
+    'score, is_correct, understanding_depth, feedback, knowledge_gaps, time_spent_seconds, '
+    'asked_at, answered_at'
+)
+# История для пересчета оценки компетенции
+QUESTION_HISTORY_SCORING_COLUMNS = 'question_id, difficulty_level, score, knowledge_gaps'
+# Ключ keyset-пагинации списка тестирований (порядок сортировки)
+ASSESSMENT_KEYSET_COLUMNS = ('attempt_number', 'started_at', 'id')
+# Связанные справочники в карточке тестирования (используется только name)
+REFERENCE_COLUMNS = 'id, name'
+
 
 class SupabaseService:
-    def __init__(self, client: Client):
+    def __init__(self, client: Client, question_bank: Optional[QuestionBankIndex] = None):
         self.client = client
+        # In-memory индекс вопросов (если не задан или не загружен - поиск идет в БД)
+        self.question_bank = question_bank
+
+    async def _find_or_create_by_name(
+        self,
+        table: str,
+        name: str,
+        data: Dict,
+        null_columns: Tuple[str, ...] = ()
+    ) -> Dict:
+        """
+        Найти строку справочника по name или создать ее.
+
+        Порядок: кэш справочников -> SELECT -> INSERT ... ON CONFLICT DO NOTHING.
+        Если строку одновременно создал другой запрос, upsert ничего не вернет,
+        и она перечитывается - без ошибки уникальности.
+
+        Args:
+            null_columns: Колонки владельца, которые у строки должны быть NULL (role_id у
+                общих компетенций); входят в ключ уникальности вместе с name
+        """
+        cache_key = (table, name)
+        cached = _catalog_cache.get(cache_key)
+        if cached is not None:
+            return cached
+
+        def select_by_name():
+            query = self.client.table(table).select('*').eq('name', name)
+            for column in null_columns:
+                query = query.is_(column, 'null')
+            return query.limit(1).execute()
+
+        response = select_by_name()
+        row = response.data[0] if response.data else None
+
+        if row is None:
+            try:
+                response = self.client.table(table) \
+                    .upsert(data, on_conflict=','.join((*null_columns, 'name')), ignore_duplicates=True) \
+                    .execute()
+            except Exception as e:
+                # Нет уникального индекса по name (миграция не применена) - обычная вставка
+                logger.warning(f"Upsert into {table} by name failed ({e}), falling back to insert")
+                response = self.client.table(table).insert(data).execute()
+            row = response.data[0] if response.data else None
+
+        if row is None:
+            # Гонка: строку создал параллельный запрос
+            response = select_by_name()
+            if not response.data:
+                raise ValueError(f"Failed to create {table} row '{name}' - no data returned")
+            row = response.data[0]
+
+        _catalog_cache.set(cache_key, row)
+        return row
 
     # === ROLES & COMPETENCIES ===
 
@@ -41,7 +146,7 @@ class SupabaseService:
         """Получить компетенции для роли"""
         try:
             response = self.client.table('competencies') \
-                .select('*') \
+                .select(COMPETENCY_COLUMNS) \
                 .eq('role_id', role_id) \
                 .order('order_index') \
                 .execute()
@@ -91,6 +196,23 @@ class SupabaseService:
             logger.error(f"Error getting/creating user: {e}")
             raise
 
+    async def ensure_user(self, user_id: str, email: Optional[str] = None, full_name: Optional[str] = None) -> None:
+        """
+        Создать пользователя, если его нет, и обновить last_login - одним запросом.
+
+        Использует RPC функцию ensure_user (INSERT ... ON CONFLICT DO UPDATE last_login).
+        Если функция еще не создана в БД, выполняется get_or_create_user.
+        """
+        try:
+            self.client.rpc('ensure_user', {
+                'p_user_id': user_id,
+                'p_email': email,
+                'p_full_name': full_name
+            }).execute()
+        except Exception as e:
+            logger.warning(f"ensure_user RPC failed ({e}), falling back to get_or_create_user")
+            await self.get_or_create_user(user_id, email=email, full_name=full_name)
+
     # === ASSESSMENTS ===
 
     async def create_assessment(self, user_id: str, role_id: str) -> Dict:
@@ -184,27 +306,14 @@ class SupabaseService:
     ) -> Dict:
         """Найти компетенцию по имени или создать новую (без привязки к роли)"""
         try:
-            # Ищем существующую компетенцию
-            response = self.client.table('competencies') \
-                .select('*') \
-                .eq('name', name) \
-                .limit(1) \
-                .execute()
-            
-            if response.data:
-                return response.data[0]
-            
-            # Создаем новую компетенцию без role_id
-            response = self.client.table('competencies').insert({
+            return await self._find_or_create_by_name('competencies', name, {
                 'name': name,
                 'description': description,
                 'category': category,
                 'role_id': None,  # Компетенция не привязана к роли
                 'importance_weight': 3,
                 'order_index': 0
-            }).execute()
-            
-            return response.data[0]
+            }, null_columns=('role_id',))
         except Exception as e:
             logger.error(f"Error finding/creating competency: {e}")
             raise
@@ -220,17 +329,6 @@ class SupabaseService:
     ) -> Dict:
         """Найти направление по имени или создать новое"""
         try:
-            # Ищем существующее направление
-            response = self.client.table('directions') \
-                .select('*') \
-                .eq('name', name.lower()) \
-                .limit(1) \
-                .execute()
-            
-            if response.data:
-                return response.data[0]
-            
-            # Создаем новое направление
             direction_data = {
                 'name': name.lower(),
                 'display_name': display_name or name,
@@ -240,14 +338,46 @@ class SupabaseService:
             if technologies:
                 direction_data['technologies'] = technologies
             
-            response = self.client.table('directions').insert(direction_data).execute()
+            return await self._find_or_create_by_name('directions', name.lower(), direction_data)
+        except Exception as e:
+            logger.error(f"Error finding/creating direction: {e}")
+            raise
+
+    async def get_cached_direction_competencies(self, direction_key: str) -> Optional[List[Dict]]:
+        """Получить сохраненные компетенции по нормализованному ключу направления"""
+        try:
+            response = self.client.table('direction_competency_cache') \
+                .select('competencies') \
+                .eq('direction_key', direction_key) \
+                .limit(1) \
+                .execute()
             
-            if not response.data or len(response.data) == 0:
-                raise ValueError("Failed to create direction - no data returned")
+            if not response.data:
+                return None
             
-            return response.data[0]
+            return response.data[0]['competencies']
         except Exception as e:
-            logger.error(f"Error finding/creating direction: {e}")
+            logger.error(f"Error fetching cached direction competencies: {e}")
+            raise
+
+    async def save_direction_competencies(
+        self,
+        direction_key: str,
+        direction_text: str,
+        competencies: List[Dict]
+    ) -> Dict:
+        """Сохранить компетенции для нормализованного ключа направления (upsert)"""
+        try:
+            response = self.client.table('direction_competency_cache').upsert({
+                'direction_key': direction_key,
+                'direction_text': direction_text,
+                'competencies': competencies,
+                'updated_at': datetime.utcnow().isoformat()
+            }, on_conflict='direction_key').execute()
+            
+            return response.data[0] if response.data else {}
+        except Exception as e:
+            logger.error(f"Error saving direction competencies cache: {e}")
             raise
 
     async def get_direction(self, direction_id: str) -> Optional[Dict]:
@@ -281,7 +411,7 @@ class SupabaseService:
         """Получить компетенции для направления"""
         try:
             response = self.client.table('direction_competencies') \
-                .select('*, competencies(*)') \
+                .select(f'competency_id, order_index, competencies({COMPETENCY_COLUMNS})') \
                 .eq('direction_id', direction_id) \
                 .order('order_index') \
                 .execute()
@@ -326,30 +456,54 @@ class SupabaseService:
     ) -> Dict:
         """Найти технологию по имени или создать новую"""
         try:
-            # Ищем существующую технологию
+            return await self._find_or_create_by_name('technologies', name.lower(), {
+                'name': name.lower(),
+                'description': description
+            })
+        except Exception as e:
+            logger.error(f"Error finding/creating technology: {e}")
+            raise
+
+    async def get_technology_by_name(self, name: str) -> Optional[Dict]:
+        """Получить технологию по имени (без создания)"""
+        try:
             response = self.client.table('technologies') \
                 .select('*') \
                 .eq('name', name.lower()) \
                 .limit(1) \
                 .execute()
             
-            if response.data:
-                return response.data[0]
-            
-            # Создаем новую технологию
-            technology_data = {
-                'name': name.lower(),
-                'description': description
-            }
-            
-            response = self.client.table('technologies').insert(technology_data).execute()
-            
-            if not response.data or len(response.data) == 0:
-                raise ValueError("Failed to create technology - no data returned")
+            return response.data[0] if response.data else None
+        except Exception as e:
+            logger.error(f"Error fetching technology by name: {e}")
+            raise
+
+    async def get_competencies_by_names(self, names: List[str]) -> Dict[str, List[Dict]]:
+        """
+        Получить компетенции по списку названий одним запросом.
+
+        Название уникально только в пределах роли (role_id, name), поэтому одному
+        названию может соответствовать несколько компетенций - выбор остается
+        вызывающему коду.
+
+        Returns:
+            Словарь {название: [компетенции с id, name, role_id]} (ненайденных названий в нем нет)
+        """
+        if not names:
+            return {}
+        try:
+            response = self.client.table('competencies') \
+                .select('id, name, role_id') \
+                .in_('name', names) \
+                .order('id') \
+                .execute()
             
-            return response.data[0]
+            competencies_by_name: Dict[str, List[Dict]] = {}
+            for competency in response.data or []:
+                competencies_by_name.setdefault(competency['name'], []).append(competency)
+            return competencies_by_name
         except Exception as e:
-            logger.error(f"Error finding/creating technology: {e}")
+            logger.error(f"Error fetching competencies by names: {e}")
             raise
 
     async def get_technology(self, technology_id: str) -> Optional[Dict]:
@@ -370,7 +524,7 @@ class SupabaseService:
         """Получить технологии для направления"""
         try:
             response = self.client.table('direction_technologies') \
-                .select('*, technologies(*)') \
+                .select('technology_id, order_index, technologies(id, name, description)') \
                 .eq('direction_id', direction_id) \
                 .order('order_index') \
                 .execute()
@@ -384,7 +538,7 @@ class SupabaseService:
         """Получить компетенции для технологии"""
         try:
             response = self.client.table('technology_competencies') \
-                .select('*, competencies(*)') \
+                .select(f'competency_id, order_index, competencies({COMPETENCY_COLUMNS})') \
                 .eq('technology_id', technology_id) \
                 .order('order_index') \
                 .execute()
@@ -446,6 +600,74 @@ class SupabaseService:
             logger.error(f"Error creating technology_competency: {e}")
             raise
 
+    async def get_existing_ids(self, table: str, ids: List[str]) -> set:
+        """Какие из переданных ID существуют в таблице (один запрос)"""
+        if not ids:
+            return set()
+        try:
+            response = self.client.table(table) \
+                .select('id') \
+                .in_('id', ids) \
+                .execute()
+            
+            return {str(row['id']) for row in (response.data or [])}
+        except Exception as e:
+            logger.error(f"Error checking existing ids in {table}: {e}")
+            raise
+
+    async def bulk_upsert_links(
+        self,
+        table: str,
+        parent_column: str,
+        parent_id: str,
+        child_column: str,
+        child_ids: List[str],
+        order_indexes: Optional[Dict[str, int]] = None
+    ) -> Dict[str, str]:
+        """
+        Создать связи родитель -> дети в таблице связей одним запросом.
+
+        Существующие связи не дублируются (upsert по первичному ключу связи),
+        у них только обновляется order_index.
+
+        Args:
+            table: Таблица связей (direction_technologies, technology_competencies, ...)
+            parent_column: Колонка родителя, например 'direction_id'
+            child_column: Колонка ребенка, например 'technology_id'
+            order_indexes: order_index для каждого ребенка
+
+        Returns:
+            Словарь {child_id: 'created' | 'updated'}
+        """
+        if not child_ids:
+            return {}
+        try:
+            existing_response = self.client.table(table) \
+                .select(child_column) \
+                .eq(parent_column, parent_id) \
+                .in_(child_column, child_ids) \
+                .execute()
+            existing = {str(row[child_column]) for row in (existing_response.data or [])}
+
+            rows = []
+            for child_id in child_ids:
+                row = {parent_column: parent_id, child_column: child_id}
+                if order_indexes and child_id in order_indexes:
+                    row['order_index'] = order_indexes[child_id]
+                rows.append(row)
+
+            self.client.table(table) \
+                .upsert(rows, on_conflict=f'{parent_column},{child_column}') \
+                .execute()
+
+            return {
+                child_id: 'updated' if child_id in existing else 'created'
+                for child_id in child_ids
+            }
+        except Exception as e:
+            logger.error(f"Error bulk linking {table}: {e}")
+            raise
+
     async def get_assessments_by_user(
         self,
         user_id: str,
@@ -456,7 +678,7 @@ class SupabaseService:
         try:
             # Получаем assessments без join (чтобы избежать ошибок с NULL foreign keys)
             query = self.client.table('assessments') \
-                .select('*') \
+                .select(ASSESSMENT_COLUMNS) \
                 .eq('user_id', user_id)
             
             if direction_id:
@@ -478,7 +700,7 @@ class SupabaseService:
                 if assessment.get('role_id'):
                     try:
                         role_response = self.client.table('roles') \
-                            .select('*') \
+                            .select(REFERENCE_COLUMNS) \
                             .eq('id', assessment['role_id']) \
                             .maybe_single() \
                             .execute()
@@ -491,7 +713,7 @@ class SupabaseService:
                 if assessment.get('direction_id'):
                     try:
                         direction_response = self.client.table('directions') \
-                            .select('*') \
+                            .select(REFERENCE_COLUMNS) \
                             .eq('id', assessment['direction_id']) \
                             .maybe_single() \
                             .execute()
@@ -504,7 +726,7 @@ class SupabaseService:
                 if assessment.get('technology_id'):
                     try:
                         technology_response = self.client.table('technologies') \
-                            .select('*') \
+                            .select(REFERENCE_COLUMNS) \
                             .eq('id', assessment['technology_id']) \
                             .maybe_single() \
                             .execute()
@@ -518,12 +740,83 @@ class SupabaseService:
             logger.error(f"Error fetching user assessments: {e}")
             raise
 
+    async def list_user_assessments(
+        self,
+        user_id: str,
+        limit: int,
+        after: Optional[Dict] = None,
+        status: Optional[str] = None,
+        direction_id: Optional[str] = None,
+        technology_id: Optional[str] = None
+    ) -> Tuple[List[Dict], Optional[Dict]]:
+        """
+        Страница тестирований пользователя (keyset-пагинация).
+
+        Сортировка (attempt_number, started_at, id) по убыванию совпадает с индексом
+        idx_assessments_user_keyset, поэтому каждая страница - один проход по индексу
+        без OFFSET, а вставка новых попыток не сдвигает уже выданные страницы.
+
+        Args:
+            limit: Размер страницы
+            after: Ключ последней строки предыдущей страницы (ASSESSMENT_KEYSET_COLUMNS)
+
+        Returns:
+            (строки страницы, ключ последней строки или None, если страница последняя)
+        """
+        try:
+            query = self.client.table('assessments') \
+                .select(ASSESSMENT_COLUMNS) \
+                .eq('user_id', user_id)
+
+            if status:
+                query = query.eq('status', status)
+
+            if direction_id:
+                query = query.eq('direction_id', direction_id)
+
+            if technology_id:
+                query = query.eq('technology_id', technology_id)
+
+            if after:
+                # (attempt_number, started_at, id) < (a, s, i) в виде дерева условий PostgREST;
+                # значения в кавычках - в метке времени есть зарезервированные символы
+                attempt = f'"{after["attempt_number"]}"'
+                started = f'"{after["started_at"]}"'
+                last_id = f'"{after["id"]}"'
+                query = query.or_(
+                    f'attempt_number.lt.{attempt},'
+                    f'and(attempt_number.eq.{attempt},started_at.lt.{started}),'
+                    f'and(attempt_number.eq.{attempt},started_at.eq.{started},id.lt.{last_id})'
+                )
+
+            # Лишняя строка показывает, есть ли следующая страница
+            response = query \
+                .order('attempt_number', desc=True) \
+                .order('started_at', desc=True) \
+                .order('id', desc=True) \
+                .limit(limit + 1) \
+                .execute()
+
+            rows = response.data or []
+            if len(rows) <= limit:
+                return rows, None
+
+            rows = rows[:limit]
+            last = rows[-1]
+            return rows, {key: last.get(key) for key in ASSESSMENT_KEYSET_COLUMNS}
+        except Exception as e:
+            logger.error(f"Error listing user assessments: {e}")
+            raise
+
     async def get_assessment(self, assessment_id: str) -> Optional[Dict]:
         """Получить информацию о тестировании"""
         try:
             # Получаем assessment с competency_assessments (это всегда работает)
             response = self.client.table('assessments') \
-                .select('*, competency_assessments(*, competencies(*))') \
+                .select(
+                    f'{ASSESSMENT_COLUMNS}, '
+                    f'competency_assessments({COMPETENCY_ASSESSMENT_COLUMNS}, competencies({COMPETENCY_COLUMNS}))'
+                ) \
                 .eq('id', assessment_id) \
                 .maybe_single() \
                 .execute()
@@ -538,7 +831,7 @@ class SupabaseService:
             if assessment.get('role_id'):
                 try:
                     role_response = self.client.table('roles') \
-                        .select('*') \
+                        .select(REFERENCE_COLUMNS) \
                         .eq('id', assessment['role_id']) \
                         .maybe_single() \
                         .execute()
@@ -551,7 +844,7 @@ class SupabaseService:
             if assessment.get('direction_id'):
                 try:
                     direction_response = self.client.table('directions') \
-                        .select('*') \
+                        .select(REFERENCE_COLUMNS) \
                         .eq('id', assessment['direction_id']) \
                         .maybe_single() \
                         .execute()
@@ -564,7 +857,7 @@ class SupabaseService:
             if assessment.get('technology_id'):
                 try:
                     technology_response = self.client.table('technologies') \
-                        .select('*') \
+                        .select(REFERENCE_COLUMNS) \
                         .eq('id', assessment['technology_id']) \
                         .maybe_single() \
                         .execute()
@@ -601,6 +894,107 @@ class SupabaseService:
             logger.error(f"Error updating assessment: {e}")
             raise
 
+    # === PROGRESS SUMMARY ===
+
+    async def refresh_user_progress_summary(
+        self,
+        user_id: str,
+        direction_id: Optional[str] = None,
+        technology_id: Optional[str] = None
+    ) -> None:
+        """
+        Пересчитать строку user_progress_summary для (пользователь, направление, технология).
+
+        Агрегация выполняется в БД функцией refresh_user_progress_summary одним запросом.
+        """
+        try:
+            self.client.rpc('refresh_user_progress_summary', {
+                'p_user_id': user_id,
+                'p_direction_id': direction_id,
+                'p_technology_id': technology_id
+            }).execute()
+        except Exception as e:
+            logger.error(f"Error refreshing user progress summary: {e}")
+            raise
+
+    async def get_user_progress_summary(self, user_id: str) -> List[Dict]:
+        """
+        Сводка прогресса пользователя: по строке на (направление, технология),
+        от последних пройденных к старым. К строкам добавляются названия направления и технологии.
+        """
+        try:
+            response = self.client.table('user_progress_summary') \
+                .select(
+                    'direction_id, technology_id, completed_count, best_score, last_score, '
+                    'previous_score, average_score, recent_attempts, first_completed_at, '
+                    'last_completed_at, updated_at'
+                ) \
+                .eq('user_id', user_id) \
+                .order('last_completed_at', desc=True) \
+                .execute()
+            
+            rows = response.data or []
+            if not rows:
+                return []
+            
+            # Названия справочников - по одному запросу на таблицу, без join по NULL ключам
+            names = {}
+            for table, column in (('directions', 'direction_id'), ('technologies', 'technology_id')):
+                ids = list({str(row[column]) for row in rows if row.get(column)})
+                if ids:
+                    names_response = self.client.table(table) \
+                        .select(REFERENCE_COLUMNS) \
+                        .in_('id', ids) \
+                        .execute()
+                    names[table] = {str(r['id']): r['name'] for r in (names_response.data or [])}
+            
+            for row in rows:
+                row['direction_name'] = names.get('directions', {}).get(str(row.get('direction_id')))
+                row['technology_name'] = names.get('technologies', {}).get(str(row.get('technology_id')))
+            
+            return rows
+        except Exception as e:
+            logger.error(f"Error fetching user progress summary: {e}")
+            raise
+
+    # === ANALYTICS ===
+
+    async def get_knowledge_gap_stats(
+        self,
+        direction_id: Optional[str] = None,
+        technology_id: Optional[str] = None,
+        competency_id: Optional[str] = None,
+        since: Optional[datetime] = None,
+        until: Optional[datetime] = None,
+        gap: Optional[str] = None,
+        limit: int = 50
+    ) -> List[Dict]:
+        """
+        Топ пробелов в знаниях по компетенциям и направлениям.
+
+        Агрегация выполняется в БД функцией knowledge_gap_stats по нормализованной
+        колонке question_history.knowledge_gaps_normalized.
+
+        Returns:
+            Строки gap, competency_id, competency_name, direction_id, direction_name,
+            occurrences, users_count, assessments_count, average_score (по убыванию occurrences)
+        """
+        try:
+            response = self.client.rpc('knowledge_gap_stats', {
+                'p_direction_id': direction_id,
+                'p_technology_id': technology_id,
+                'p_competency_id': competency_id,
+                'p_since': since.isoformat() if since else None,
+                'p_until': until.isoformat() if until else None,
+                'p_gap': gap,
+                'p_limit': limit
+            }).execute()
+            
+            return response.data or []
+        except Exception as e:
+            logger.error(f"Error fetching knowledge gap stats: {e}")
+            raise
+
     # === COMPETENCY ASSESSMENTS ===
 
     async def create_competency_assessment(
@@ -661,12 +1055,13 @@ class SupabaseService:
     async def get_competency_assessment_by_ids(
         self,
         assessment_id: str,
-        competency_id: str
+        competency_id: str,
+        columns: str = COMPETENCY_ASSESSMENT_COLUMNS
     ) -> Optional[Dict]:
         """Получить оценку компетенции по assessment и competency id"""
         try:
             response = self.client.table('competency_assessments') \
-                .select('*') \
+                .select(columns) \
                 .eq('assessment_id', assessment_id) \
                 .eq('competency_id', competency_id) \
                 .maybe_single() \
@@ -681,6 +1076,42 @@ class SupabaseService:
             logger.error(f"Error fetching competency assessment: {e}")
             raise
 
+    async def get_competency_assessment_with_history(
+        self,
+        assessment_id: str,
+        competency_id: str
+    ) -> Optional[Dict]:
+        """
+        Получить оценку компетенции вместе с историей вопросов одним запросом.
+
+        Returns:
+            competency_assessment с ключом question_history (отсортирован по asked_at) или None
+        """
+        try:
+            response = self.client.table('competency_assessments') \
+                .select(
+                    'id, assessment_id, competency_id, '
+                    'question_history(id, question_id, question_text, difficulty_level, '
+                    'score, feedback, knowledge_gaps, asked_at)'
+                ) \
+                .eq('assessment_id', assessment_id) \
+                .eq('competency_id', competency_id) \
+                .maybe_single() \
+                .execute()
+            
+            if response is None or response.data is None:
+                return None
+            
+            ca = response.data
+            ca['question_history'] = sorted(
+                ca.get('question_history') or [],
+                key=lambda qh: qh.get('asked_at') or ''
+            )
+            return ca
+        except Exception as e:
+            logger.error(f"Error fetching competency assessment with history: {e}")
+            raise
+
     # === QUESTIONS (предварительно сгенерированные вопросы) ===
 
     async def find_question(
@@ -699,9 +1130,23 @@ class SupabaseService:
             question_number: Опциональный номер вопроса (1-5)
             exclude_question_ids: Список ID вопросов, которые нужно исключить (уже использованные)
         """
+        if self.question_bank is not None and self.question_bank.loaded:
+            question = self.question_bank.find(
+                competency_id=competency_id,
+                difficulty=difficulty,
+                question_number=question_number,
+                exclude_question_ids=exclude_question_ids
+            )
+            logger.debug(
+                f"Searching question in index: competency_id={competency_id}, "
+                f"difficulty={difficulty}, question_number={question_number}, "
+                f"found={question['id'] if question else None}"
+            )
+            return question
+
         try:
             query = self.client.table('questions') \
-                .select('*') \
+                .select(QUESTION_COLUMNS) \
                 .eq('competency_id', competency_id) \
                 .eq('difficulty', difficulty)
             
@@ -806,11 +1251,71 @@ class SupabaseService:
             if not response.data or len(response.data) == 0:
                 raise ValueError("Failed to create question - no data returned")
             
+            if self.question_bank is not None:
+                self.question_bank.upsert(response.data[0])
+            
             return response.data[0]
         except Exception as e:
             logger.error(f"Error creating question: {e}")
             raise
 
+    async def bulk_create_questions(
+        self,
+        questions: List[Dict],
+        chunk_size: int = 500,
+        upsert: bool = False
+    ) -> List[Dict]:
+        """
+        Массово создать вопросы в БД.
+
+        Вставляет вопросы пачками по chunk_size строк - один запрос на пачку
+        вместо одного запроса на вопрос.
+
+        Args:
+            questions: Список словарей с полями таблицы questions
+                (competency_id, question_text, difficulty, question_number, ...)
+            chunk_size: Размер пачки
+            upsert: Обновлять существующие вопросы с тем же (competency_id, question_hash)
+                вместо ошибки уникальности (used_count существующих вопросов сохраняется)
+        """
+        created = []
+        try:
+            for start in range(0, len(questions), chunk_size):
+                if upsert:
+                    chunk = questions[start:start + chunk_size]
+                    response = self.client.table('questions') \
+                        .upsert(chunk, on_conflict='competency_id,question_hash') \
+                        .execute()
+                else:
+                    chunk = [
+                        {'used_count': 0, **question}
+                        for question in questions[start:start + chunk_size]
+                    ]
+                    response = self.client.table('questions').insert(chunk).execute()
+                created.extend(response.data or [])
+                if self.question_bank is not None:
+                    for row in response.data or []:
+                        self.question_bank.upsert(row)
+                logger.info(f"Inserted questions chunk: {len(chunk)} rows (total {len(created)})")
+            
+            return created
+        except Exception as e:
+            logger.error(f"Error bulk creating questions (inserted {len(created)} before failure): {e}")
+            raise
+
+    async def get_competency_question_texts(self, competency_id: str) -> List[str]:
+        """Получить тексты всех вопросов компетенции (для поиска дубликатов)"""
+        try:
+            response = self.client.table('questions') \
+                .select('question_text') \
+                .eq('competency_id', competency_id) \
+                .execute()
+            
+            return [q['question_text'] for q in (response.data or [])]
+        except Exception as e:
+            logger.error(f"Error fetching competency question texts: {e}")
+            raise
+
     async def increment_question_usage(self, question_id: str) -> Dict:
         """Увеличить счетчик использования вопроса"""
         try:
@@ -826,18 +1331,19 @@ class SupabaseService:
             
             current_count = response.data.get('used_count', 0)
             
-            # Увеличиваем счетчик
+            # Увеличиваем счетчик. updated_at не трогаем: по нему индекс вопросов
+            # догружает изменения содержимого, а used_count обновляется в нем ниже
             update_response = self.client.table('questions') \
-                .update({
-                    'used_count': current_count + 1,
-                    'updated_at': datetime.utcnow().isoformat()
-                }) \
+                .update({'used_count': current_count + 1}) \
                 .eq('id', question_id) \
                 .execute()
             
             if not update_response.data or len(update_response.data) == 0:
                 raise ValueError(f"Failed to update question usage - no data returned")
             
+            if self.question_bank is not None:
+                self.question_bank.upsert(update_response.data[0])
+            
             return update_response.data[0]
         except Exception as e:
             logger.error(f"Error incrementing question usage: {e}")
@@ -943,12 +1449,18 @@ class SupabaseService:
 
     async def get_question_history(
         self,
-        competency_assessment_id: str
+        competency_assessment_id: str,
+        columns: str = QUESTION_HISTORY_COLUMNS
     ) -> List[Dict]:
-        """Получить историю вопросов для компетенции"""
+        """
+        Получить историю вопросов для компетенции.
+
+        Args:
+            columns: Проекция колонок (по умолчанию - без deprecated полей с транскриптом и ai_evaluation)
+        """
         try:
             response = self.client.table('question_history') \
-                .select('*') \
+                .select(columns) \
                 .eq('competency_assessment_id', competency_assessment_id) \
                 .order('asked_at') \
                 .execute()
@@ -961,3 +1473,43 @@ class SupabaseService:
             logger.error(f"Error fetching question history: {e}")
             raise
 
+
+    # === ANSWER JOBS (статус фоновой обработки ответов) ===
+
+    async def save_answer_jobs(self, jobs: List[Dict]) -> None:
+        """Сохранить состояние задач фоновой обработки ответов (upsert по id)"""
+        if not jobs:
+            return
+        try:
+            self.client.table('answer_jobs') \
+                .upsert(jobs, on_conflict='id') \
+                .execute()
+        except Exception as e:
+            logger.error(f"Error saving answer jobs: {e}")
+            raise
+
+    async def get_answer_job(self, job_id: str) -> Optional[Dict]:
+        """Получить задачу фоновой обработки ответа по ID"""
+        try:
+            response = self.client.table('answer_jobs') \
+                .select('*') \
+                .eq('id', job_id) \
+                .limit(1) \
+                .execute()
+            
+            return response.data[0] if response.data else None
+        except Exception as e:
+            logger.error(f"Error fetching answer job: {e}")
+            raise
+
+    async def delete_finished_answer_jobs(self, updated_before: datetime, statuses: List[str]) -> None:
+        """Удалить завершенные задачи, последний раз обновленные раньше updated_before"""
+        try:
+            self.client.table('answer_jobs') \
+                .delete() \
+                .in_('status', statuses) \
+                .lt('updated_at', updated_before.isoformat()) \
+                .execute()
+        except Exception as e:
+            logger.error(f"Error deleting finished answer jobs: {e}")
+            raise
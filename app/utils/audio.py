@@ -32,17 +32,20 @@ def validate_audio_file(
     return True, None
 
 
-async def save_temp_audio_file(file: UploadFile) -> str:
+async def save_temp_audio_file(file: UploadFile, directory: Optional[str] = None) -> str:
     """
     Сохраняет временный аудио файл
     
+    Args:
+        directory: Директория для файла (по умолчанию системная временная директория)
+    
     Returns:
         Путь к временному файлу
     """
     suffix = Path(file.filename or "audio").suffix or ".webm"
     
     # Создаем временный файл
-    with tempfile.NamedTemporaryFile(delete=False, suffix=suffix) as tmp_file:
+    with tempfile.NamedTemporaryFile(delete=False, suffix=suffix, dir=directory) as tmp_file:
         tmp_path = tmp_file.name
         
         # Читаем и записываем содержимое
@@ -0,0 +1,165 @@
+import asyncio
+import logging
+import time
+from typing import Dict, List, Optional
+
+import httpx
+from jose import jwt
+from jose.exceptions import JWTError
+
+from app.utils.cache import LRUCache
+
+logger = logging.getLogger(__name__)
+
+# Не чаще одного внепланового обновления JWKS (при неизвестном kid) за этот интервал
+JWKS_MIN_REFRESH_INTERVAL_SECONDS = 60.0
+
+UNVERIFIED_OPTIONS = {
+    "verify_signature": False,
+    "verify_aud": False,
+    "verify_exp": False,
+    "verify_iat": False,
+    "verify_nbf": False,
+    "verify_iss": False,
+}
+
+
+class JWTDecoder:
+    """
+    Декодирование JWT с кэшем token -> claims.
+
+    Один и тот же токен приходит во всех запросах сессии, поэтому claims кэшируются
+    в LRU кэше. При проверке подписи запись живет не дольше exp токена, ключи
+    проверки (JWKS) хранятся локально и перезапрашиваются раз в jwks_cache_ttl_seconds
+    или при появлении неизвестного kid (ротация ключей).
+    """
+
+    def __init__(
+        self,
+        verify_signature: bool = False,
+        jwks_url: Optional[str] = None,
+        secret: Optional[str] = None,
+        algorithms: Optional[List[str]] = None,
+        audience: Optional[str] = None,
+        issuer: Optional[str] = None,
+        cache_size: int = 4096,
+        cache_ttl_seconds: float = 300.0,
+        jwks_cache_ttl_seconds: float = 3600.0
+    ):
+        if verify_signature and not (jwks_url or secret):
+            raise ValueError("JWT signature verification requires JWT_JWKS_URL or JWT_SECRET")
+
+        # Алгоритмы по умолчанию - по источнику ключей: JWKS публикует асимметричные
+        # ключи (RS256), общий секрет подходит только для HMAC (HS256)
+        if not algorithms:
+            algorithms = ["HS256"] if secret and not jwks_url else ["RS256"]
+        if verify_signature:
+            hmac_algorithms = [a for a in algorithms if a.upper().startswith("HS")]
+            if jwks_url and hmac_algorithms:
+                raise ValueError(
+                    f"JWT_ALGORITHMS {hmac_algorithms} cannot be used with JWT_JWKS_URL: "
+                    f"HMAC tokens are verified with JWT_SECRET"
+                )
+            if not jwks_url and len(hmac_algorithms) != len(algorithms):
+                raise ValueError(
+                    f"JWT_ALGORITHMS {algorithms} require JWT_JWKS_URL: JWT_SECRET verifies only HS* tokens"
+                )
+
+        self.verify_signature = verify_signature
+        self.jwks_url = jwks_url
+        self.secret = secret
+        self.algorithms = algorithms
+        self.audience = audience
+        self.issuer = issuer
+        self.cache_ttl_seconds = cache_ttl_seconds
+        self.jwks_cache_ttl_seconds = jwks_cache_ttl_seconds
+
+        self._claims_cache = LRUCache(maxsize=cache_size, ttl_seconds=cache_ttl_seconds)
+        self._jwks: Optional[Dict] = None
+        self._jwks_fetched_at = 0.0
+        self._jwks_lock = asyncio.Lock()
+
+    async def decode(self, token: str) -> Dict:
+        """
+        Получить claims токена.
+
+        Raises:
+            JWTError: Токен невалиден (ExpiredSignatureError - истек срок действия)
+        """
+        claims = self._claims_cache.get(token)
+        if claims is not None:
+            return claims
+
+        if self.verify_signature:
+            claims = await self._decode_verified(token)
+            ttl = self.cache_ttl_seconds
+            exp = claims.get("exp")
+            if isinstance(exp, (int, float)):
+                ttl = min(ttl, exp - time.time())
+            if ttl > 0:
+                self._claims_cache.set(token, claims, ttl_seconds=ttl)
+        else:
+            claims = jwt.decode(token, key="", options=UNVERIFIED_OPTIONS)
+            self._claims_cache.set(token, claims)
+
+        return claims
+
+    async def _decode_verified(self, token: str) -> Dict:
+        options = {"verify_aud": self.audience is not None, "verify_iss": self.issuer is not None}
+        kwargs = {"algorithms": self.algorithms, "options": options}
+        if self.audience is not None:
+            kwargs["audience"] = self.audience
+        if self.issuer is not None:
+            kwargs["issuer"] = self.issuer
+
+        if not self.jwks_url:
+            return jwt.decode(token, self.secret, **kwargs)
+
+        kid = jwt.get_unverified_header(token).get("kid")
+        jwks = await self._get_jwks(kid)
+        key = next((k for k in jwks.get("keys", []) if k.get("kid") == kid), None) if kid else jwks
+        if key is None:
+            raise JWTError(f"Signing key '{kid}' not found in JWKS")
+
+        return jwt.decode(token, key, **kwargs)
+
+    async def _get_jwks(self, kid: Optional[str]) -> Dict:
+        """JWKS из локального кэша; перезапрашивается по TTL или при неизвестном kid"""
+        now = time.monotonic()
+        expired = self._jwks is None or now - self._jwks_fetched_at >= self.jwks_cache_ttl_seconds
+        unknown_kid = (
+            kid is not None
+            and self._jwks is not None
+            and not any(k.get("kid") == kid for k in self._jwks.get("keys", []))
+            and now - self._jwks_fetched_at >= JWKS_MIN_REFRESH_INTERVAL_SECONDS
+        )
+        if not expired and not unknown_kid:
+            return self._jwks
+
+        async with self._jwks_lock:
+            # Пока ждали блокировку, ключи мог обновить другой запрос
+            if self._jwks is not None and self._jwks_fetched_at > now:
+                return self._jwks
+            try:
+                async with httpx.AsyncClient(timeout=10.0) as client:
+                    response = await client.get(self.jwks_url)
+                    response.raise_for_status()
+                    self._jwks = response.json()
+                self._jwks_fetched_at = time.monotonic()
+                logger.info(f"JWKS refreshed: {len(self._jwks.get('keys', []))} keys")
+            except Exception as e:
+                if self._jwks is None:
+                    raise
+                # Продолжаем работать на ранее загруженных ключах, повтор - не раньше чем через минуту
+                self._jwks_fetched_at = (
+                    time.monotonic() - self.jwks_cache_ttl_seconds + JWKS_MIN_REFRESH_INTERVAL_SECONDS
+                )
+                logger.error(f"Error refreshing JWKS, using cached keys: {e}")
+        return self._jwks
+
+    def stats(self) -> Dict:
+        return {
+            "verify_signature": self.verify_signature,
+            "claims_cache": self._claims_cache.stats(),
+            "jwks_keys": len(self._jwks.get("keys", [])) if self._jwks else 0,
+        }
@@ -0,0 +1,125 @@
+import hashlib
+import json
+import logging
+from pathlib import Path
+from typing import Any, Dict, Optional, Tuple
+
+from fastapi import FastAPI
+from fastapi.openapi.utils import get_openapi
+from fastapi.routing import APIRoute
+
+logger = logging.getLogger(__name__)
+
+# Корень проекта: относительный путь к артефакту считается от него, а не от текущей директории
+PROJECT_ROOT = Path(__file__).resolve().parents[2]
+
+# Поле info схемы с отпечатком набора маршрутов, для которого собран артефакт
+FINGERPRINT_KEY = "x-routes-fingerprint"
+
+
+def resolve_artifact_path(path: str) -> Path:
+    """Путь к артефакту схемы (относительные пути - от корня проекта)"""
+    artifact = Path(path)
+    return artifact if artifact.is_absolute() else PROJECT_ROOT / artifact
+
+
+def routes_fingerprint(app: FastAPI) -> str:
+    """
+    Отпечаток набора эндпоинтов: методы, путь, имя и модель ответа каждого маршрута.
+
+    Считается без генерации схемы, поэтому дешево проверяется на старте. Изменения
+    полей Pydantic моделей отпечаток не ловит - их проверяет
+    `scripts/export_openapi.py --check` полным сравнением схемы.
+    """
+    routes = sorted(
+        (route for route in app.routes if isinstance(route, APIRoute) and route.include_in_schema),
+        key=lambda route: (route.path, sorted(route.methods))
+    )
+    digest = hashlib.sha256(app.version.encode("utf-8"))
+    for route in routes:
+        response_model = getattr(route.response_model, "__name__", str(route.response_model))
+        line = f"{','.join(sorted(route.methods))} {route.path} {route.name} {response_model}\n"
+        digest.update(line.encode("utf-8"))
+    return digest.hexdigest()[:16]
+
+
+def build_openapi_schema(app: FastAPI) -> Dict[str, Any]:
+    """Сгенерировать OpenAPI схему приложения (с отпечатком маршрутов в info)"""
+    schema = get_openapi(
+        title=app.title,
+        version=app.version,
+        openapi_version=app.openapi_version,
+        description=app.description,
+        contact=app.contact,
+        routes=app.routes,
+        tags=app.openapi_tags,
+        servers=app.servers,
+    )
+    schema["info"][FINGERPRINT_KEY] = routes_fingerprint(app)
+    return schema
+
+
+def render_openapi_schema(schema: Dict[str, Any]) -> bytes:
+    """Сериализация схемы в том же виде, что и файл артефакта"""
+    return (json.dumps(schema, indent=2, ensure_ascii=False) + "\n").encode("utf-8")
+
+
+class OpenAPISchemaProvider:
+    """
+    Источник OpenAPI схемы для /openapi.json.
+
+    Схема собирается заранее (scripts/export_openapi.py) в версионируемый артефакт.
+    При первом обращении артефакт читается с диска и, если версия API и отпечаток
+    маршрутов совпадают с приложением, его байты отдаются как есть - без обхода
+    маршрутов и сериализации. Устаревший или отсутствующий артефакт не ломает
+    документацию: схема генерируется по приложению, как раньше. Результат
+    кешируется на весь процесс.
+    """
+
+    def __init__(self, app: FastAPI, artifact_path: Optional[Path] = None):
+        self.app = app
+        self.artifact_path = artifact_path
+        self._schema: Optional[Dict[str, Any]] = None
+        self._body: Optional[bytes] = None
+
+    def schema(self) -> Dict[str, Any]:
+        """Схема в виде dict (подменяет app.openapi)"""
+        if self._schema is None:
+            self._schema, self._body = self._load()
+        return self._schema
+
+    def body(self) -> bytes:
+        """Готовое тело ответа /openapi.json"""
+        if self._body is None:
+            self._schema, self._body = self._load()
+        return self._body
+
+    def _load(self) -> Tuple[Dict[str, Any], bytes]:
+        artifact = self._load_artifact()
+        if artifact is not None:
+            return artifact
+
+        schema = build_openapi_schema(self.app)
+        return schema, render_openapi_schema(schema)
+
+    def _load_artifact(self) -> Optional[Tuple[Dict[str, Any], bytes]]:
+        if self.artifact_path is None or not self.artifact_path.is_file():
+            return None
+
+        try:
+            body = self.artifact_path.read_bytes()
+            schema = json.loads(body)
+        except Exception as e:
+            logger.error(f"Error reading OpenAPI artifact {self.artifact_path}: {e}")
+            return None
+
+        info = schema.get("info", {})
+        if info.get("version") != self.app.version or info.get(FINGERPRINT_KEY) != routes_fingerprint(self.app):
+            logger.warning(
+                f"OpenAPI artifact {self.artifact_path} is stale, generating schema at runtime "
+                f"(run scripts/export_openapi.py to refresh it)"
+            )
+            return None
+
+        logger.info(f"OpenAPI schema loaded from {self.artifact_path}")
+        return schema, body
@@ -0,0 +1,30 @@
+import base64
+import json
+from typing import Dict, List, Sequence
+
+
+def encode_cursor(row: Dict, keys: Sequence[str]) -> str:
+    """
+    Непрозрачный курсор keyset-пагинации: значения ключей сортировки последней строки
+    страницы в base64url(JSON).
+    """
+    payload = json.dumps([row.get(key) for key in keys], separators=(",", ":"), default=str)
+    return base64.urlsafe_b64encode(payload.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str, keys: Sequence[str]) -> Dict:
+    """
+    Разобрать курсор, выданный encode_cursor.
+
+    Raises:
+        ValueError: Курсор поврежден или выдан для другой сортировки
+    """
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        values: List = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+    except (ValueError, UnicodeError) as e:
+        raise ValueError(f"Invalid cursor: {e}")
+
+    if not isinstance(values, list) or len(values) != len(keys):
+        raise ValueError("Invalid cursor: unexpected format")
+    return dict(zip(keys, values))
@@ -0,0 +1,49 @@
+from typing import Any, Dict, Optional
+
+from fastapi.responses import JSONResponse, ORJSONResponse, Response
+from pydantic import BaseModel, TypeAdapter
+
+try:
+    import orjson  # noqa: F401
+except ImportError:
+    orjson = None
+
+# Класс ответа по умолчанию: orjson в разы быстрее stdlib json, без него - обычный JSONResponse
+DefaultJSONResponse = ORJSONResponse if orjson is not None else JSONResponse
+
+_type_adapters: Dict[Any, TypeAdapter] = {}
+
+
+def json_response(content: Any, status_code: int = 200, headers: Optional[Dict[str, str]] = None) -> Response:
+    """
+    Ответ из готовых dict/list (например, строк из БД) без прохода jsonable_encoder.
+
+    Подходит только для JSON-совместимых данных: UUID и datetime должны быть строками.
+    """
+    return DefaultJSONResponse(content=content, status_code=status_code, headers=headers)
+
+
+def model_json_response(
+    content: Any,
+    model_type: Any = None,
+    status_code: int = 200,
+    headers: Optional[Dict[str, str]] = None
+) -> Response:
+    """
+    Сериализовать Pydantic модель (или список моделей) сразу в JSON байты.
+
+    model_dump_json/TypeAdapter.dump_json выполняются в pydantic-core, минуя
+    jsonable_encoder и повторную валидацию response_model.
+
+    Args:
+        content: Модель или коллекция моделей
+        model_type: Тип коллекции (например, List[AssessmentResponse]); для одной модели не нужен
+    """
+    if model_type is None and isinstance(content, BaseModel):
+        body = content.model_dump_json()
+    else:
+        adapter = _type_adapters.get(model_type)
+        if adapter is None:
+            adapter = _type_adapters.setdefault(model_type, TypeAdapter(model_type))
+        body = adapter.dump_json(content)
+    return Response(content=body, status_code=status_code, headers=headers, media_type="application/json")
@@ -0,0 +1,60 @@
+import re
+
+_NON_WORD_RE = re.compile(r"[^\w\s]", re.UNICODE)
+_WHITESPACE_RE = re.compile(r"\s+")
+_TOKEN_SPLIT_RE = re.compile(r"[,|/;+&\s]+")
+
+
+def normalize_question_text(text: str) -> str:
+    """
+    Нормализует текст вопроса для поиска дубликатов.
+
+    Приводит к нижнему регистру, убирает пунктуацию и схлопывает пробелы:
+    "Что такое  JSX в React?" и "что такое jsx в react" дают одинаковый ключ.
+    """
+    text = _NON_WORD_RE.sub(" ", (text or "").lower().replace("ё", "е"))
+    return _WHITESPACE_RE.sub(" ", text).strip()
+
+
+def normalize_transcript(text: str) -> str:
+    """
+    Нормализует транскрипт ответа для сравнения с фразами отказа от ответа.
+
+    Та же нормализация, что и для вопросов: "Не знаю." и "не знаю" - один ответ.
+    Для ключа кэша оценок не подходит: без пунктуации "C++" и "C#" совпадают.
+    """
+    return normalize_question_text(text)
+
+
+def normalize_answer_key(text: str) -> str:
+    """
+    Нормализует транскрипт ответа для ключа кэша оценок.
+
+    Учитываются только регистр и пробелы - пунктуация в технических ответах значима
+    ("C++" и "C#", "O(n)" и "O(n!)").
+    """
+    return _WHITESPACE_RE.sub(" ", (text or "").lower()).strip()
+
+
+def normalize_direction_key(direction: str) -> str:
+    """
+    Нормализованный ключ направления для кэширования компетенций.
+
+    Регистр, пробелы и порядок технологий не влияют на ключ:
+    "Backend(Golang, SQL)", "backend (sql,golang)" и "backend(sql | golang)"
+    дают один и тот же ключ "backend(golang,sql)".
+    """
+    text = _WHITESPACE_RE.sub(" ", (direction or "").lower()).strip()
+
+    if "(" in text:
+        base, _, rest = text.partition("(")
+        tokens_text = rest.replace(")", " ")
+    else:
+        base, tokens_text = "", text
+
+    tokens = sorted({t for t in _TOKEN_SPLIT_RE.split(tokens_text) if t})
+    base = base.strip()
+
+    if base:
+        return f"{base}({','.join(tokens)})" if tokens else base
+    return ",".join(tokens)
@@ -0,0 +1,24 @@
+-- Миграция: Статус фоновой обработки голосовых ответов
+-- Дата: 2026-10-19
+-- Описание: Ответ с async_mode=true обрабатывает процесс, который его принял, а статус
+--           запрашивается у любого воркера uvicorn (или другого сервера). Процесс-владелец
+--           пишет сюда каждое изменение статуса задачи, остальные читают задачу отсюда.
+--           Завершенные задачи удаляются после ANSWER_JOBS_RESULT_TTL_SECONDS.
+
+CREATE TABLE IF NOT EXISTS answer_jobs (
+  id UUID PRIMARY KEY,                   -- job_id, выдается приложением
+  user_id UUID NOT NULL,
+  assessment_id UUID NOT NULL REFERENCES assessments(id) ON DELETE CASCADE,
+  status VARCHAR(20) NOT NULL CHECK (status IN ('queued', 'processing', 'completed', 'failed')),
+  result JSONB,                          -- AnswerResponse при status=completed
+  error TEXT,                            -- Описание ошибки при status=failed
+  assessment_auto_completed BOOLEAN NOT NULL DEFAULT FALSE,
+  overall_score DOUBLE PRECISION,
+  created_at TIMESTAMPTZ NOT NULL,
+  updated_at TIMESTAMPTZ NOT NULL
+);
+
+-- Удаление устаревших результатов: WHERE status IN (...) AND updated_at < ...
+CREATE INDEX IF NOT EXISTS idx_answer_jobs_updated_at ON answer_jobs(updated_at);
+
+COMMENT ON TABLE answer_jobs IS 'Статус фоновой обработки голосовых ответов (async_mode), общий для всех воркеров';
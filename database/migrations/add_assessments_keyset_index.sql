@@ -0,0 +1,9 @@
+-- Миграция: Индекс для постраничного списка тестирований
+-- Дата: 2026-10-19
+-- Описание: GET /api/assessments отдает тестирования страницами с курсором по
+--           (attempt_number, started_at, id) в порядке убывания. Индекс с тем же порядком
+--           позволяет читать каждую страницу одним проходом по индексу, без сортировки
+--           всех тестирований пользователя.
+
+CREATE INDEX IF NOT EXISTS idx_assessments_user_keyset
+  ON assessments(user_id, attempt_number DESC, started_at DESC, id DESC);
@@ -0,0 +1,20 @@
+-- Миграция: Уникальность названий компетенций
+-- Дата: 2026-10-19
+-- Описание: find_or_create_competency_by_name создает компетенцию через
+--           INSERT ... ON CONFLICT (role_id, name) DO NOTHING, что требует уникального индекса
+--           (у directions и technologies уникален name). Без индекса сервис использует обычный INSERT.
+--
+--           Уникальность ограничена владельцем компетенции: компетенции ролей с одинаковым
+--           названием допустимы в разных ролях, а компетенции без роли - общий справочник,
+--           который привязывается к направлениям и технологиям через таблицы связей.
+--           NULLS NOT DISTINCT (PostgreSQL 15+) делает role_id = NULL одним владельцем.
+--
+-- Перед применением проверьте, что дубликатов нет (иначе индекс не создастся):
+--   SELECT role_id, name, COUNT(*) FROM competencies GROUP BY role_id, name HAVING COUNT(*) > 1;
+-- Дубликаты нужно объединить вручную: на компетенции ссылаются связи, вопросы и результаты тестирований.
+
+-- Глобальный индекс по name из первой версии миграции
+DROP INDEX IF EXISTS idx_competencies_name_unique;
+
+CREATE UNIQUE INDEX IF NOT EXISTS idx_competencies_role_name_unique
+  ON competencies(role_id, name) NULLS NOT DISTINCT;
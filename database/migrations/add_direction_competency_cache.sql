@@ -0,0 +1,19 @@
+-- Миграция: Кэш компетенций, определенных GPT по тексту направления
+-- Дата: 2026-10-19
+-- Описание: determine_competencies_by_direction делает дорогой GPT запрос для строки вида
+--           "backend(golang, sql)". Результат сохраняется по нормализованному ключу
+--           (нижний регистр, отсортированные технологии), чтобы одинаковые и эквивалентные
+--           направления не отправлялись в GPT повторно.
+
+CREATE TABLE IF NOT EXISTS direction_competency_cache (
+  direction_key TEXT PRIMARY KEY,        -- Нормализованный ключ, например "backend(golang,sql)"
+  direction_text TEXT NOT NULL,          -- Исходный текст направления из первого запроса
+  competencies JSONB NOT NULL,           -- Массив компетенций [{name, description, category}]
+  created_at TIMESTAMP DEFAULT NOW(),
+  updated_at TIMESTAMP DEFAULT NOW()
+);
+
+COMMENT ON TABLE direction_competency_cache IS 'Кэш результатов определения компетенций по направлению через GPT';
+
+-- Сбросить кэш для направления (например, после изменения промпта):
+-- DELETE FROM direction_competency_cache WHERE direction_key = 'backend(golang,sql)';
@@ -0,0 +1,24 @@
+-- Миграция: Функция ensure_user
+-- Дата: 2026-10-19
+-- Описание: Создает пользователя, если его нет, и обновляет last_login одним запросом
+--           (вместо SELECT + UPDATE/INSERT при каждом старте тестирования).
+--           Вызывается из SupabaseService.ensure_user через RPC.
+
+CREATE OR REPLACE FUNCTION ensure_user(
+  p_user_id UUID,
+  p_email TEXT DEFAULT NULL,
+  p_full_name TEXT DEFAULT NULL
+)
+RETURNS VOID
+LANGUAGE sql
+AS $$
+  INSERT INTO users (id, email, full_name, created_at, last_login)
+  VALUES (
+    p_user_id,
+    COALESCE(p_email, 'user-' || p_user_id::text || '@temp.local'),
+    p_full_name,
+    NOW(),
+    NOW()
+  )
+  ON CONFLICT (id) DO UPDATE SET last_login = EXCLUDED.last_login;
+$$;
@@ -0,0 +1,83 @@
+-- Миграция: Аналитика пробелов в знаниях
+-- Дата: 2026-10-19
+-- Описание: question_history.knowledge_gaps - свободный текст от GPT ("Virtual DOM",
+--           "virtual  dom "). Колонка knowledge_gaps_normalized хранит те же пробелы в
+--           нижнем регистре со схлопнутыми пробелами и без дубликатов, GIN индекс по ней
+--           ускоряет поиск конкретного пробела (@>), а функция knowledge_gap_stats считает
+--           топ пробелов по компетенциям и направлениям одним запросом
+--           (GET /api/admin/analytics/knowledge-gaps).
+
+-- Нормализация массива пробелов (IMMUTABLE - используется в generated колонке)
+CREATE OR REPLACE FUNCTION normalize_knowledge_gaps(gaps TEXT[])
+RETURNS TEXT[]
+LANGUAGE sql
+IMMUTABLE
+PARALLEL SAFE
+AS $$
+  SELECT COALESCE(array_agg(DISTINCT gap ORDER BY gap), '{}')
+  FROM (
+    SELECT lower(btrim(regexp_replace(raw_gap, '\s+', ' ', 'g'))) AS gap
+    FROM unnest(gaps) AS raw_gap
+  ) AS normalized
+  WHERE gap <> '';
+$$;
+
+ALTER TABLE question_history
+ADD COLUMN IF NOT EXISTS knowledge_gaps_normalized TEXT[]
+GENERATED ALWAYS AS (normalize_knowledge_gaps(knowledge_gaps)) STORED;
+
+CREATE INDEX IF NOT EXISTS idx_question_history_gaps_gin
+  ON question_history USING GIN (knowledge_gaps_normalized);
+-- Выборка за период ("за последний месяц")
+CREATE INDEX IF NOT EXISTS idx_question_history_asked_at ON question_history(asked_at);
+
+CREATE OR REPLACE FUNCTION knowledge_gap_stats(
+  p_direction_id UUID DEFAULT NULL,
+  p_technology_id UUID DEFAULT NULL,
+  p_competency_id UUID DEFAULT NULL,
+  p_since TIMESTAMP DEFAULT NULL,
+  p_until TIMESTAMP DEFAULT NULL,
+  p_gap TEXT DEFAULT NULL,
+  p_limit INTEGER DEFAULT 50
+)
+RETURNS TABLE (
+  gap TEXT,
+  competency_id UUID,
+  competency_name TEXT,
+  direction_id UUID,
+  direction_name TEXT,
+  occurrences BIGINT,
+  users_count BIGINT,
+  assessments_count BIGINT,
+  average_score NUMERIC
+)
+LANGUAGE sql
+STABLE
+AS $$
+  SELECT
+    g.gap,
+    ca.competency_id,
+    c.name::TEXT,
+    a.direction_id,
+    d.name::TEXT,
+    COUNT(*) AS occurrences,
+    COUNT(DISTINCT a.user_id) AS users_count,
+    COUNT(DISTINCT a.id) AS assessments_count,
+    ROUND(AVG(qh.score), 2) AS average_score
+  FROM question_history qh
+  CROSS JOIN LATERAL unnest(qh.knowledge_gaps_normalized) AS g(gap)
+  JOIN competency_assessments ca ON ca.id = qh.competency_assessment_id
+  JOIN assessments a ON a.id = ca.assessment_id
+  LEFT JOIN competencies c ON c.id = ca.competency_id
+  LEFT JOIN directions d ON d.id = a.direction_id
+  WHERE qh.knowledge_gaps_normalized <> '{}'
+    AND (p_gap IS NULL OR qh.knowledge_gaps_normalized @> ARRAY[lower(btrim(regexp_replace(p_gap, '\s+', ' ', 'g')))])
+    AND (p_since IS NULL OR qh.asked_at >= p_since)
+    AND (p_until IS NULL OR qh.asked_at < p_until)
+    AND (p_competency_id IS NULL OR ca.competency_id = p_competency_id)
+    AND (p_direction_id IS NULL OR a.direction_id = p_direction_id)
+    AND (p_technology_id IS NULL OR a.technology_id = p_technology_id)
+  GROUP BY g.gap, ca.competency_id, c.name, a.direction_id, d.name
+  ORDER BY occurrences DESC, users_count DESC, g.gap
+  LIMIT p_limit;
+$$;
@@ -0,0 +1,21 @@
+-- Миграция: Ключ уникальности вопросов для массового импорта
+-- Дата: 2026-10-19
+-- Описание: question_hash - md5 от нормализованного текста вопроса (нижний регистр,
+--           схлопнутые пробелы). Уникальный индекс (competency_id, question_hash) позволяет
+--           импортировать вопросы через upsert: повторная загрузка того же файла обновляет
+--           существующие вопросы вместо создания дубликатов.
+
+ALTER TABLE questions
+  ADD COLUMN IF NOT EXISTS question_hash TEXT
+  GENERATED ALWAYS AS (md5(lower(btrim(regexp_replace(question_text, '\s+', ' ', 'g'))))) STORED;
+
+-- Перед созданием уникального индекса удаляем уже существующие дубликаты
+-- (оставляем самый используемый вопрос; история ответов сохраняется через ON DELETE SET NULL)
+DELETE FROM questions q
+USING questions d
+WHERE q.competency_id = d.competency_id
+  AND q.question_hash = d.question_hash
+  AND (COALESCE(q.used_count, 0), q.id) < (COALESCE(d.used_count, 0), d.id);
+
+CREATE UNIQUE INDEX IF NOT EXISTS idx_questions_competency_hash
+  ON questions(competency_id, question_hash);
@@ -0,0 +1,28 @@
+-- Миграция: Автоматическое обновление questions.updated_at
+-- Дата: 2026-10-19
+-- Описание: In-memory индекс банка вопросов догружает изменения по updated_at.
+--           Триггер гарантирует, что любая правка содержимого вопроса (в том числе из
+--           SQL Editor) обновляет метку времени, а индекс ускоряет выборку "изменено после".
+--           Инкремент used_count и повторный импорт без изменений метку не трогают - иначе
+--           каждое использование вопроса перезагружало бы его в индексе.
+
+CREATE OR REPLACE FUNCTION set_updated_at()
+RETURNS TRIGGER AS $$
+BEGIN
+  NEW.updated_at = NOW();
+  RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trg_questions_updated_at ON questions;
+CREATE TRIGGER trg_questions_updated_at
+  BEFORE UPDATE ON questions
+  FOR EACH ROW
+  WHEN ((OLD.competency_id, OLD.question_text, OLD.difficulty, OLD.question_number,
+         OLD.expected_key_points, OLD.estimated_answer_time)
+        IS DISTINCT FROM
+        (NEW.competency_id, NEW.question_text, NEW.difficulty, NEW.question_number,
+         NEW.expected_key_points, NEW.estimated_answer_time))
+  EXECUTE FUNCTION set_updated_at();
+
+CREATE INDEX IF NOT EXISTS idx_questions_updated_at ON questions(updated_at);
@@ -0,0 +1,102 @@
+-- Миграция: Сводка прогресса пользователя
+-- Дата: 2026-10-19
+-- Описание: Одна предвычисленная строка на (пользователь, направление, технология):
+--           лучший/последний/средний балл и последние попытки для графика динамики.
+--           Строка пересчитывается функцией refresh_user_progress_summary при завершении
+--           тестирования (AssessmentService.complete_assessment), дашборды читают ее через
+--           GET /api/assessments/summary без обхода assessments.
+
+CREATE TABLE IF NOT EXISTS user_progress_summary (
+  user_id UUID NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+  direction_id UUID REFERENCES directions(id) ON DELETE CASCADE,
+  technology_id UUID REFERENCES technologies(id) ON DELETE CASCADE,
+  completed_count INTEGER NOT NULL DEFAULT 0,
+  best_score FLOAT,
+  last_score FLOAT,
+  previous_score FLOAT,
+  average_score FLOAT,
+  -- Последние 10 завершенных попыток: [{assessment_id, attempt_number, overall_score, completed_at}]
+  recent_attempts JSONB NOT NULL DEFAULT '[]'::jsonb,
+  first_completed_at TIMESTAMP,
+  last_completed_at TIMESTAMP,
+  updated_at TIMESTAMP NOT NULL DEFAULT NOW()
+);
+
+-- direction_id/technology_id могут быть NULL (тестирования по роли), поэтому ключ - выражение
+CREATE UNIQUE INDEX IF NOT EXISTS idx_user_progress_summary_key ON user_progress_summary (
+  user_id,
+  COALESCE(direction_id, '00000000-0000-0000-0000-000000000000'::uuid),
+  COALESCE(technology_id, '00000000-0000-0000-0000-000000000000'::uuid)
+);
+CREATE INDEX IF NOT EXISTS idx_user_progress_summary_user_last
+  ON user_progress_summary(user_id, last_completed_at DESC);
+
+CREATE OR REPLACE FUNCTION refresh_user_progress_summary(
+  p_user_id UUID,
+  p_direction_id UUID DEFAULT NULL,
+  p_technology_id UUID DEFAULT NULL
+)
+RETURNS VOID
+LANGUAGE plpgsql
+AS $$
+BEGIN
+  WITH completed AS (
+    SELECT id, attempt_number, overall_score, completed_at,
+           ROW_NUMBER() OVER (ORDER BY completed_at DESC NULLS LAST, id DESC) AS rn
+    FROM assessments
+    WHERE user_id = p_user_id
+      AND direction_id IS NOT DISTINCT FROM p_direction_id
+      AND technology_id IS NOT DISTINCT FROM p_technology_id
+      AND status = 'completed'
+  )
+  INSERT INTO user_progress_summary (
+    user_id, direction_id, technology_id, completed_count,
+    best_score, last_score, previous_score, average_score,
+    recent_attempts, first_completed_at, last_completed_at, updated_at
+  )
+  SELECT
+    p_user_id, p_direction_id, p_technology_id, COUNT(*),
+    MAX(overall_score),
+    MAX(overall_score) FILTER (WHERE rn = 1),
+    MAX(overall_score) FILTER (WHERE rn = 2),
+    ROUND(AVG(overall_score)::numeric, 2)::float,
+    COALESCE(
+      jsonb_agg(
+        jsonb_build_object(
+          'assessment_id', id,
+          'attempt_number', attempt_number,
+          'overall_score', overall_score,
+          'completed_at', completed_at
+        ) ORDER BY rn
+      ) FILTER (WHERE rn <= 10),
+      '[]'::jsonb
+    ),
+    MIN(completed_at),
+    MAX(completed_at),
+    NOW()
+  FROM completed
+  HAVING COUNT(*) > 0
+  ON CONFLICT (
+    user_id,
+    COALESCE(direction_id, '00000000-0000-0000-0000-000000000000'::uuid),
+    COALESCE(technology_id, '00000000-0000-0000-0000-000000000000'::uuid)
+  ) DO UPDATE SET
+    completed_count = EXCLUDED.completed_count,
+    best_score = EXCLUDED.best_score,
+    last_score = EXCLUDED.last_score,
+    previous_score = EXCLUDED.previous_score,
+    average_score = EXCLUDED.average_score,
+    recent_attempts = EXCLUDED.recent_attempts,
+    first_completed_at = EXCLUDED.first_completed_at,
+    last_completed_at = EXCLUDED.last_completed_at,
+    updated_at = EXCLUDED.updated_at;
+END;
+$$;
+
+-- Заполнение сводки по уже завершенным тестированиям
+SELECT refresh_user_progress_summary(user_id, direction_id, technology_id)
+FROM (
+  SELECT DISTINCT user_id, direction_id, technology_id
+  FROM assessments
+  WHERE status = 'completed' AND user_id IS NOT NULL
+) AS groups;
@@ -124,11 +124,28 @@ CREATE TABLE IF NOT EXISTS questions (
   expected_key_points JSONB,
   estimated_answer_time VARCHAR(100),
   used_count INTEGER DEFAULT 0,
+  -- Ключ уникальности для импорта: md5 от текста в нижнем регистре со схлопнутыми пробелами
+  question_hash TEXT GENERATED ALWAYS AS (md5(lower(btrim(regexp_replace(question_text, '\s+', ' ', 'g'))))) STORED,
   created_at TIMESTAMP DEFAULT NOW(),
   updated_at TIMESTAMP DEFAULT NOW()
 );
 
 -- Таблица: question_history
+-- Нормализация пробелов в знаниях (используется в generated колонке question_history)
+CREATE OR REPLACE FUNCTION normalize_knowledge_gaps(gaps TEXT[])
+RETURNS TEXT[]
+LANGUAGE sql
+IMMUTABLE
+PARALLEL SAFE
+AS $$
+  SELECT COALESCE(array_agg(DISTINCT gap ORDER BY gap), '{}')
+  FROM (
+    SELECT lower(btrim(regexp_replace(raw_gap, '\s+', ' ', 'g'))) AS gap
+    FROM unnest(gaps) AS raw_gap
+  ) AS normalized
+  WHERE gap <> '';
+$$;
+
 CREATE TABLE IF NOT EXISTS question_history (
   id UUID PRIMARY KEY DEFAULT uuid_generate_v4(),
   competency_assessment_id UUID REFERENCES competency_assessments(id) ON DELETE CASCADE,
@@ -143,6 +160,8 @@ CREATE TABLE IF NOT EXISTS question_history (
   understanding_depth VARCHAR(20) CHECK (understanding_depth IN ('shallow', 'medium', 'deep')),
   feedback TEXT,
   knowledge_gaps TEXT[],
+  -- Пробелы в нижнем регистре без дубликатов (для аналитики, см. normalize_knowledge_gaps)
+  knowledge_gaps_normalized TEXT[] GENERATED ALWAYS AS (normalize_knowledge_gaps(knowledge_gaps)) STORED,
   time_spent_seconds INTEGER,
   
   -- Deprecated поля (для обратной совместимости, будут удалены в будущем)
@@ -155,6 +174,29 @@ CREATE TABLE IF NOT EXISTS question_history (
   answered_at TIMESTAMP
 );
 
+-- Таблица: direction_competency_cache (кэш компетенций, определенных GPT по тексту направления)
+CREATE TABLE IF NOT EXISTS direction_competency_cache (
+  direction_key TEXT PRIMARY KEY,
+  direction_text TEXT NOT NULL,
+  competencies JSONB NOT NULL,
+  created_at TIMESTAMP DEFAULT NOW(),
+  updated_at TIMESTAMP DEFAULT NOW()
+);
+
+-- Таблица: answer_jobs (статус фоновой обработки ответов, общий для всех воркеров)
+CREATE TABLE IF NOT EXISTS answer_jobs (
+  id UUID PRIMARY KEY,
+  user_id UUID NOT NULL,
+  assessment_id UUID NOT NULL REFERENCES assessments(id) ON DELETE CASCADE,
+  status VARCHAR(20) NOT NULL CHECK (status IN ('queued', 'processing', 'completed', 'failed')),
+  result JSONB,
+  error TEXT,
+  assessment_auto_completed BOOLEAN NOT NULL DEFAULT FALSE,
+  overall_score DOUBLE PRECISION,
+  created_at TIMESTAMPTZ NOT NULL,
+  updated_at TIMESTAMPTZ NOT NULL
+);
+
 
 -- Индексы для оптимизации запросов
 CREATE INDEX IF NOT EXISTS idx_directions_name ON directions(name);
@@ -165,6 +207,7 @@ CREATE INDEX IF NOT EXISTS idx_direction_competencies_direction_id ON direction_
 CREATE INDEX IF NOT EXISTS idx_direction_competencies_competency_id ON direction_competencies(competency_id);
 CREATE INDEX IF NOT EXISTS idx_technology_competencies_technology_id ON technology_competencies(technology_id);
 CREATE INDEX IF NOT EXISTS idx_technology_competencies_competency_id ON technology_competencies(competency_id);
+CREATE UNIQUE INDEX IF NOT EXISTS idx_competencies_role_name_unique ON competencies(role_id, name) NULLS NOT DISTINCT;
 CREATE INDEX IF NOT EXISTS idx_assessments_user_id ON assessments(user_id);
 CREATE INDEX IF NOT EXISTS idx_assessments_role_id ON assessments(role_id);
 CREATE INDEX IF NOT EXISTS idx_assessments_direction_id ON assessments(direction_id);
@@ -173,6 +216,193 @@ CREATE INDEX IF NOT EXISTS idx_competency_assessments_assessment_id ON competenc
 CREATE INDEX IF NOT EXISTS idx_competency_assessments_competency_id ON competency_assessments(competency_id);
 CREATE INDEX IF NOT EXISTS idx_questions_competency_id ON questions(competency_id);
 CREATE INDEX IF NOT EXISTS idx_questions_competency_difficulty ON questions(competency_id, difficulty);
+CREATE INDEX IF NOT EXISTS idx_questions_updated_at ON questions(updated_at);
+CREATE INDEX IF NOT EXISTS idx_answer_jobs_updated_at ON answer_jobs(updated_at);
+CREATE UNIQUE INDEX IF NOT EXISTS idx_questions_competency_hash ON questions(competency_id, question_hash);
 CREATE INDEX IF NOT EXISTS idx_question_history_competency_assessment_id ON question_history(competency_assessment_id);
 CREATE INDEX IF NOT EXISTS idx_question_history_question_id ON question_history(question_id);
+CREATE INDEX IF NOT EXISTS idx_question_history_gaps_gin ON question_history USING GIN (knowledge_gaps_normalized);
+CREATE INDEX IF NOT EXISTS idx_question_history_asked_at ON question_history(asked_at);
 CREATE INDEX IF NOT EXISTS idx_assessments_user_direction_technology ON assessments(user_id, direction_id, technology_id);
+CREATE INDEX IF NOT EXISTS idx_assessments_user_keyset ON assessments(user_id, attempt_number DESC, started_at DESC, id DESC);
+
+-- Автоматическое обновление questions.updated_at (по нему догружается in-memory индекс вопросов).
+-- Только при изменении содержимого: инкремент used_count метку не трогает
+CREATE OR REPLACE FUNCTION set_updated_at()
+RETURNS TRIGGER AS $$
+BEGIN
+  NEW.updated_at = NOW();
+  RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trg_questions_updated_at ON questions;
+CREATE TRIGGER trg_questions_updated_at
+  BEFORE UPDATE ON questions
+  FOR EACH ROW
+  WHEN ((OLD.competency_id, OLD.question_text, OLD.difficulty, OLD.question_number,
+         OLD.expected_key_points, OLD.estimated_answer_time)
+        IS DISTINCT FROM
+        (NEW.competency_id, NEW.question_text, NEW.difficulty, NEW.question_number,
+         NEW.expected_key_points, NEW.estimated_answer_time))
+  EXECUTE FUNCTION set_updated_at();
+
+-- Создание пользователя / обновление last_login одним запросом (RPC из SupabaseService.ensure_user)
+CREATE OR REPLACE FUNCTION ensure_user(
+  p_user_id UUID,
+  p_email TEXT DEFAULT NULL,
+  p_full_name TEXT DEFAULT NULL
+)
+RETURNS VOID
+LANGUAGE sql
+AS $$
+  INSERT INTO users (id, email, full_name, created_at, last_login)
+  VALUES (
+    p_user_id,
+    COALESCE(p_email, 'user-' || p_user_id::text || '@temp.local'),
+    p_full_name,
+    NOW(),
+    NOW()
+  )
+  ON CONFLICT (id) DO UPDATE SET last_login = EXCLUDED.last_login;
+$$;
+
+-- Сводка прогресса пользователя по (направление, технология); пересчитывается при завершении тестирования
+CREATE TABLE IF NOT EXISTS user_progress_summary (
+  user_id UUID NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+  direction_id UUID REFERENCES directions(id) ON DELETE CASCADE,
+  technology_id UUID REFERENCES technologies(id) ON DELETE CASCADE,
+  completed_count INTEGER NOT NULL DEFAULT 0,
+  best_score FLOAT,
+  last_score FLOAT,
+  previous_score FLOAT,
+  average_score FLOAT,
+  -- Последние 10 завершенных попыток: [{assessment_id, attempt_number, overall_score, completed_at}]
+  recent_attempts JSONB NOT NULL DEFAULT '[]'::jsonb,
+  first_completed_at TIMESTAMP,
+  last_completed_at TIMESTAMP,
+  updated_at TIMESTAMP NOT NULL DEFAULT NOW()
+);
+
+-- direction_id/technology_id могут быть NULL (тестирования по роли), поэтому ключ - выражение
+CREATE UNIQUE INDEX IF NOT EXISTS idx_user_progress_summary_key ON user_progress_summary (
+  user_id,
+  COALESCE(direction_id, '00000000-0000-0000-0000-000000000000'::uuid),
+  COALESCE(technology_id, '00000000-0000-0000-0000-000000000000'::uuid)
+);
+CREATE INDEX IF NOT EXISTS idx_user_progress_summary_user_last
+  ON user_progress_summary(user_id, last_completed_at DESC);
+
+CREATE OR REPLACE FUNCTION refresh_user_progress_summary(
+  p_user_id UUID,
+  p_direction_id UUID DEFAULT NULL,
+  p_technology_id UUID DEFAULT NULL
+)
+RETURNS VOID
+LANGUAGE plpgsql
+AS $$
+BEGIN
+  WITH completed AS (
+    SELECT id, attempt_number, overall_score, completed_at,
+           ROW_NUMBER() OVER (ORDER BY completed_at DESC NULLS LAST, id DESC) AS rn
+    FROM assessments
+    WHERE user_id = p_user_id
+      AND direction_id IS NOT DISTINCT FROM p_direction_id
+      AND technology_id IS NOT DISTINCT FROM p_technology_id
+      AND status = 'completed'
+  )
+  INSERT INTO user_progress_summary (
+    user_id, direction_id, technology_id, completed_count,
+    best_score, last_score, previous_score, average_score,
+    recent_attempts, first_completed_at, last_completed_at, updated_at
+  )
+  SELECT
+    p_user_id, p_direction_id, p_technology_id, COUNT(*),
+    MAX(overall_score),
+    MAX(overall_score) FILTER (WHERE rn = 1),
+    MAX(overall_score) FILTER (WHERE rn = 2),
+    ROUND(AVG(overall_score)::numeric, 2)::float,
+    COALESCE(
+      jsonb_agg(
+        jsonb_build_object(
+          'assessment_id', id,
+          'attempt_number', attempt_number,
+          'overall_score', overall_score,
+          'completed_at', completed_at
+        ) ORDER BY rn
+      ) FILTER (WHERE rn <= 10),
+      '[]'::jsonb
+    ),
+    MIN(completed_at),
+    MAX(completed_at),
+    NOW()
+  FROM completed
+  HAVING COUNT(*) > 0
+  ON CONFLICT (
+    user_id,
+    COALESCE(direction_id, '00000000-0000-0000-0000-000000000000'::uuid),
+    COALESCE(technology_id, '00000000-0000-0000-0000-000000000000'::uuid)
+  ) DO UPDATE SET
+    completed_count = EXCLUDED.completed_count,
+    best_score = EXCLUDED.best_score,
+    last_score = EXCLUDED.last_score,
+    previous_score = EXCLUDED.previous_score,
+    average_score = EXCLUDED.average_score,
+    recent_attempts = EXCLUDED.recent_attempts,
+    first_completed_at = EXCLUDED.first_completed_at,
+    last_completed_at = EXCLUDED.last_completed_at,
+    updated_at = EXCLUDED.updated_at;
+END;
+$$;
+
+-- Топ пробелов в знаниях по компетенциям и направлениям (GET /api/admin/analytics/knowledge-gaps)
+CREATE OR REPLACE FUNCTION knowledge_gap_stats(
+  p_direction_id UUID DEFAULT NULL,
+  p_technology_id UUID DEFAULT NULL,
+  p_competency_id UUID DEFAULT NULL,
+  p_since TIMESTAMP DEFAULT NULL,
+  p_until TIMESTAMP DEFAULT NULL,
+  p_gap TEXT DEFAULT NULL,
+  p_limit INTEGER DEFAULT 50
+)
+RETURNS TABLE (
+  gap TEXT,
+  competency_id UUID,
+  competency_name TEXT,
+  direction_id UUID,
+  direction_name TEXT,
+  occurrences BIGINT,
+  users_count BIGINT,
+  assessments_count BIGINT,
+  average_score NUMERIC
+)
+LANGUAGE sql
+STABLE
+AS $$
+  SELECT
+    g.gap,
+    ca.competency_id,
+    c.name::TEXT,
+    a.direction_id,
+    d.name::TEXT,
+    COUNT(*) AS occurrences,
+    COUNT(DISTINCT a.user_id) AS users_count,
+    COUNT(DISTINCT a.id) AS assessments_count,
+    ROUND(AVG(qh.score), 2) AS average_score
+  FROM question_history qh
+  CROSS JOIN LATERAL unnest(qh.knowledge_gaps_normalized) AS g(gap)
+  JOIN competency_assessments ca ON ca.id = qh.competency_assessment_id
+  JOIN assessments a ON a.id = ca.assessment_id
+  LEFT JOIN competencies c ON c.id = ca.competency_id
+  LEFT JOIN directions d ON d.id = a.direction_id
+  WHERE qh.knowledge_gaps_normalized <> '{}'
+    AND (p_gap IS NULL OR qh.knowledge_gaps_normalized @> ARRAY[lower(btrim(regexp_replace(p_gap, '\s+', ' ', 'g')))])
+    AND (p_since IS NULL OR qh.asked_at >= p_since)
+    AND (p_until IS NULL OR qh.asked_at < p_until)
+    AND (p_competency_id IS NULL OR ca.competency_id = p_competency_id)
+    AND (p_direction_id IS NULL OR a.direction_id = p_direction_id)
+    AND (p_technology_id IS NULL OR a.technology_id = p_technology_id)
+  GROUP BY g.gap, ca.competency_id, c.name, a.direction_id, d.name
+  ORDER BY occurrences DESC, users_count DESC, g.gap
+  LIMIT p_limit;
+$$;
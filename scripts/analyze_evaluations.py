@@ -2,16 +2,93 @@
 """
 Скрипт для анализа данных оценок компетенций
 Сравнивает самооценку, оценку руководителя и архитектора
+
+Данные загружаются в колоночные массивы pandas/NumPy, вся статистика (по командам,
+по категориям, корреляции) считается векторно - сотни тысяч строк обрабатываются
+за секунды.
+
+Входные файлы - CSV или Parquet (формат по расширению), несколько файлов
+объединяются. Заголовки как в выгрузке из таблицы оценок ("Hard Skills",
+"Soft Skills  2", "Итого", ...) или канонические имена колонок (self_hard_skills,
+manager_average, architect_total, ...), см. COLUMN_ALIASES. Без аргументов
+анализируется встроенный пример.
+
+Зависимости: pip install pandas numpy (pyarrow - для Parquet, scipy - для p-value)
+
+Примеры:
+    python scripts/analyze_evaluations.py
+    python scripts/analyze_evaluations.py evaluations_2026q3.csv
+    python scripts/analyze_evaluations.py data/*.parquet --group-by team --top 10
 """
 
-import csv
+import argparse
 import io
-from typing import List, Dict, Any
-from statistics import mean, stdev
-from collections import defaultdict
+import sys
+from pathlib import Path
+from typing import List, Optional
+
+try:
+    import numpy as np
+    import pandas as pd
+except ImportError:
+    print("Для анализа требуются pandas и numpy: pip install pandas numpy")
+    sys.exit(1)
+
+DIMENSIONS = {
+    'hard_skills': 'Hard Skills',
+    'soft_skills': 'Soft Skills',
+    'impact': 'Impact & Ownership',
+    'teamwork': 'Teamwork & Culture Fit',
+}
+
+RATERS = {
+    'self': 'Самооценка',
+    'manager': 'Руководитель',
+    'architect': 'Архитектор',
+}
+
+# Итоговая оценка каждого оценщика
+TOTAL_COLUMNS = {
+    'self': 'self_average',
+    'manager': 'manager_average',
+    'architect': 'architect_total',
+}
+
+# Заголовки выгрузки (после схлопывания пробелов) -> канонические имена колонок
+COLUMN_ALIASES = {
+    'ФИО': 'name',
+    'Команда': 'team',
+    'Hard Skills': 'self_hard_skills',
+    'Soft Skills': 'self_soft_skills',
+    'Impact & Ownership': 'self_impact',
+    'Teamwork & Culture Fit': 'self_teamwork',
+    'Средний': 'self_average',
+    'Hard Skills 2': 'manager_hard_skills',
+    'Soft Skills 2': 'manager_soft_skills',
+    'Impact & Ownership 2': 'manager_impact',
+    'Teamwork & Culture Fit 2': 'manager_teamwork',
+    'Средний 2': 'manager_average',
+    'Разница (Manager - Self)': 'difference',
+    'Hard Skills 3': 'architect_hard_skills_raw',
+    'Hard Skills 4': 'architect_hard_skills',
+    'Soft Skills 3': 'architect_soft_skills',
+    'Impact & Ownership 3': 'architect_impact',
+    'Teamwork & Culture Fit 3': 'architect_teamwork',
+    'Итого': 'architect_total',
+    'Ожидание': 'expectation',
+    'Email': 'email',
+    'Почта': 'email',
+}
+
+TEXT_COLUMNS = ('name', 'team', 'email', 'user_id')
+
+# Границы разницы (руководитель - самооценка)
+OVERESTIMATED_THRESHOLD = -1.0
+UNDERESTIMATED_THRESHOLD = 0.5
+ALIGNED_RANGE = (-0.5, 0.5)
 
-# Данные из CSV
-csv_data = """ФИО,Команда,Hard Skills,Soft Skills ,Impact & Ownership ,Teamwork & Culture Fit,Средний ,Hard Skills 2,Soft Skills  2,Impact & Ownership  2,Teamwork & Culture Fit 2,Средний  2,Разница (Manager - Self),Hard Skills 3,Hard Skills 4,Soft Skills  3,Impact & Ownership  3,Teamwork & Culture Fit 3,Итого,Ожидание
+# Пример данных (анализируется, если файлы не переданы)
+SAMPLE_CSV = """ФИО,Команда,Hard Skills,Soft Skills ,Impact & Ownership ,Teamwork & Culture Fit,Средний ,Hard Skills 2,Soft Skills  2,Impact & Ownership  2,Teamwork & Culture Fit 2,Средний  2,Разница (Manager - Self),Hard Skills 3,Hard Skills 4,Soft Skills  3,Impact & Ownership  3,Teamwork & Culture Fit 3,Итого,Ожидание
 Иван,R,5,5,4.5,5,4.89,2,1.2,1.75,1.4,1.56,"-3,33",1.7,0.60,0.18,0.61,0.21,1.60,
 Вася,R,3.75,3,3.25,2.8,3.17,2.5,2.2,2.25,2.2,2.28,"-0,89",2.3,0.81,0.33,0.79,0.33,2.25,
 Саша,R,3.25,3.2,2.25,3.2,3,2.75,2,2.5,2,2.28,"-0,72",2.3,0.81,0.30,0.88,0.30,2.28,
@@ -34,240 +111,278 @@ csv_data = """ФИО,Команда,Hard Skills,Soft Skills ,Impact & Ownership
 Дима,A,4,4.2,3.75,4,4,3.75,4,4.25,3.8,3.94,"-0,06",2.5,0.88,0.60,1.49,0.57,3.53,
 Саня,A,5,5,5,5,5,4,4.6,3.75,4.6,4.28,"-0,72",2.5,0.88,0.69,1.31,0.69,3.57,"""
 
-def parse_float(value: str) -> float:
-    """Парсит строку в float, обрабатывая запятые и дефисы"""
-    if not value or value.strip() == '':
-        return 0.0
-    # Заменяем запятую на точку
-    value = value.replace(',', '.')
-    # Убираем кавычки и пробелы
-    value = value.strip().strip('"')
+
+# === Загрузка ===
+
+def normalize_header(header: str) -> str:
+    return " ".join(str(header).split())
+
+
+def to_numeric(column: pd.Series) -> pd.Series:
+    """
+    Векторно привести колонку к float: десятичная запятая ("-3,33"), типографский
+    минус ("−0.07"), пустые значения -> NaN (не учитываются в статистике).
+    """
+    if pd.api.types.is_numeric_dtype(column):
+        return column.astype(float)
+    cleaned = column.astype("string").str.strip().str.strip('"') \
+        .str.replace(",", ".", regex=False) \
+        .str.replace("−", "-", regex=False)
+    return pd.to_numeric(cleaned, errors="coerce")
+
+
+def read_frame(source, file_format: str) -> pd.DataFrame:
+    if file_format == "parquet":
+        return pd.read_parquet(source)
+    # Числа с запятой в кавычках разбираются в to_numeric, поэтому все колонки читаются как текст
+    return pd.read_csv(source, dtype=str, keep_default_na=False, encoding="utf-8-sig")
+
+
+def detect_format(path: str) -> str:
+    suffix = Path(path).suffix.lower()
+    if suffix in (".parquet", ".pq"):
+        return "parquet"
+    if suffix in (".csv", ".txt"):
+        return "csv"
+    raise ValueError(f"Не удалось определить формат файла '{path}'. Поддерживаются: .csv, .parquet")
+
+
+def read_evaluation_frame(source, file_format: str) -> pd.DataFrame:
+    """
+    Прочитать один файл оценок и привести заголовки к каноническим именам.
+
+    Переименование выполняется до объединения файлов: иначе "Итоговая оценка сотрудника"
+    из одного файла и self_average из другого стали бы двумя колонками с одним именем.
+    """
+    df = read_frame(source, file_format)
+    df = df.rename(columns=lambda c: COLUMN_ALIASES.get(normalize_header(c), normalize_header(c)))
+    # Синонимы внутри одного файла ("Email" и "Почта") - оставляем первую колонку
+    return df.loc[:, ~df.columns.duplicated()]
+
+
+def load_evaluations(paths: List[str], file_format: Optional[str] = None) -> pd.DataFrame:
+    """Загрузить и нормализовать оценки из файлов (без файлов - встроенный пример)"""
+    if paths:
+        frames = [read_evaluation_frame(path, file_format or detect_format(path)) for path in paths]
+        df = pd.concat(frames, ignore_index=True) if len(frames) > 1 else frames[0]
+    else:
+        df = read_evaluation_frame(io.StringIO(SAMPLE_CSV), "csv")
+
+    for column in df.columns:
+        if column not in TEXT_COLUMNS:
+            df[column] = to_numeric(df[column])
+
+    if 'name' not in df:
+        df['name'] = df.index.astype(str)
+    if 'team' not in df:
+        df['team'] = "-"
+    df['team'] = df['team'].astype("string").fillna("-")
+
+    # Разницу можно не передавать - она вычисляется из итоговых оценок
+    if 'difference' not in df and {'self_average', 'manager_average'} <= set(df.columns):
+        df['difference'] = df['manager_average'] - df['self_average']
+
+    return df
+
+
+# === Отчет ===
+
+def format_stat(values: pd.Series) -> str:
+    return f"{values.mean():.2f} (σ={values.std():.2f})"
+
+
+def print_people(df: pd.DataFrame, top: int, detail: bool = True):
+    for row in df.head(top).itertuples(index=False):
+        if detail:
+            print(f"  - {row.name}: {row.difference:.2f} (С: {row.self_average:.2f} → М: {row.manager_average:.2f})")
+        else:
+            print(f"  - {row.name}: {row.difference:.2f}")
+    if len(df) > top:
+        print(f"  ... и еще {len(df) - top}")
+
+
+def print_ranking(title: str, df: pd.DataFrame, column: str, top: int, ascending: bool):
+    print(title)
+    ranked = df.nsmallest(top, column) if ascending else df.nlargest(top, column)
+    for i, row in enumerate(ranked.itertuples(index=False), 1):
+        print(f"  {i}. {row.name} ({row.team}): {getattr(row, column):.2f}")
+    print()
+
+
+def correlation(x: pd.Series, y: pd.Series) -> Optional[tuple]:
+    """Коэффициент Пирсона по строкам, где заданы обе оценки, и p-value (если есть scipy)"""
+    mask = x.notna().to_numpy() & y.notna().to_numpy()
+    if mask.sum() < 3:
+        return None
+    xs, ys = x.to_numpy()[mask], y.to_numpy()[mask]
+    r = float(np.corrcoef(xs, ys)[0, 1])
     try:
-        return float(value)
-    except ValueError:
-        return 0.0
+        from scipy.stats import pearsonr
+        return r, float(pearsonr(xs, ys)[1])
+    except ImportError:
+        return r, None
+
 
-def analyze_data():
+def analyze_data(df: pd.DataFrame, group_by: str = 'team', top: int = 5):
     """Анализирует данные оценок"""
-    reader = csv.DictReader(io.StringIO(csv_data))
-    
-    employees = []
-    for row in reader:
-        employee = {
-            'name': row['ФИО'],
-            'team': row['Команда'],
-            'self': {
-                'hard_skills': parse_float(row['Hard Skills']),
-                'soft_skills': parse_float(row['Soft Skills ']),
-                'impact': parse_float(row['Impact & Ownership ']),
-                'teamwork': parse_float(row['Teamwork & Culture Fit']),
-                'average': parse_float(row['Средний '])
-            },
-            'manager': {
-                'hard_skills': parse_float(row['Hard Skills 2']),
-                'soft_skills': parse_float(row['Soft Skills  2']),
-                'impact': parse_float(row['Impact & Ownership  2']),
-                'teamwork': parse_float(row['Teamwork & Culture Fit 2']),
-                'average': parse_float(row['Средний  2'])
-            },
-            'architect': {
-                'hard_skills_3': parse_float(row['Hard Skills 3']),
-                'hard_skills_4': parse_float(row['Hard Skills 4']),
-                'soft_skills': parse_float(row['Soft Skills  3']),
-                'impact': parse_float(row['Impact & Ownership  3']),
-                'teamwork': parse_float(row['Teamwork & Culture Fit 3']),
-                'total': parse_float(row['Итого'])
-            },
-            'difference': parse_float(row['Разница (Manager - Self)'])
-        }
-        employees.append(employee)
-    
-    # Статистика по командам
-    team_stats = defaultdict(lambda: {'self': [], 'manager': [], 'architect': [], 'difference': []})
-    for emp in employees:
-        team_stats[emp['team']]['self'].append(emp['self']['average'])
-        team_stats[emp['team']]['manager'].append(emp['manager']['average'])
-        team_stats[emp['team']]['architect'].append(emp['architect']['total'])
-        team_stats[emp['team']]['difference'].append(emp['difference'])
-    
-    # Общая статистика
-    all_self = [e['self']['average'] for e in employees]
-    all_manager = [e['manager']['average'] for e in employees]
-    all_architect = [e['architect']['total'] for e in employees]
-    all_differences = [e['difference'] for e in employees]
-    
+    totals = {rater: column for rater, column in TOTAL_COLUMNS.items() if column in df}
+    group_title = "Команда" if group_by == 'team' else group_by
+
     print("=" * 80)
     print("АНАЛИЗ ДАННЫХ ОЦЕНОК КОМПЕТЕНЦИЙ")
     print("=" * 80)
     print()
-    
+
     # 1. Общая статистика
     print("1. ОБЩАЯ СТАТИСТИКА")
     print("-" * 80)
-    print(f"Всего сотрудников: {len(employees)}")
-    print(f"Команда R: {len([e for e in employees if e['team'] == 'R'])}")
-    print(f"Команда A: {len([e for e in employees if e['team'] == 'A'])}")
+    print(f"Всего сотрудников: {len(df)}")
+    for group, count in df[group_by].value_counts().sort_index().items():
+        print(f"{group_title} {group}: {count}")
     print()
-    
+
     print("Средние оценки:")
-    print(f"  Самооценка:     {mean(all_self):.2f} (σ={stdev(all_self):.2f})")
-    print(f"  Руководитель:   {mean(all_manager):.2f} (σ={stdev(all_manager):.2f})")
-    print(f"  Архитектор:     {mean(all_architect):.2f} (σ={stdev(all_architect):.2f})")
-    print(f"  Разница (M-S):  {mean(all_differences):.2f} (σ={stdev(all_differences):.2f})")
+    for rater, column in totals.items():
+        print(f"  {RATERS[rater] + ':':<15} {format_stat(df[column])}")
+    if 'difference' in df:
+        print(f"  {'Разница (M-S):':<15} {format_stat(df['difference'])}")
     print()
-    
+
     # 2. Анализ разницы между самооценкой и оценкой руководителя
-    print("2. АНАЛИЗ РАЗНИЦЫ МЕЖДУ САМООЦЕНКОЙ И ОЦЕНКОЙ РУКОВОДИТЕЛЯ")
-    print("-" * 80)
-    overestimated = [e for e in employees if e['difference'] < -1.0]
-    underestimated = [e for e in employees if e['difference'] > 0.5]
-    aligned = [e for e in employees if -0.5 <= e['difference'] <= 0.5]
-    
-    print(f"Завышают самооценку (разница < -1.0): {len(overestimated)}")
-    for emp in sorted(overestimated, key=lambda x: x['difference']):
-        print(f"  - {emp['name']}: {emp['difference']:.2f} (С: {emp['self']['average']:.2f} → М: {emp['manager']['average']:.2f})")
-    print()
-    
-    print(f"Занижают самооценку (разница > 0.5): {len(underestimated)}")
-    for emp in sorted(underestimated, key=lambda x: x['difference'], reverse=True):
-        print(f"  - {emp['name']}: {emp['difference']:.2f} (С: {emp['self']['average']:.2f} → М: {emp['manager']['average']:.2f})")
-    print()
-    
-    print(f"Адекватная самооценка (разница -0.5 до 0.5): {len(aligned)}")
-    for emp in aligned:
-        print(f"  - {emp['name']}: {emp['difference']:.2f}")
-    print()
-    
-    # 3. Сравнение оценок по командам
-    print("3. СРАВНЕНИЕ ПО КОМАНДАМ")
+    if {'difference', 'self_average', 'manager_average'} <= set(df.columns):
+        print("2. АНАЛИЗ РАЗНИЦЫ МЕЖДУ САМООЦЕНКОЙ И ОЦЕНКОЙ РУКОВОДИТЕЛЯ")
+        print("-" * 80)
+        difference = df['difference']
+        overestimated = df[difference < OVERESTIMATED_THRESHOLD].sort_values('difference')
+        underestimated = df[difference > UNDERESTIMATED_THRESHOLD].sort_values('difference', ascending=False)
+        aligned = df[difference.between(*ALIGNED_RANGE)]
+
+        print(f"Завышают самооценку (разница < {OVERESTIMATED_THRESHOLD}): {len(overestimated)}")
+        print_people(overestimated, top)
+        print()
+
+        print(f"Занижают самооценку (разница > {UNDERESTIMATED_THRESHOLD}): {len(underestimated)}")
+        print_people(underestimated, top)
+        print()
+
+        print(f"Адекватная самооценка (разница {ALIGNED_RANGE[0]} до {ALIGNED_RANGE[1]}): {len(aligned)}")
+        print_people(aligned, top, detail=False)
+        print()
+
+    # 3. Сравнение оценок по командам - одна агрегация groupby на все колонки
+    print("3. СРАВНЕНИЕ ПО КОМАНДАМ" if group_by == 'team' else f"3. СРАВНЕНИЕ ПО ГРУППАМ ({group_by})")
     print("-" * 80)
-    for team in sorted(team_stats.keys()):
-        stats = team_stats[team]
-        print(f"Команда {team}:")
-        print(f"  Самооценка:     {mean(stats['self']):.2f} (σ={stdev(stats['self']):.2f})")
-        print(f"  Руководитель:   {mean(stats['manager']):.2f} (σ={stdev(stats['manager']):.2f})")
-        print(f"  Архитектор:     {mean(stats['architect']):.2f} (σ={stdev(stats['architect']):.2f})")
-        print(f"  Средняя разница: {mean(stats['difference']):.2f}")
+    stat_columns = list(totals.values()) + (['difference'] if 'difference' in df else [])
+    grouped = df.groupby(group_by, sort=True)[stat_columns].agg(['mean', 'std'])
+    for group, stats in grouped.iterrows():
+        print(f"{group_title} {group}:")
+        for rater, column in totals.items():
+            print(f"  {RATERS[rater] + ':':<15} {stats[(column, 'mean')]:.2f} (σ={stats[(column, 'std')]:.2f})")
+        if 'difference' in df:
+            print(f"  Средняя разница: {stats[('difference', 'mean')]:.2f}")
         print()
-    
+
     # 4. Топ и аутсайдеры
     print("4. ТОП И АУТСАЙДЕРЫ")
     print("-" * 80)
-    
-    print("Топ-5 по оценке архитектора:")
-    top_architect = sorted(employees, key=lambda x: x['architect']['total'], reverse=True)[:5]
-    for i, emp in enumerate(top_architect, 1):
-        print(f"  {i}. {emp['name']} ({emp['team']}): {emp['architect']['total']:.2f}")
-    print()
-    
-    print("Топ-5 по оценке руководителя:")
-    top_manager = sorted(employees, key=lambda x: x['manager']['average'], reverse=True)[:5]
-    for i, emp in enumerate(top_manager, 1):
-        print(f"  {i}. {emp['name']} ({emp['team']}): {emp['manager']['average']:.2f}")
-    print()
-    
-    print("Нижние 5 по оценке архитектора:")
-    bottom_architect = sorted(employees, key=lambda x: x['architect']['total'])[:5]
-    for i, emp in enumerate(bottom_architect, 1):
-        print(f"  {i}. {emp['name']} ({emp['team']}): {emp['architect']['total']:.2f}")
-    print()
-    
+    if 'architect_total' in df:
+        print_ranking(f"Топ-{top} по оценке архитектора:", df, 'architect_total', top, ascending=False)
+    if 'manager_average' in df:
+        print_ranking(f"Топ-{top} по оценке руководителя:", df, 'manager_average', top, ascending=False)
+    if 'architect_total' in df:
+        print_ranking(f"Нижние {top} по оценке архитектора:", df, 'architect_total', top, ascending=True)
+
     # 5. Корреляция между оценками
     print("5. КОРРЕЛЯЦИЯ МЕЖДУ ОЦЕНКАМИ")
     print("-" * 80)
-    
-    # Корреляция самооценка - руководитель
-    from scipy.stats import pearsonr
-    try:
-        corr_self_manager, p_value = pearsonr(all_self, all_manager)
-        print(f"Самооценка ↔ Руководитель: r={corr_self_manager:.3f} (p={p_value:.3f})")
-    except:
-        print("Самооценка ↔ Руководитель: расчет недоступен")
-    
-    try:
-        corr_manager_architect, p_value = pearsonr(all_manager, all_architect)
-        print(f"Руководитель ↔ Архитектор: r={corr_manager_architect:.3f} (p={p_value:.3f})")
-    except:
-        print("Руководитель ↔ Архитектор: расчет недоступен")
-    
-    try:
-        corr_self_architect, p_value = pearsonr(all_self, all_architect)
-        print(f"Самооценка ↔ Архитектор: r={corr_self_architect:.3f} (p={p_value:.3f})")
-    except:
-        print("Самооценка ↔ Архитектор: расчет недоступен")
+    for first, second in (('self', 'manager'), ('manager', 'architect'), ('self', 'architect')):
+        label = f"{RATERS[first]} ↔ {RATERS[second]}"
+        result = None
+        if first in totals and second in totals:
+            result = correlation(df[totals[first]], df[totals[second]])
+        if result is None:
+            print(f"{label}: расчет недоступен")
+        elif result[1] is None:
+            print(f"{label}: r={result[0]:.3f}")
+        else:
+            print(f"{label}: r={result[0]:.3f} (p={result[1]:.3f})")
     print()
-    
-    # 6. Детальный анализ по категориям
+
+    # 6. Детальный анализ по категориям: mean/std всех колонок одним вызовом
     print("6. АНАЛИЗ ПО КАТЕГОРИЯМ КОМПЕТЕНЦИЙ")
     print("-" * 80)
-    
-    categories = {
-        'Hard Skills': {
-            'self': [e['self']['hard_skills'] for e in employees],
-            'manager': [e['manager']['hard_skills'] for e in employees],
-            'architect': [e['architect']['hard_skills_4'] for e in employees]
-        },
-        'Soft Skills': {
-            'self': [e['self']['soft_skills'] for e in employees],
-            'manager': [e['manager']['soft_skills'] for e in employees],
-            'architect': [e['architect']['soft_skills'] for e in employees]
-        },
-        'Impact & Ownership': {
-            'self': [e['self']['impact'] for e in employees],
-            'manager': [e['manager']['impact'] for e in employees],
-            'architect': [e['architect']['impact'] for e in employees]
-        },
-        'Teamwork & Culture Fit': {
-            'self': [e['self']['teamwork'] for e in employees],
-            'manager': [e['manager']['teamwork'] for e in employees],
-            'architect': [e['architect']['teamwork'] for e in employees]
-        }
-    }
-    
-    for category, values in categories.items():
-        print(f"{category}:")
-        print(f"  Самооценка:     {mean(values['self']):.2f} (σ={stdev(values['self']):.2f})")
-        print(f"  Руководитель:   {mean(values['manager']):.2f} (σ={stdev(values['manager']):.2f})")
-        print(f"  Архитектор:     {mean(values['architect']):.2f} (σ={stdev(values['architect']):.2f})")
+    dimension_columns = [
+        f"{rater}_{dimension}" for dimension in DIMENSIONS for rater in RATERS
+        if f"{rater}_{dimension}" in df
+    ]
+    dimension_stats = df[dimension_columns].agg(['mean', 'std'])
+    for dimension, title in DIMENSIONS.items():
+        columns = [(rater, f"{rater}_{dimension}") for rater in RATERS if f"{rater}_{dimension}" in df]
+        if not columns:
+            continue
+        print(f"{title}:")
+        for rater, column in columns:
+            print(f"  {RATERS[rater] + ':':<15} "
+                  f"{dimension_stats.at['mean', column]:.2f} (σ={dimension_stats.at['std', column]:.2f})")
         print()
-    
+
     # 7. Выводы и рекомендации
     print("7. ВЫВОДЫ И РЕКОМЕНДАЦИИ")
     print("-" * 80)
-    
-    avg_diff = mean(all_differences)
-    if avg_diff < -1.0:
-        print("⚠️  КРИТИЧЕСКОЕ: Средняя разница между самооценкой и оценкой руководителя очень большая.")
-        print("   Сотрудники систематически завышают свою самооценку.")
-    elif avg_diff < -0.5:
-        print("⚠️  ВНИМАНИЕ: Сотрудники в среднем завышают самооценку.")
-    elif avg_diff > 0.5:
-        print("ℹ️  Сотрудники в среднем занижают самооценку (возможна проблема с уверенностью).")
-    else:
-        print("✓ Самооценка сотрудников в целом адекватна.")
-    
-    print()
-    
-    if mean(all_architect) < 2.5:
-        print("⚠️  Низкие оценки архитектора - требуется развитие компетенций.")
-    elif mean(all_architect) < 3.0:
-        print("ℹ️  Оценки архитектора на среднем уровне - есть потенциал для роста.")
-    else:
-        print("✓ Оценки архитектора на хорошем уровне.")
-    
-    print()
+
+    if 'difference' in df:
+        avg_diff = df['difference'].mean()
+        if avg_diff < -1.0:
+            print("⚠️  КРИТИЧЕСКОЕ: Средняя разница между самооценкой и оценкой руководителя очень большая.")
+            print("   Сотрудники систематически завышают свою самооценку.")
+        elif avg_diff < -0.5:
+            print("⚠️  ВНИМАНИЕ: Сотрудники в среднем завышают самооценку.")
+        elif avg_diff > 0.5:
+            print("ℹ️  Сотрудники в среднем занижают самооценку (возможна проблема с уверенностью).")
+        else:
+            print("✓ Самооценка сотрудников в целом адекватна.")
+        print()
+
+    if 'architect_total' in df:
+        architect_mean = df['architect_total'].mean()
+        if architect_mean < 2.5:
+            print("⚠️  Низкие оценки архитектора - требуется развитие компетенций.")
+        elif architect_mean < 3.0:
+            print("ℹ️  Оценки архитектора на среднем уровне - есть потенциал для роста.")
+        else:
+            print("✓ Оценки архитектора на хорошем уровне.")
+        print()
+
     print("Рекомендации:")
     print("1. Провести индивидуальные встречи с сотрудниками, завышающими самооценку")
     print("2. Разработать план развития для сотрудников с низкими оценками архитектора")
     print("3. Провести калибровочные сессии между руководителями и архитекторами")
     print("4. Внедрить регулярную обратную связь для улучшения самооценки")
-    
+
     print()
     print("=" * 80)
 
-if __name__ == "__main__":
+
+def main():
+    parser = argparse.ArgumentParser(description="Анализ оценок компетенций (самооценка, руководитель, архитектор)")
+    parser.add_argument("files", nargs="*", help="CSV/Parquet файлы с оценками (без файлов - встроенный пример)")
+    parser.add_argument("--format", choices=("csv", "parquet"), help="Формат файлов (по умолчанию - по расширению)")
+    parser.add_argument("--group-by", default="team", help="Колонка для сравнения групп (по умолчанию team)")
+    parser.add_argument("--top", type=int, default=5, help="Сколько сотрудников выводить в списках и рейтингах")
+    args = parser.parse_args()
+
     try:
-        analyze_data()
-    except ImportError:
-        print("Для полного анализа требуется scipy. Упрощенный анализ:")
-        analyze_data()
\ No newline at end of file
+        df = load_evaluations(args.files, args.format)
+    except (OSError, ValueError) as e:
+        print(f"❌ {e}")
+        sys.exit(1)
+
+    if args.group_by not in df:
+        print(f"❌ Колонка '{args.group_by}' не найдена. Доступны: {', '.join(map(str, df.columns))}")
+        sys.exit(1)
+
+    analyze_data(df, group_by=args.group_by, top=args.top)
+
+
+if __name__ == "__main__":
+    main()
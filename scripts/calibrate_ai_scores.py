@@ -0,0 +1,296 @@
+#!/usr/bin/env python3
+"""
+Калибровка AI оценок по оценкам людей.
+
+Сопоставляет competency_assessments.ai_assessed_score с оценками руководителя,
+архитектора и самооценкой (файлы в формате scripts/analyze_evaluations.py) по
+пользователю и считает для каждого режима оценки (модель, промпт, порог):
+
+- корреляцию Пирсона и Спирмена, смещение (AI - человек), MAE и RMSE по пользователям;
+- дрейф по компетенциям: смещение каждой компетенции и его изменение относительно
+  базового режима.
+
+Так до раскатки более дешевого/быстрого режима оценки видно, не ухудшилось ли
+согласие с людьми и на каких компетенциях он "плывет".
+
+AI оценки берутся из выгрузки (CSV/Parquet с колонками user_id/email/full_name,
+competency_name, ai_assessed_score и опционально mode) или напрямую из БД (--from-db).
+Каждый файл --ai - отдельный режим (по имени файла), если в нем нет колонки mode.
+Первый режим - базовый.
+
+Зависимости: pip install pandas numpy (pyarrow - для Parquet)
+
+Примеры:
+    python scripts/calibrate_ai_scores.py ratings.csv --ai gpt4o.csv --ai gpt4o_mini.csv --key email
+    python scripts/calibrate_ai_scores.py ratings.csv --from-db --since 2026-09-01 --key name
+    python scripts/calibrate_ai_scores.py ratings.csv --ai scores.parquet --output drift.csv
+"""
+
+import argparse
+import sys
+from pathlib import Path
+from typing import Dict, List, Optional
+
+try:
+    import numpy as np
+    import pandas as pd
+except ImportError:
+    print("Для калибровки требуются pandas и numpy: pip install pandas numpy")
+    sys.exit(1)
+
+# Добавляем корневую директорию в path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from analyze_evaluations import RATERS, detect_format, load_evaluations, read_frame
+
+# Оценки людей, сопоставимые с AI (шкала 1-5): AI оценивает технические знания - Hard Skills
+REFERENCE_COLUMNS = {
+    'manager': 'manager_hard_skills',
+    'architect': 'architect_hard_skills_raw',
+    'self': 'self_hard_skills',
+}
+
+# Колонки выгрузки AI оценок -> канонические имена
+AI_COLUMN_ALIASES = {
+    'full_name': 'name',
+    'user_name': 'name',
+    'competency': 'competency_name',
+    'score': 'ai_assessed_score',
+    'variant': 'mode',
+    'model': 'mode',
+}
+
+JOIN_KEYS = ('user_id', 'email', 'name')
+
+# Сколько строк выгрузки из БД читать за запрос (max-rows PostgREST)
+DB_PAGE_SIZE = 1000
+
+
+# === Загрузка ===
+
+def normalize_key(values: pd.Series) -> pd.Series:
+    """Ключ пользователя без учета регистра и лишних пробелов"""
+    return values.astype("string").str.strip().str.lower().str.split().str.join(" ")
+
+
+def load_ai_file(path: str, file_format: Optional[str]) -> pd.DataFrame:
+    df = read_frame(path, file_format or detect_format(path))
+    df = df.rename(columns=lambda c: AI_COLUMN_ALIASES.get(str(c).strip(), str(c).strip()))
+    if 'mode' not in df:
+        df['mode'] = Path(path).stem
+    return df
+
+
+def fetch_ai_scores_from_db(since: Optional[str], until: Optional[str]) -> pd.DataFrame:
+    """Выгрузить AI оценки завершенных тестирований постранично"""
+    from app.database import get_supabase_client
+
+    client = get_supabase_client()
+    rows: List[Dict] = []
+    offset = 0
+    while True:
+        query = client.table('competency_assessments') \
+            .select(
+                'ai_assessed_score, competencies(name), '
+                'assessments!inner(user_id, status, completed_at, users(email, full_name))'
+            ) \
+            .eq('assessments.status', 'completed') \
+            .not_.is_('ai_assessed_score', 'null')
+        if since:
+            query = query.gte('assessments.completed_at', since)
+        if until:
+            query = query.lt('assessments.completed_at', until)
+        page = query.order('id').range(offset, offset + DB_PAGE_SIZE - 1).execute().data or []
+
+        for row in page:
+            assessment = row.get('assessments') or {}
+            user = assessment.get('users') or {}
+            rows.append({
+                'user_id': assessment.get('user_id'),
+                'email': user.get('email'),
+                'name': user.get('full_name'),
+                'competency_name': (row.get('competencies') or {}).get('name'),
+                'ai_assessed_score': row.get('ai_assessed_score'),
+                'mode': 'production',
+            })
+        if len(page) < DB_PAGE_SIZE:
+            break
+        offset += DB_PAGE_SIZE
+
+    return pd.DataFrame(rows, columns=['user_id', 'email', 'name', 'competency_name', 'ai_assessed_score', 'mode'])
+
+
+def prepare_ai_scores(frames: List[pd.DataFrame], key: str) -> pd.DataFrame:
+    df = pd.concat(frames, ignore_index=True) if len(frames) > 1 else frames[0]
+    missing = {key, 'competency_name', 'ai_assessed_score'} - set(df.columns)
+    if missing:
+        raise ValueError(f"В AI оценках нет колонок: {', '.join(sorted(missing))}")
+
+    df = df[[key, 'competency_name', 'ai_assessed_score', 'mode']].copy()
+    df['key'] = normalize_key(df[key])
+    df['mode'] = df['mode'].astype("string").fillna("default")
+    df['ai_assessed_score'] = pd.to_numeric(df['ai_assessed_score'], errors="coerce")
+    return df.dropna(subset=['key', 'ai_assessed_score'])
+
+
+# === Метрики ===
+
+def agreement(frame: pd.DataFrame, ai_column: str, human_column: str) -> pd.Series:
+    """Метрики согласия AI и человека по строкам, где заданы обе оценки"""
+    pair = frame[[ai_column, human_column]].dropna()
+    diff = pair[ai_column] - pair[human_column]
+    n = len(pair)
+    return pd.Series({
+        'n': n,
+        'ai_mean': pair[ai_column].mean(),
+        'human_mean': pair[human_column].mean(),
+        'bias': diff.mean(),
+        'mae': diff.abs().mean(),
+        'rmse': float(np.sqrt((diff ** 2).mean())) if n else np.nan,
+        'pearson': pair[ai_column].corr(pair[human_column]) if n >= 3 else np.nan,
+        'spearman': pair[ai_column].corr(pair[human_column], method='spearman') if n >= 3 else np.nan,
+    })
+
+
+def user_level_metrics(ai: pd.DataFrame, humans: pd.DataFrame, references: Dict[str, str]) -> pd.DataFrame:
+    """Средняя AI оценка пользователя по всем компетенциям против оценки человека"""
+    per_user = ai.groupby(['mode', 'key'], as_index=False)['ai_assessed_score'].mean()
+    merged = per_user.merge(humans, on='key', how='inner')
+    results = []
+    for rater, column in references.items():
+        stats = merged.groupby('mode').apply(lambda g: agreement(g, 'ai_assessed_score', column))
+        stats['reference'] = rater
+        results.append(stats.reset_index())
+    return pd.concat(results, ignore_index=True) if results else pd.DataFrame()
+
+
+def competency_drift(
+    ai: pd.DataFrame,
+    humans: pd.DataFrame,
+    references: Dict[str, str],
+    baseline: str
+) -> pd.DataFrame:
+    """Смещение по каждой компетенции и его изменение относительно базового режима"""
+    merged = ai.merge(humans, on='key', how='inner')
+    results = []
+    for rater, column in references.items():
+        stats = merged.groupby(['competency_name', 'mode']) \
+            .apply(lambda g: agreement(g, 'ai_assessed_score', column)) \
+            .reset_index()
+        stats['reference'] = rater
+        base = stats.loc[stats['mode'] == baseline, ['competency_name', 'bias', 'mae']] \
+            .rename(columns={'bias': 'baseline_bias', 'mae': 'baseline_mae'})
+        stats = stats.merge(base, on='competency_name', how='left')
+        stats['bias_drift'] = stats['bias'] - stats['baseline_bias']
+        stats['mae_drift'] = stats['mae'] - stats['baseline_mae']
+        results.append(stats)
+    return pd.concat(results, ignore_index=True) if results else pd.DataFrame()
+
+
+# === Отчет ===
+
+def print_report(users: pd.DataFrame, drift: pd.DataFrame, baseline: str, top: int, min_users: int):
+    print("=" * 80)
+    print("КАЛИБРОВКА AI ОЦЕНОК ПО ОЦЕНКАМ ЛЮДЕЙ")
+    print("=" * 80)
+    print()
+
+    print("1. СОГЛАСИЕ ПО ПОЛЬЗОВАТЕЛЯМ (средняя AI оценка vs Hard Skills)")
+    print("-" * 80)
+    for reference, group in users.groupby('reference', sort=False):
+        print(f"{RATERS.get(reference, reference)}:")
+        for row in group.itertuples(index=False):
+            marker = " (базовый)" if row.mode == baseline else ""
+            print(f"  {row.mode}{marker}: n={row.n:.0f}, r={row.pearson:.3f}, ρ={row.spearman:.3f}, "
+                  f"смещение={row.bias:+.2f}, MAE={row.mae:.2f}, RMSE={row.rmse:.2f}")
+        print()
+
+    modes = [mode for mode in drift['mode'].unique() if mode != baseline] if not drift.empty else []
+    print(f"2. ДРЕЙФ ПО КОМПЕТЕНЦИЯМ (относительно '{baseline}', компетенции с n >= {min_users})")
+    print("-" * 80)
+    if not modes:
+        print("Только один режим оценки - сравнивать не с чем. Смещение по компетенциям:")
+        rows = drift[drift['n'] >= min_users].dropna(subset=['bias'])
+        rows = rows.reindex(rows['bias'].abs().sort_values(ascending=False).index)
+        for row in rows.head(top).itertuples(index=False):
+            print(f"  [{RATERS.get(row.reference, row.reference)}] {row.competency_name}: "
+                  f"смещение={row.bias:+.2f}, MAE={row.mae:.2f} (n={row.n:.0f})")
+        print()
+    for mode in modes:
+        rows = drift[(drift['mode'] == mode) & (drift['n'] >= min_users)].dropna(subset=['bias_drift'])
+        rows = rows.reindex(rows['bias_drift'].abs().sort_values(ascending=False).index)
+        print(f"Режим {mode}: {len(rows)} сопоставимых компетенций")
+        for row in rows.head(top).itertuples(index=False):
+            print(f"  [{RATERS.get(row.reference, row.reference)}] {row.competency_name}: "
+                  f"дрейф смещения={row.bias_drift:+.2f}, дрейф MAE={row.mae_drift:+.2f} (n={row.n:.0f})")
+        print()
+
+    print("=" * 80)
+
+
+def write_table(df: pd.DataFrame, path: str):
+    if Path(path).suffix.lower() in (".parquet", ".pq"):
+        df.to_parquet(path, index=False)
+    else:
+        df.to_csv(path, index=False)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Калибровка AI оценок компетенций по оценкам людей")
+    parser.add_argument("ratings", nargs="+", help="CSV/Parquet файлы с оценками людей")
+    parser.add_argument("--ai", action="append", default=[], help="CSV/Parquet выгрузка AI оценок (можно несколько)")
+    parser.add_argument("--from-db", action="store_true", help="Взять AI оценки из БД (режим 'production')")
+    parser.add_argument("--since", help="Только тестирования, завершенные начиная с даты (для --from-db)")
+    parser.add_argument("--until", help="Только тестирования, завершенные до даты (для --from-db)")
+    parser.add_argument("--key", choices=JOIN_KEYS, default="email", help="Ключ сопоставления пользователей")
+    parser.add_argument("--reference", choices=tuple(REFERENCE_COLUMNS), action="append",
+                        help="С какими оценками сравнивать (по умолчанию - со всеми доступными)")
+    parser.add_argument("--baseline", help="Базовый режим оценки (по умолчанию - первый)")
+    parser.add_argument("--min-users", type=int, default=5, help="Минимум пользователей на компетенцию в отчете")
+    parser.add_argument("--top", type=int, default=10, help="Сколько компетенций выводить на режим")
+    parser.add_argument("--output", help="Сохранить таблицу дрейфа по компетенциям (CSV/Parquet)")
+    args = parser.parse_args()
+
+    if not args.ai and not args.from_db:
+        parser.error("Нужно указать --ai или --from-db")
+
+    try:
+        humans = load_evaluations(args.ratings)
+        if args.key not in humans:
+            raise ValueError(f"В оценках людей нет колонки '{args.key}'")
+        humans['key'] = normalize_key(humans[args.key])
+        references = {
+            rater: column for rater, column in REFERENCE_COLUMNS.items()
+            if column in humans and (not args.reference or rater in args.reference)
+        }
+        if not references:
+            raise ValueError("В оценках людей нет колонок Hard Skills для сравнения")
+        humans = humans.dropna(subset=['key']).drop_duplicates('key')[['key', *references.values()]]
+
+        frames = [load_ai_file(path, None) for path in args.ai]
+        if args.from_db:
+            frames.append(fetch_ai_scores_from_db(args.since, args.until))
+        ai = prepare_ai_scores(frames, args.key)
+    except (OSError, ValueError) as e:
+        print(f"❌ {e}")
+        sys.exit(1)
+
+    matched = ai['key'].isin(humans['key'])
+    print(f"AI оценок: {len(ai)}, сопоставлено с оценками людей: {int(matched.sum())} "
+          f"({ai.loc[matched, 'key'].nunique()} пользователей)")
+    if not matched.any():
+        print(f"❌ Ни один пользователь не сопоставлен по ключу '{args.key}'")
+        sys.exit(1)
+
+    baseline = args.baseline or str(ai['mode'].iloc[0])
+    users = user_level_metrics(ai, humans, references)
+    drift = competency_drift(ai, humans, references, baseline)
+    print_report(users, drift, baseline, args.top, args.min_users)
+
+    if args.output:
+        write_table(drift, args.output)
+        print(f"💾 Таблица дрейфа сохранена: {args.output}")
+
+
+if __name__ == "__main__":
+    main()
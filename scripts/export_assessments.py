@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+"""
+Скрипт для выгрузки результатов тестирований в NDJSON/CSV.
+
+Тот же механизм, что у GET /api/admin/export/{dataset}: таблица читается
+страницами по первичному ключу, каждая страница сразу пишется в файл - память
+не зависит от объема выгрузки. Результат можно передать в
+scripts/analyze_evaluations.py или scripts/calibrate_ai_scores.py.
+
+Наборы данных: assessments, competency_scores, question_history.
+
+Примеры:
+    python scripts/export_assessments.py competency_scores --format csv -o scores.csv
+    python scripts/export_assessments.py question_history --since 2026-10-01 -o october.ndjson
+    python scripts/export_assessments.py assessments | gzip > assessments.ndjson.gz
+"""
+
+import argparse
+import asyncio
+import sys
+from datetime import datetime
+from pathlib import Path
+
+# Добавляем корневую директорию в path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from app.config import settings
+from app.database import get_supabase_client
+from app.services.export_service import EXPORT_DATASETS, EXPORT_FORMATS, ExportService
+from app.services.supabase_service import SupabaseService
+
+
+async def export(args) -> int:
+    exporter = ExportService(SupabaseService(get_supabase_client()))
+    output = open(args.output, "wb") if args.output else sys.stdout.buffer
+    written = 0
+    try:
+        async for chunk in exporter.stream(
+            args.dataset,
+            args.format,
+            since=args.since,
+            until=args.until,
+            page_size=args.page_size
+        ):
+            output.write(chunk)
+            written += len(chunk)
+    except Exception as e:
+        print(f"❌ Выгрузка {args.dataset} прервана: {e}", file=sys.stderr)
+        return 1
+    finally:
+        if args.output:
+            output.close()
+        else:
+            output.flush()
+
+    if args.output:
+        print(f"✅ {args.dataset} выгружен в {args.output} ({written / 1024 / 1024:.1f} MB)", file=sys.stderr)
+    return 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Потоковая выгрузка результатов тестирований")
+    parser.add_argument("dataset", choices=tuple(EXPORT_DATASETS), help="Набор данных")
+    parser.add_argument("--format", choices=EXPORT_FORMATS, default="ndjson", help="Формат (по умолчанию ndjson)")
+    parser.add_argument("--since", type=datetime.fromisoformat, help="Строки начиная с даты (ISO 8601)")
+    parser.add_argument("--until", type=datetime.fromisoformat, help="Строки до даты (ISO 8601)")
+    parser.add_argument("--page-size", type=int, default=settings.export_page_size,
+                        help="Строк за один запрос к БД")
+    parser.add_argument("-o", "--output", help="Файл результата (по умолчанию - stdout)")
+    args = parser.parse_args()
+
+    sys.exit(asyncio.run(export(args)))
+
+
+if __name__ == "__main__":
+    main()
@@ -2,36 +2,80 @@
 """
 Скрипт для экспорта OpenAPI схемы в JSON файл.
 Используется для генерации типов TypeScript на фронтенде.
+
+По умолчанию схема пишется в openapi.json в корне проекта - это версионируемый
+артефакт, который приложение отдает на /openapi.json без генерации на старте.
+Запускается на этапе сборки и не требует .env, ключей и сети: схема не зависит
+от окружения, а клиенты Supabase и OpenAI создаются только при первом запросе.
+
+Примеры:
+    python scripts/export_openapi.py                 # обновить артефакт
+    python scripts/export_openapi.py --check         # в CI: артефакт соответствует коду?
+    python scripts/export_openapi.py frontend/openapi.json
 """
 
+import argparse
 import json
+import os
 import sys
 from pathlib import Path
 
 # Добавляем корневую директорию в path
 sys.path.insert(0, str(Path(__file__).parent.parent))
 
+# Заглушки обязательных настроек: импорт приложения валидирует Settings(),
+# но для построения схемы реальные ключи не нужны (запросов к сервисам нет)
+os.environ.setdefault("SUPABASE_URL", "https://openapi-export.invalid")
+os.environ.setdefault("SUPABASE_KEY", "sb_openapi_export_placeholder")
+os.environ.setdefault("OPENAI_API_KEY", "openapi-export")
+
 from app.main import app
-from fastapi.openapi.utils import get_openapi
+from app.utils.openapi import PROJECT_ROOT, build_openapi_schema, render_openapi_schema
+
+DEFAULT_OUTPUT = PROJECT_ROOT / "openapi.json"
 
-def export_openapi_schema(output_path: str = "openapi.json"):
+
+def export_openapi_schema(output_path: Path = DEFAULT_OUTPUT) -> Path:
     """Экспортирует OpenAPI схему в JSON файл"""
-    openapi_schema = get_openapi(
-        title=app.title,
-        version=app.version,
-        description=app.description,
-        routes=app.routes,
-    )
-    
-    output_file = Path(output_path)
-    output_file.parent.mkdir(parents=True, exist_ok=True)
-    
-    with open(output_file, "w", encoding="utf-8") as f:
-        json.dump(openapi_schema, f, indent=2, ensure_ascii=False)
-    
-    print(f"✅ OpenAPI схема экспортирована в {output_file.absolute()}")
-    return output_file
+    output_path.parent.mkdir(parents=True, exist_ok=True)
+    output_path.write_bytes(render_openapi_schema(build_openapi_schema(app)))
+
+    print(f"✅ OpenAPI схема экспортирована в {output_path.absolute()}")
+    return output_path
+
+
+def check_openapi_schema(output_path: Path = DEFAULT_OUTPUT) -> bool:
+    """Проверяет, что файл схемы совпадает с текущим кодом (форматирование не учитывается)"""
+    if not output_path.is_file():
+        print(f"❌ Файл схемы {output_path} не найден", file=sys.stderr)
+        return False
+
+    with open(output_path, encoding="utf-8") as f:
+        current = json.load(f)
+
+    if current != build_openapi_schema(app):
+        print(
+            f"❌ {output_path} устарел: выполните python scripts/export_openapi.py и закоммитьте результат",
+            file=sys.stderr
+        )
+        return False
+
+    print(f"✅ {output_path} соответствует коду")
+    return True
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Экспорт OpenAPI схемы")
+    parser.add_argument("output", nargs="?", type=Path, default=DEFAULT_OUTPUT,
+                        help="Файл схемы (по умолчанию openapi.json в корне проекта)")
+    parser.add_argument("--check", action="store_true",
+                        help="Не записывать файл, а проверить его актуальность (код выхода 1 - устарел)")
+    args = parser.parse_args()
+
+    if args.check:
+        sys.exit(0 if check_openapi_schema(args.output) else 1)
+    export_openapi_schema(args.output)
+
 
 if __name__ == "__main__":
-    output_path = sys.argv[1] if len(sys.argv) > 1 else "openapi.json"
-    export_openapi_schema(output_path)
+    main()
@@ -0,0 +1,176 @@
+#!/usr/bin/env python3
+"""
+Скрипт для офлайн-генерации банка вопросов через OpenAI.
+
+Генерирует N вопросов на каждую пару (компетенция × сложность), параллельно
+отправляя запросы с ограничением конкурентности, убирает дубликаты (в том числе
+с уже существующими вопросами в БД) и вставляет результат в таблицу questions
+пачками. Запускается вручную при добавлении новой технологии - в обработке
+запросов пользователей генерация не участвует.
+
+Примеры:
+    python scripts/generate_question_bank.py --technology react --per-difficulty 3
+    python scripts/generate_question_bank.py --competency-id <uuid> --difficulties 1 2 3 --dry-run
+    python scripts/generate_question_bank.py --technology vue --output vue_questions.jsonl
+"""
+
+import argparse
+import asyncio
+import json
+import sys
+from collections import defaultdict
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+# Добавляем корневую директорию в path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from app.api.deps import get_openai_service
+from app.database import get_supabase_client
+from app.services.supabase_service import SupabaseService
+from app.utils.text import normalize_question_text
+
+# Сколько уже принятых вопросов передавать модели как "не повторять"
+MAX_AVOID_QUESTIONS = 15
+
+
+async def resolve_competencies(supabase_service: SupabaseService, args) -> List[Dict]:
+    """Получить список компетенций по технологии или явным ID"""
+    if args.competency_id:
+        response = supabase_service.client.table('competencies') \
+            .select('id, name, description') \
+            .in_('id', args.competency_id) \
+            .execute()
+        return response.data or []
+
+    technology = await supabase_service.get_technology_by_name(args.technology)
+    if not technology:
+        raise SystemExit(f"❌ Технология '{args.technology}' не найдена")
+
+    technology_competencies = await supabase_service.get_technology_competencies(str(technology['id']))
+    return [tc['competencies'] for tc in technology_competencies if tc.get('competencies')]
+
+
+async def generate_bank(args) -> List[Dict]:
+    supabase_service = SupabaseService(get_supabase_client())
+    openai_service = get_openai_service()
+
+    competencies = await resolve_competencies(supabase_service, args)
+    if not competencies:
+        raise SystemExit("❌ Не найдено ни одной компетенции")
+    print(f"📚 Компетенций: {len(competencies)}, сложности: {args.difficulties}, "
+          f"по {args.per_difficulty} вопросов на ячейку")
+
+    # Нормализованные тексты уже существующих вопросов - для дедупликации
+    seen: Dict[str, set] = {}
+    for competency in competencies:
+        existing = await supabase_service.get_competency_question_texts(str(competency['id']))
+        seen[competency['id']] = {normalize_question_text(text) for text in existing}
+
+    accepted: Dict[Tuple[str, int], List[Dict]] = defaultdict(list)
+    semaphore = asyncio.Semaphore(args.concurrency)
+    failures = 0
+    duplicates = 0
+
+    async def generate_one(competency: Dict, difficulty: int, question_number: int, avoid: List[str]):
+        async with semaphore:
+            return await openai_service.generate_question(
+                role_name=args.role_name,
+                competency_name=competency['name'],
+                competency_description=competency.get('description') or '',
+                question_number=question_number,
+                difficulty=difficulty,
+                avoid_questions=avoid
+            )
+
+    for round_number in range(1, args.max_rounds + 1):
+        tasks = []
+        cells = []
+        for competency in competencies:
+            for difficulty in args.difficulties:
+                cell = (competency['id'], difficulty)
+                deficit = args.per_difficulty - len(accepted[cell])
+                avoid = [q['question_text'] for q in accepted[cell]][-MAX_AVOID_QUESTIONS:]
+                for i in range(deficit):
+                    question_number = (len(accepted[cell]) + i) % 5 + 1
+                    tasks.append(generate_one(competency, difficulty, question_number, avoid))
+                    cells.append(cell)
+
+        if not tasks:
+            break
+
+        print(f"🔄 Раунд {round_number}: {len(tasks)} запросов (конкурентность {args.concurrency})")
+        results = await asyncio.gather(*tasks, return_exceptions=True)
+
+        for cell, result in zip(cells, results):
+            if isinstance(result, Exception):
+                failures += 1
+                print(f"  ⚠️  Ошибка генерации: {result}")
+                continue
+
+            competency_id, difficulty = cell
+            if len(accepted[cell]) >= args.per_difficulty:
+                continue
+
+            key = normalize_question_text(result.get('question', ''))
+            if not key or key in seen[competency_id]:
+                duplicates += 1
+                continue
+            seen[competency_id].add(key)
+
+            key_points = result.get('expectedKeyPoints')
+            accepted[cell].append({
+                'competency_id': competency_id,
+                'question_text': result['question'].strip(),
+                'difficulty': difficulty,
+                'question_number': len(accepted[cell]) % 5 + 1,
+                'expected_key_points': key_points if isinstance(key_points, list) else [],
+                'estimated_answer_time': result.get('estimatedAnswerTime') or '1-2 минуты',
+            })
+
+    questions = [q for cell_questions in accepted.values() for q in cell_questions]
+    missing = sum(
+        max(0, args.per_difficulty - len(accepted[(c['id'], d)]))
+        for c in competencies for d in args.difficulties
+    )
+    print(f"✅ Сгенерировано {len(questions)} уникальных вопросов "
+          f"(дубликатов отброшено: {duplicates}, ошибок: {failures}, не добрано: {missing})")
+
+    if args.output:
+        output_file = Path(args.output)
+        output_file.parent.mkdir(parents=True, exist_ok=True)
+        with open(output_file, "w", encoding="utf-8") as f:
+            for question in questions:
+                f.write(json.dumps(question, ensure_ascii=False) + "\n")
+        print(f"💾 Вопросы сохранены в {output_file.absolute()}")
+
+    if args.dry_run:
+        print("ℹ️  --dry-run: вопросы не записаны в БД")
+    elif questions:
+        created = await supabase_service.bulk_create_questions(questions, chunk_size=args.chunk_size)
+        print(f"✅ Добавлено в БД: {len(created)} вопросов")
+
+    await openai_service.close()
+    return questions
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Офлайн-генерация банка вопросов через OpenAI")
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--technology", help="Название технологии (все ее компетенции)")
+    source.add_argument("--competency-id", action="append", help="ID компетенции (можно указать несколько раз)")
+    parser.add_argument("--per-difficulty", type=int, default=3, help="Вопросов на каждую пару компетенция × сложность")
+    parser.add_argument("--difficulties", type=int, nargs="+", default=[1, 2, 3, 4, 5], choices=range(1, 6),
+                        help="Уровни сложности (1-5)")
+    parser.add_argument("--concurrency", type=int, default=8, help="Максимум одновременных запросов к OpenAI")
+    parser.add_argument("--max-rounds", type=int, default=3,
+                        help="Сколько раз догенерировать вопросы взамен дубликатов и ошибок")
+    parser.add_argument("--role-name", default="Разработчик", help="Роль кандидата для промпта")
+    parser.add_argument("--chunk-size", type=int, default=500, help="Размер пачки при вставке в БД")
+    parser.add_argument("--output", help="Дополнительно сохранить вопросы в JSONL файл")
+    parser.add_argument("--dry-run", action="store_true", help="Не записывать вопросы в БД")
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    asyncio.run(generate_bank(parse_args()))
@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+"""
+Скрипт для массового импорта вопросов из JSONL/JSON/CSV файлов.
+
+Замена ручным SQL seed-файлам: файл читается потоково, строки валидируются,
+названия компетенций разрешаются одним запросом на пачку, вопросы записываются
+пачками через upsert (повторный импорт обновляет вопросы, а не дублирует их).
+
+Формат JSONL (одна строка - один вопрос):
+    {"competency": "React Basics", "question_text": "Что такое JSX?", "difficulty": 1,
+     "question_number": 2, "expected_key_points": ["..."], "estimated_answer_time": "1-2 минуты"}
+
+Формат JSON (.json) - массив таких объектов (читается целиком).
+
+Формат CSV - те же колонки, expected_key_points через "|" или JSON массивом.
+
+Примеры:
+    python scripts/import_questions.py questions/react.jsonl
+    python scripts/import_questions.py questions/*.csv --chunk-size 2000
+    python scripts/import_questions.py vue_questions.jsonl --dry-run
+"""
+
+import argparse
+import asyncio
+import sys
+from pathlib import Path
+
+# Добавляем корневую директорию в path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from app.database import get_supabase_client
+from app.services.supabase_service import SupabaseService
+from app.services.question_import import (
+    SUPPORTED_FORMATS, QuestionImportService, detect_format, iter_question_rows
+)
+
+
+async def import_files(args) -> int:
+    importer = QuestionImportService(SupabaseService(get_supabase_client()))
+    failed = 0
+
+    for path in args.files:
+        file_format = args.format or detect_format(path)
+        print(f"📥 {path} ({file_format})")
+
+        with open(path, encoding="utf-8-sig", newline="") as f:
+            report = await importer.import_rows(
+                iter_question_rows(f, file_format),
+                chunk_size=args.chunk_size,
+                dry_run=args.dry_run
+            )
+
+        print(f"  ✅ Импортировано: {report['imported']} из {report['total']} "
+              f"(дубликатов в файле: {report['duplicates']}, с ошибками: {report['invalid']})")
+        for error in report['errors']:
+            print(f"  ⚠️  Строка {error['line']}: {error['error']}")
+        if report['invalid'] > len(report['errors']):
+            print(f"  ... и еще {report['invalid'] - len(report['errors'])} ошибок")
+        failed += report['invalid']
+
+    if args.dry_run:
+        print("ℹ️  --dry-run: вопросы не записаны в БД")
+    return 1 if failed and args.strict else 0
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Массовый импорт вопросов из JSONL/JSON/CSV")
+    parser.add_argument("files", nargs="+", help="Файлы с вопросами (.jsonl, .json, .csv)")
+    parser.add_argument("--format", choices=SUPPORTED_FORMATS, help="Формат файлов (по умолчанию по расширению)")
+    parser.add_argument("--chunk-size", type=int, default=1000, help="Сколько вопросов записывать одним запросом")
+    parser.add_argument("--dry-run", action="store_true", help="Только проверить файлы, не записывая в БД")
+    parser.add_argument("--strict", action="store_true", help="Код возврата 1, если есть строки с ошибками")
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(import_files(parse_args())))